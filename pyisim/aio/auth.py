@@ -0,0 +1,346 @@
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Tuple, TYPE_CHECKING, Union
+
+import httpx
+
+import pyisim.aio.rest as simrest
+import pyisim.aio.soap as simsoap
+from pyisim.aio.search import _person
+from pyisim.entities import Person
+from pyisim.entities.base import IdentityMap
+from pyisim.exceptions import AuthenticationError
+from pyisim.retry import RetryPolicy
+
+if TYPE_CHECKING:
+    from pyisim.cache import EntityCache
+    from pyisim.ratelimit import RateLimiter
+    from pyisim.store import SessionStore
+    from pyisim.wsdl_cache import WSDLCache
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    """
+    Handles an asyncio user session for the IBM Security Identity Manager application.
+
+    Must be opened before use, either with ``await session.login()`` or as an async context manager::
+
+        async with Session(url, user, password, cert) as sess:
+            people = await search.people(sess, search_filter="*")
+    """
+
+    def __init__(
+        self,
+        url: str,
+        username: str,
+        password: str,
+        certificate_path: str,
+        max_connections: int = 100,
+        store: "SessionStore" = None,
+        wsdl_cache: "WSDLCache" = None,
+        prewarm: Union[bool, List[str]] = False,
+        retry: RetryPolicy = None,
+        rate_limiter: "RateLimiter" = None,
+        cache: "EntityCache" = None,
+        identity_map: bool = False,
+    ):
+        """
+        Prepares the session for the specified ISIM URL. Login is performed by login() or on context entry.
+
+        Args:
+            url (str): ISIM Base URL. Example: https://iam.isim.com:9082
+            username (str): Login name of user
+            password (str): User password
+            certificate_path (str): Path to application server root certificate. Example: "./MyCA.cer"
+            max_connections (int, optional): Size of the REST and SOAP connection pools. Defaults to 100.
+            store (SessionStore, optional): Resume the session saved in this store if it's still valid, and save the new one. Defaults to None.
+            wsdl_cache (WSDLCache, optional): Persistent cache for the SOAP service definitions. Defaults to None (in memory, per session).
+            prewarm (Union[bool, List[str]], optional): SOAP services (see pyisim.soap.SERVICES) whose clients are loaded concurrently during login, instead of on first use. True loads all of them. Load times are kept in soapclient.load_times. Defaults to False.
+            retry (RetryPolicy, optional): Retry and circuit breaker policy shared by the REST and SOAP clients. Defaults to RetryPolicy().
+            rate_limiter (RateLimiter, optional): Requests per second allowed for each family of operations. Defaults to None (no limit).
+            cache (EntityCache, optional): Cache for container, role, person, activity and request lookups. Defaults to None (no cache).
+            identity_map (bool, optional): Return the same entity instance for the same DN (href for people) while it's referenced, instead of building and looking it up again. Defaults to False.
+        """
+        self.url = url
+        self.username = username
+        self.store = store
+        self.cache = cache
+        self.identity_map = IdentityMap() if identity_map else None
+        self.prewarm = simsoap.SERVICES if prewarm is True else prewarm or []
+        self.retry = retry or RetryPolicy()
+        self.restclient = simrest.ISIMClient(
+            url,
+            username,
+            password,
+            certificate_path,
+            max_connections,
+            retry=self.retry,
+            rate_limiter=rate_limiter,
+            cache=cache,
+        )
+        self.soapclient = simsoap.ISIMClient(
+            url,
+            username,
+            password,
+            certificate_path,
+            max_connections,
+            wsdl_cache=wsdl_cache,
+            retry=self.retry,
+            rate_limiter=rate_limiter,
+            cache=cache,
+        )
+
+    async def login(self) -> "Session":
+        """Performs login on ISIM REST API and SOAP web services concurrently.
+
+        The SOAP WSSession obtained here is shared by every SOAP call made through this session.
+        If the session has a store, the saved session is resumed instead when it's still valid.
+
+        Returns:
+            Session: The logged in session.
+        """
+        state = self.store.load(self.url, self.username) if self.store else None
+        if state:
+            self.soapclient.restaurar(state["soap"])
+            logins = [
+                self.restclient.login(state["rest"]),
+                self.soapclient.prewarm(self.prewarm),
+            ]
+        else:
+            logins = [
+                self.restclient.login(),
+                self.soapclient.login(),
+                self.soapclient.prewarm(self.prewarm),
+            ]
+        try:
+            # se espera a todos antes de cerrar: si falla un lado, el otro ya abrió su pool de conexiones
+            for r in await asyncio.gather(*logins, return_exceptions=True):
+                if isinstance(r, BaseException):
+                    raise r
+        except BaseException:
+            await self.close()
+            raise
+
+        if self.store:
+            self.save_state()
+        return self
+
+    def save_state(self) -> None:
+        """Saves the current REST and SOAP session state into the session store."""
+        self.store.save(
+            self.url,
+            self.username,
+            {"rest": self.restclient.exportar(), "soap": self.soapclient.exportar()},
+        )
+
+    async def close(self) -> None:
+        """Closes the session connection pools."""
+        await asyncio.gather(self.restclient.close(), self.soapclient.close())
+
+    async def __aenter__(self) -> "Session":
+        return await self.login()
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    async def current_person(self, attributes="*") -> Person:
+        """Returns the current logged in person entity.
+
+        Args:
+            attributes (str, optional): comma separated attributes to return. Defaults to "*".
+
+        Returns:
+            pyisim.entities.Person: Person entity of the currently logged user.
+        """
+        p = await self.restclient.lookupCurrentPerson(attributes, "")
+        return await _person(self, p, attributes)
+
+
+class SessionPool:
+    """
+    Pool of authenticated asyncio ISIM sessions to be shared by tasks. See pyisim.auth.SessionPool.
+
+    Must be opened before use, either with ``await pool.open()`` or as an async context manager::
+
+        async with SessionPool(url, [("svc1", "pw1"), ("svc2", "pw2")], cert, size=8) as pool:
+            async with pool.session() as sess:
+                await search.people(sess, ...)
+    """
+
+    def __init__(
+        self,
+        url: str,
+        credentials: List[Tuple[str, str]],
+        certificate_path: str,
+        size: int = None,
+        reauth_interval: float = 5,
+        max_connections: int = 100,
+    ):
+        """
+        Args:
+            url (str): ISIM Base URL. Example: https://iam.isim.com:9082
+            credentials (List[Tuple[str, str]]): (username, password) pairs. Sessions are distributed evenly between them.
+            certificate_path (str): Path to application server root certificate. Example: "./MyCA.cer"
+            size (int, optional): Number of sessions. Defaults to one per credential.
+            reauth_interval (float, optional): Seconds between login attempts of a broken session. Defaults to 5.
+            max_connections (int, optional): Size of the connection pools of each session. Defaults to 100.
+        """
+        self.url = url
+        self.certificate_path = certificate_path
+        self.size = size or len(credentials)
+        self.reauth_interval = reauth_interval
+        self.max_connections = max_connections
+
+        self._pool_credentials = list(
+            itertools.islice(itertools.cycle(credentials), self.size)
+        )
+        self._available = asyncio.Queue()
+        self._sessions = []
+        self._tasks = set()
+        self._in_use = 0
+        self._reauthenticating = 0
+        self._checkouts = 0
+        self._reauthentications = 0
+
+    async def _login(self, credentials: Tuple[str, str]) -> Session:
+        username, password = credentials
+        session = Session(
+            self.url, username, password, self.certificate_path, self.max_connections
+        )
+        # si el login falla, Session.login() ya cerró sus clientes
+        return await session.login()
+
+    async def open(self) -> "SessionPool":
+        """Logs in all the pool sessions concurrently.
+
+        Returns:
+            SessionPool: The opened pool.
+        """
+        sessions = await asyncio.gather(
+            *[self._login(c) for c in self._pool_credentials]
+        )
+        for session in sessions:
+            self._sessions.append(session)
+            self._available.put_nowait(session)
+        return self
+
+    async def close(self) -> None:
+        """Stops background logins and closes every session."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*[s.close() for s in self._sessions])
+
+    async def __aenter__(self) -> "SessionPool":
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    async def checkout(self, timeout: float = None) -> Session:
+        """
+        Takes a session from the pool, waiting until one is available.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. Defaults to None (wait forever).
+
+        Raises:
+            asyncio.TimeoutError: No session was available after the timeout.
+
+        Returns:
+            Session: Authenticated session. Must be returned with checkin().
+        """
+        session = await asyncio.wait_for(self._available.get(), timeout)
+        self._in_use += 1
+        self._checkouts += 1
+        return session
+
+    def checkin(self, session: Session, broken: bool = False) -> None:
+        """
+        Returns a session to the pool.
+
+        Args:
+            session (Session): Session obtained from checkout()
+            broken (bool, optional): If True, the session is replaced by a new login in a background task. Defaults to False.
+        """
+        self._in_use -= 1
+        if broken:
+            self._reauthenticating += 1
+            task = asyncio.ensure_future(self._reauthenticate(session))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self._available.put_nowait(session)
+
+    async def _reauthenticate(self, session: Session) -> None:
+        index = self._sessions.index(session)
+        await session.close()
+
+        try:
+            while True:
+                try:
+                    new_session = await self._login(self._pool_credentials[index])
+                except Exception:
+                    # el login puede fallar de muchas formas (Fault, WSDL inválido, assert de estado HTTP...):
+                    # se sigue intentando hasta que close() cancele la tarea
+                    logger.exception(
+                        "Pool session login failed for %s",
+                        self._pool_credentials[index][0],
+                    )
+                    await asyncio.sleep(self.reauth_interval)
+                    continue
+
+                self._sessions[index] = new_session
+                self._reauthentications += 1
+                self._available.put_nowait(new_session)
+                return
+        finally:
+            self._reauthenticating -= 1
+
+    @asynccontextmanager
+    async def session(
+        self,
+        timeout: float = None,
+        broken_errors=(AuthenticationError, httpx.TransportError),
+    ) -> AsyncIterator[Session]:
+        """
+        Checks out a session for the duration of the async with block.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for a session. Defaults to None (wait forever).
+            broken_errors (tuple, optional): Exceptions which mark the session as broken if raised inside the block.
+
+        Yields:
+            Session: Authenticated session.
+        """
+        session = await self.checkout(timeout)
+        try:
+            yield session
+        except broken_errors:
+            self.checkin(session, broken=True)
+            raise
+        except BaseException:
+            self.checkin(session)
+            raise
+        else:
+            self.checkin(session)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Pool utilization.
+
+        Returns:
+            Dict[str, float]: size, available, in_use, reauthenticating, checkouts, reauthentications and utilization (in_use / size).
+        """
+        return {
+            "size": self.size,
+            "available": self._available.qsize(),
+            "in_use": self._in_use,
+            "reauthenticating": self._reauthenticating,
+            "checkouts": self._checkouts,
+            "reauthentications": self._reauthentications,
+            "utilization": self._in_use / self.size,
+        }
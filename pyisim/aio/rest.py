@@ -0,0 +1,622 @@
+import asyncio
+import ssl
+import urllib
+from urllib.parse import urlencode
+
+import httpx
+
+from pyisim.exceptions import NotFoundError, MultipleFoundError, AuthenticationError
+from pyisim.rest import (
+    IDEMPOTENT_METHODS,
+    endpoint,
+    falla_transitoria,
+    familia,
+    json_respuesta,
+    lista_respuesta,
+    tags_actividad,
+    tags_actividades,
+    tags_persona,
+    tags_solicitud,
+)
+from pyisim.cache import cached, invalidates, namespace
+from pyisim.concurrency import SingleFlight, coalesced
+from pyisim.retry import RetryPolicy
+
+# Cliente asíncrono del API REST. Mismos métodos y parámetros que pyisim.rest.ISIMClient,
+# pero todos son corrutinas y comparten un único pool de conexiones (httpx.AsyncClient).
+
+
+class ISIMClient:
+    def __init__(
+        self,
+        url,
+        user_,
+        pass_,
+        cert_path=None,
+        max_connections=100,
+        retry=None,
+        rate_limiter=None,
+        cache=None,
+    ):
+
+        self.__addr = url
+        self.__user = user_
+        self.__pass = pass_
+        self.cert_path = cert_path
+        self.max_connections = max_connections
+        self.retry = retry or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.cache_namespace = namespace(url, user_)
+        self.flights = SingleFlight()
+        self.s = None
+        self.CSRF = None
+        self.__login_lock = asyncio.Lock()
+        self.relogins = 0
+        # Peticiones en curso de cada cliente httpx y clientes reemplazados por un re-login que aún tienen alguna
+        self.__en_curso = {}
+        self.__retirados = set()
+
+    async def login(self, state=None):
+        restaurada = await self.restaurar(state) if state else None
+        anterior = self.s
+        self.s, self.CSRF = restaurada or await self.autenticar(
+            self.__user, self.__pass, self.cert_path
+        )
+        if anterior is not None:
+            await self.__retirar(anterior)
+
+    async def __retirar(self, s):
+        # El cliente anterior se cierra cuando terminan (o fallan) las peticiones que todavía lo usan
+        if self.__en_curso.get(s):
+            self.__retirados.add(s)
+        else:
+            await s.aclose()
+
+    async def __enviar(self, s, method, url, **kwargs):
+        self.__en_curso[s] = self.__en_curso.get(s, 0) + 1
+        try:
+            return await s.request(method, url, **kwargs)
+        finally:
+            self.__en_curso[s] -= 1
+            if not self.__en_curso[s]:
+                del self.__en_curso[s]
+                if s in self.__retirados:
+                    self.__retirados.discard(s)
+                    await s.aclose()
+
+    def exportar(self):
+        # Estado de la sesión (ver pyisim.store.SessionStore)
+        cookies = [
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+            for c in self.s.cookies.jar
+        ]
+        return {"cookies": cookies, "csrf": self.CSRF}
+
+    async def restaurar(self, state):
+        # Reutiliza las cookies de una sesión anterior. Una sola petición valida que sigan vigentes
+        # y entrega el token CSRF. Si no lo están, devuelve None para hacer el login completo.
+        s = self.nuevo_cliente()
+        for cookie in state["cookies"]:
+            s.cookies.set(**cookie)
+
+        url = self.__addr + "/itim/rest/systemusers/me"
+        r = await s.get(url, headers={"Accept": "*/*"})
+        if (
+            r.status_code != 200
+            or self.sesion_expirada(r)
+            or "CSRFToken" not in r.headers
+        ):
+            await s.aclose()
+            return None
+        return s, r.headers["CSRFToken"]
+
+    async def reautenticar(self, s):
+        # Solo una corrutina vuelve a autenticarse, las demás esperan el lock y usan la nueva sesión
+        async with self.__login_lock:
+            if self.s is s:
+                await self.login()
+                self.relogins += 1
+
+    def sesion_expirada(self, response):
+        # La sesión expiró (redirige al login o responde ISIMLoginRequired) o se rechazó el token CSRF
+        return (
+            response.status_code == 401
+            or (response.status_code == 403 and "CSRFToken" in response.request.headers)
+            or "/restlogin/login.jsp" in str(response.url)
+            or b"ISIMLoginRequired" in response.content
+        )
+
+    async def _request(self, method, url, **kwargs):
+        # Todas las llamadas al API pasan por aquí. Las fallas transitorias se reintentan (solo lecturas y las
+        # escrituras declaradas en RetryPolicy.idempotent) y cada endpoint tiene su circuit breaker.
+        return await self.retry.acall(
+            endpoint(method, url),
+            lambda: self.__request(method, url, **kwargs),
+            retry=method in IDEMPOTENT_METHODS
+            or endpoint(method, url) in self.retry.idempotent,
+            errors=(httpx.TransportError,),
+            transient=falla_transitoria,
+        )
+
+    async def __request(self, method, url, **kwargs):
+        # Si la sesión expiró, se autentica de nuevo (una sola vez para todas las corrutinas) y se repite la llamada.
+        if self.rate_limiter:
+            await self.rate_limiter.aacquire(familia(method, url))
+        s = self.s
+        r = await self.__enviar(s, method, url, **kwargs)
+
+        if self.sesion_expirada(r):
+            await self.reautenticar(s)
+            headers = kwargs.get("headers")
+            if headers and "CSRFToken" in headers:
+                kwargs["headers"] = {**headers, "CSRFToken": self.CSRF}
+            r = await self.__enviar(self.s, method, url, **kwargs)
+
+        return r
+
+    async def close(self):
+        retirados, self.__retirados = self.__retirados, set()
+        for s in retirados:
+            await s.aclose()
+        if self.s is not None:
+            await self.s.aclose()
+            self.s = None
+
+    def nuevo_cliente(self, cert=None):
+        return httpx.AsyncClient(
+            verify=ssl.create_default_context(cafile=cert or self.cert_path),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            timeout=None,
+            follow_redirects=True,
+        )
+
+    async def autenticar(self, user_, pass_, cert=None):
+
+        assert cert is not None, "No certificate passed"
+        url = self.__addr + "/itim/restlogin/login.jsp"
+        s = self.nuevo_cliente(cert)
+        try:
+            headers = {"Accept": "*/*"}
+            r1 = await s.get(url, headers=headers)
+
+            assert 404 != r1.status_code, "Error 404: " + r1.text
+
+            url = self.__addr + "/itim/j_security_check"
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+            data_login = {"j_username": user_, "j_password": pass_}
+            await s.post(url, headers=headers, data=data_login)
+
+            url = self.__addr + "/itim/rest/systemusers/me"
+            r3 = await s.get(url, headers=headers)
+            if "CSRFToken" not in r3.headers:
+                raise AuthenticationError(
+                    "Error de autenticación, verifique sus credenciales."
+                )
+        except BaseException:
+            # el login falló o se canceló: el cliente nuevo no se entrega a nadie
+            await s.aclose()
+            raise
+        return s, r3.headers["CSRFToken"]
+
+    @cached("container_search")
+    async def buscarOUs(
+        self,
+        profile_name,
+        filtro,
+        buscar_por=None,
+        attributes="",
+        limit=100,
+        start=None,
+    ):
+
+        url = self.__addr + "/itim/rest/organizationcontainers/" + profile_name
+        tipos = [
+            "bporganizations",
+            "organizationunits",
+            "organizations",
+            "locations",
+            "admindomains",
+        ]
+        if profile_name not in tipos:
+            raise Exception(
+                "No es una categoría de OU válida. Seleccione un tipo de categoría entre las siguientes: "
+                + str(tipos)
+            )
+
+        name_attrs = {
+            "bporganizations": "ou",
+            "organizationunits": "ou",
+            "organizations": "o",
+            "locations": "l",
+            "admindomains": "ou",
+        }
+
+        if not buscar_por:
+            buscar_por = name_attrs[profile_name]
+
+        data = {"attributes": attributes, "limit": limit, buscar_por: filtro}
+        headers = self.rango(start, limit)
+
+        OUs = json_respuesta(
+            await self._request("GET", url, params=data, headers=headers)
+        )
+
+        return list(OUs)
+
+    # si filtro="*" busca todo
+    async def buscarPersonas(
+        self,
+        perfil,
+        atributos="cn",
+        embedded="",
+        buscar_por="cn",
+        filtro="*",
+        limit=50,
+        start=None,
+    ):
+
+        assert perfil.lower() in ("person", "bpperson")
+
+        url = self.__addr + "/itim/rest/people"
+        if perfil.lower() == "bpperson":
+            url = url + "/bpperson"
+
+        data = {
+            "attributes": atributos,
+            "embedded": embedded,
+            "limit": limit,
+            buscar_por: filtro,
+        }
+        headers = {"Cache-Control": "no-cache", **self.rango(start, limit)}
+        data = urlencode(data, quote_via=urllib.parse.quote)
+
+        response = await self._request("GET", f"{url}?{data}", headers=headers)
+        return lista_respuesta(response)
+
+    async def crearPersona(self, person, orgid, justification):
+
+        url = self.__addr + "/itim/rest/people"
+
+        person_data = {
+            k: v
+            for k, v in person.__dict__.items()
+            if k != "changes" and not k.startswith("_")
+        }
+
+        data = {
+            "justification": justification,
+            "profileName": person.profile_name,
+            "orgID": orgid,
+            "_attributes": person_data,
+        }
+
+        headers = {
+            "CSRFToken": self.CSRF,
+            "Content-Type": "application/json",
+            "Accept": "*/*",
+        }
+
+        ret = await self._request("POST", url, json=data, headers=headers)
+        return ret
+
+    @invalidates(lambda href, *args: [href])
+    async def modificarPersona(self, href, changes, justification):
+        url = self.__addr + href
+
+        data = {
+            "justification": justification,
+            "_attributes": changes,
+        }
+
+        headers = {
+            "CSRFToken": self.CSRF,
+            "Content-Type": "application/json",
+            "Accept": "*/*",
+        }
+
+        ret = await self._request("PUT", url, json=data, headers=headers)
+        return ret
+
+    async def buscarAcceso(
+        self,
+        by="accessName",
+        atributos="accessName",
+        filtro="*",
+        limit=20,
+        requestee_href=None,
+        start=None,
+    ):
+
+        url = self.__addr + "/itim/rest/access"
+
+        data = {
+            by: filtro,
+            "attributes": atributos,
+            "limit": limit,
+            "requestee": requestee_href,
+        }
+        data = urlencode(data, quote_via=urllib.parse.quote)
+
+        headers = self.rango(start, limit)
+
+        res = await self._request("GET", f"{url}?{data}", headers=headers)
+        accesos = json_respuesta(res)
+
+        return list(accesos)
+
+    def rango(self, start, limit):
+        # Paginación del API REST: devuelve los resultados [start, start + limit - 1]
+        if start is None:
+            return {}
+        if limit is None:
+            return {"Range": f"items={start}-"}
+        return {"Range": f"items={start}-{start + limit - 1}"}
+
+    def verificarResultadoUnico(self, json_):
+        if len(json_) > 1:
+            raise MultipleFoundError()
+        elif len(json_) == 0:
+            raise NotFoundError()
+        else:
+            return json_[0]
+
+    def obtenerLinks(self, json_, tipoObjeto):
+
+        tipos = {"acceso": "access", "persona": "self"}
+        assert tipoObjeto in tipos.keys()
+        tipo = tipos[tipoObjeto]
+
+        json_ = self.verificarResultadoUnico(json_)
+
+        return {"_links": {tipo: {"href": json_["_links"]["self"]["href"]}}}
+
+    async def buscarActividad(
+        self, search_attr="activityName", search_filter="*", limit=None, start=None
+    ):
+
+        url = self.__addr + "/itim/rest/activities"
+        data = {
+            "filterId": "activityFilter",
+            "status": "PENDING",
+            search_attr: search_filter,
+        }
+
+        headers = {"Cache-Control": "no-cache", **self.rango(start, limit)}
+
+        actividades = json_respuesta(
+            await self._request("GET", url, params=data, headers=headers)
+        )
+
+        return list(actividades)
+
+    @invalidates(tags_solicitud)
+    async def solicitarAccesos(self, accesos, persona, justification):
+        url = self.__addr + "/itim/rest/access/assignments"
+
+        persona_rest = {"self": {"href": persona.href}}
+
+        accesos_rest = [{"_links": {"access": {"href": a.href}}} for a in accesos]
+
+        headers = {
+            "CSRFToken": self.CSRF,
+            "Content-Type": "application/json",
+            "Accept": "*/*",
+            "X-HTTP-Method-Override": "submit-in-batch",
+        }
+
+        data = {
+            "justification": justification,
+            "requests": [
+                {
+                    "requestee": {
+                        "_links": persona_rest,
+                        "add": {"assignments": accesos_rest},
+                    }
+                }
+            ],
+        }
+
+        return await self._request("POST", url, json=data, headers=headers)
+
+    async def parse_rfi_form(self, workitem_id, rfi_values):
+
+        response = await self._request(
+            "GET", f"{self.__addr}/itim/rest/activities/rfiformdetails/{workitem_id}"
+        )
+        form_details = json_respuesta(response)
+        # esto es un arreglo con la info del formulario
+        form = form_details["template"]["page"]["body"]["tabbedForm"]["tab"]
+
+        rfi_form = []
+        for tab in form:
+            for element in tab["formElement"]:
+                attr_name = element["name"].split(".")[-1]
+                editable = element["editable"]
+                value = ""
+
+                try:
+                    required = element["required"]
+                except KeyError:
+                    required = False
+
+                if required:
+                    try:
+                        value = form_details["defaultAttrValues"][attr_name]
+                    except KeyError:
+                        pass
+                if editable:
+                    value = [
+                        attr["value"]
+                        for attr in rfi_values
+                        if attr["name"] == attr_name
+                    ][0]
+
+                if editable or required:
+                    rfi_form.append(
+                        {
+                            "name": attr_name,
+                            "value": value,
+                        }
+                    )
+
+        return rfi_form
+
+    @invalidates(tags_actividades)
+    async def completarActividades(self, actividades, resultado, justification="ok"):
+
+        url = self.__addr + "/itim/rest/workitems"
+
+        resultCodes = {
+            "approve": "AA",
+            "reject": "AR",
+            "successful": "SS",
+            "warning": "SW",
+            "failure": "SF",
+        }
+
+        body = []
+
+        if isinstance(resultado, str):
+            resultado = resultado.lower()
+
+        if len(actividades) == 0:
+            return None
+
+        for activity in actividades:
+            activityType = activity["_attributes"]["type"]
+            activityLabel = activity["_attributes"]["name"]
+            workitem = activity["_links"]["workitem"]["href"]
+
+            if activityType == "APPROVAL":
+                assert resultado in ["approve", "reject"]
+            elif activityType == "WORK_ORDER":
+                assert resultado in ["successful", "warning", "failure"]
+            elif activityType == "RFI":
+                assert isinstance(resultado, list)
+
+            resultCode = resultCodes[resultado] if activityType != "RFI" else "RS"
+            action = {
+                "_links": {"self": {"href": workitem}},
+                "action": {"code": resultCode},
+                "label": activityLabel,
+                "justification": justification,
+            }
+
+            if activityType == "RFI":
+
+                assert len(actividades) == 1, "Can only complete one RFI at a time"
+
+                workitem_id = workitem.split("/")[-1]
+
+                action = {
+                    "action": {"code": resultCode},
+                    "label": activityLabel,
+                    "justification": justification,
+                }
+
+                if len(resultado) > 0:
+
+                    rfi_form = await self.parse_rfi_form(workitem_id, resultado)
+                    action["rfiAttributeValues"] = rfi_form
+
+                headers = {
+                    "CSRFToken": self.CSRF,
+                    "Content-Type": "application/json",
+                    "Accept": "*/*",
+                }
+
+                return await self._request(
+                    "PUT", f"{url}/{workitem_id}", json=action, headers=headers
+                )
+
+            body.append(action)
+
+        headers = {
+            "CSRFToken": self.CSRF,
+            "Content-Type": "application/json",
+            "Accept": "*/*",
+            "X-HTTP-Method-Override": "submit-in-batch",
+            "methodOverride": "submit-in-batch",
+        }
+
+        return await self._request("PUT", url, json=body, headers=headers)
+
+    async def buscarFormulario(self, perfil):
+
+        url = self.__addr + "/itim/rest/forms/people"
+
+        assert perfil in ["Person", "BPPerson"], "Invalid profile."
+
+        urlPerfil = url + "/" + perfil
+        resp = await self._request("GET", urlPerfil)
+
+        return json_respuesta(resp)["template"]["page"]["body"]["tabbedForm"]["tab"]
+
+    @coalesced()
+    async def buscarServicio(self, search_attr, search_filter, limit, atributos=""):
+
+        url = self.__addr + "/itim/rest/services"
+
+        data = {
+            search_attr: search_filter,
+            "attributes": atributos,
+            "limit": limit,
+        }
+        data = urlencode(data, quote_via=urllib.parse.quote)
+
+        servicios = json_respuesta(await self._request("GET", f"{url}?{data}"))
+
+        if len(servicios) == 0:
+            raise NotFoundError(f"Service not found: ({search_attr}={search_filter})")
+
+        return servicios
+
+    async def lookupSolicitud(self, requestID):
+        url = self.__addr + "/itim/rest/requests"
+
+        url_req = url + "/" + requestID
+        data = {"attributes": "*"}
+
+        solicitud = json_respuesta(await self._request("GET", url_req, params=data))
+
+        return solicitud
+
+    @cached("activity", tags=tags_actividad)
+    async def lookupActividad(self, activityID):
+        url = self.__addr + "/itim/rest/activities"
+
+        url_act = url + "/" + activityID
+        data = {"attributes": "*"}
+
+        actividad = json_respuesta(await self._request("GET", url_act, params=data))
+
+        return actividad
+
+    @cached("person", tags=tags_persona)
+    async def lookupPersona(self, href, attributes="dn"):
+        url = self.__addr + href
+
+        params = {
+            "attributes": attributes,
+            "forms": "False",
+        }
+
+        person = await self._request("GET", url, params=params)
+
+        return json_respuesta(person)
+
+    async def lookupCurrentPerson(self, attributes="*", embedded=""):
+        url = self.__addr + "/itim/rest/people/me"
+
+        params = {
+            "attributes": attributes,
+            "embedded": embedded,
+        }
+
+        person = await self._request("GET", url, params=params)
+
+        return json_respuesta(person)
@@ -0,0 +1,418 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, TYPE_CHECKING
+
+from pyisim.entities import (
+    Activity,
+    Access,
+    Account,
+    Group,
+    OrganizationalContainer,
+    Person,
+    Service,
+)
+from pyisim.exceptions import InvalidOptionError
+from pyisim.search import _with_dn
+
+if TYPE_CHECKING:
+    from pyisim.aio.auth import Session
+
+
+async def _person(session: "Session", person: dict, attributes: str = None) -> Person:
+    """
+    Builds a Person entity from a REST API result.
+
+    The DN is taken from the result if it was requested, otherwise it's looked up without blocking the event loop.
+    """
+    if "dn" not in person["_attributes"]:
+        href = person["_links"]["self"]["href"]
+        r = await session.restclient.lookupPersona(href, attributes="dn")
+        person = {
+            **person,
+            "_attributes": {**person["_attributes"], "dn": r["_attributes"]["dn"]},
+        }
+    return Person(session, person=person, attributes=attributes)
+
+
+async def people(
+    session: "Session",
+    search_filter="*",
+    by="cn",
+    profile_name="Person",
+    attributes="*",
+    limit=50,
+) -> List[Person]:
+    """
+    Person search
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+        by (str, optional): LDAP Attribute to search by. Defaults to "cn".
+        profile_name (str, optional): Person/BPPerson. Defaults to "Person".
+        attributes (str, optional): Attributes to return in the Person instance. Defaults to "*".
+        limit (int, optional): Defaults to 50.
+
+    Returns:
+        List[Person]: Search results
+    """
+
+    ret = await session.restclient.buscarPersonas(
+        profile_name,
+        atributos=_with_dn(attributes),
+        embedded="",
+        buscar_por=by,
+        filtro=search_filter,
+        limit=limit,
+    )
+    return list(await asyncio.gather(*[_person(session, p, attributes) for p in ret]))
+
+
+async def activities(
+    session: "Session", by="activityName", search_filter="*"
+) -> List[Activity]:
+    """
+    Pending Activity search
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        by (str, optional): "requestId" or filters available in ISIMs REST API docs (activityId, activityName, serviceName, participantName). Defaults to "activityName".
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+
+    Returns:
+        List[Activity]: Search results
+    """
+
+    if by == "requestId":
+        results = await session.soapclient.buscarActividadesDeSolicitud(search_filter)
+        found = await asyncio.gather(
+            *[session.restclient.lookupActividad(str(a["id"])) for a in results]
+        )
+        return [Activity(session, activity=a) for a in found]
+
+    results = await session.restclient.buscarActividad(
+        search_attr=by, search_filter=search_filter
+    )
+
+    return [Activity(session, activity=a) for a in results]
+
+
+async def access(
+    session: "Session", by="accessName", search_filter="*", attributes="", limit=20
+) -> List[Access]:
+    """
+    Access search
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        by (str, optional): Defaults to "accessName".
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+        limit (int, optional): Defaults to 20.
+
+    Returns:
+        List[Access]: Search results
+    """
+
+    ret = await session.restclient.buscarAcceso(
+        by=by, filtro=search_filter, atributos=attributes, limit=limit
+    )
+
+    return [Access(access=a) for a in ret]
+
+
+async def groups(
+    session: "Session",
+    by: str,
+    service_dn: str = None,
+    group_profile_name="",
+    group_info="",
+) -> List[Group]:
+    """
+    Service group search.
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        by (str): "account", "access" or "service"
+        service_dn (str, optional): Parent service DN if searching by service. Defaults to None.
+        group_profile_name (str, optional): Group profile name if searching by service. Defaults to None.
+        group_info (str, optional): Group name or description if searching by service. Defaults to None.
+
+    Raises:
+        NotImplementedError: Search by account and access not implemented
+
+    Returns:
+        List[Group]: Search results
+    """
+
+    if by == "account":
+        raise NotImplementedError
+    elif by == "access":
+        raise NotImplementedError
+    elif by == "service":
+        ret = await session.soapclient.buscarGruposPorServicio(
+            service_dn, group_profile_name, group_info
+        )
+    else:
+        raise InvalidOptionError("Invalid option")
+
+    return [Group(session, group=g) for g in ret]
+
+
+async def service(
+    session: "Session",
+    parent: "OrganizationalContainer",
+    by="erservicename",
+    search_filter="*",
+) -> List[Service]:
+    """
+    Service search
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        parent (OrganizationalContainer): Service business unit
+        by (str, optional): LDAP attribute to search by. Defaults to "erservicename".
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+
+    Returns:
+        List[Service]: Search results
+    """
+
+    ret = await session.soapclient.buscarServicio(
+        parent.wsou, f"({by}={search_filter})", find_unique=False
+    )
+
+    return [Service(session, service=s) for s in ret]
+
+
+async def _container(session: "Session", ou: dict) -> OrganizationalContainer:
+    """
+    Builds an OrganizationalContainer from a REST API result, looking up its SOAP container without blocking the
+    event loop.
+    """
+    wsou = await session.soapclient.lookupContainer(ou["_attributes"]["dn"])
+    return OrganizationalContainer(session, organizational_container=ou, wsou=wsou)
+
+
+async def organizational_container(
+    session: "Session", profile_name: str, search_filter: str, by="name"
+) -> List[OrganizationalContainer]:
+    """
+    Organizational container search. See pyisim.search.organizational_container() for the profile names.
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        profile_name (str): Organizational container profile name
+        search_filter (str): Filter to search by.
+        by (str, optional): Attribute to search by. Defaults to "name".
+
+    Returns:
+        List[OrganizationalContainer]: Search results.
+    """
+
+    buscar_por = None if by == "name" else by
+    ret = await session.restclient.buscarOUs(
+        profile_name, buscar_por=buscar_por, filtro=search_filter, attributes="dn"
+    )
+    return list(await asyncio.gather(*[_container(session, ou) for ou in ret]))
+
+
+async def account(
+    session: "Session",
+    ldap_search_filter: str,
+    service: "Service" = None,
+) -> List[Account]:
+    """
+    Account search
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        ldap_search_filter (str): LDAP filter to search by.
+        service (Service, optional): Only return accounts of this service. Defaults to None.
+
+    Returns:
+        List[Account]: Search results
+    """
+
+    args = {"filter": ldap_search_filter}
+
+    if service:
+        args["profile"] = await session.soapclient.getAccountProfileForService(
+            service.dn
+        )
+        results = await session.soapclient.searchAccounts(args)
+        return [
+            Account(session, account=r)
+            for r in results
+            if r["serviceName"] == service.name
+        ]
+    else:
+        results = await session.soapclient.searchAccounts(args)
+        return [Account(session, account=r) for r in results]
+
+
+async def _pages(
+    fetch: Callable[[int, int], Awaitable[List]], page_size: int, start: int
+) -> AsyncIterator[List]:
+    """
+    Yields result pages from fetch(start, page_size) until a short page is returned.
+
+    The next page is requested in a background task while the current one is being consumed.
+    """
+    next_page = asyncio.ensure_future(fetch(start, page_size))
+    previous_first = None
+    try:
+        while True:
+            page = await next_page
+            # if the server ignores the Range header it keeps sending the first page
+            if not page or (previous_first is not None and page[0] == previous_first):
+                return
+            previous_first = page[0]
+            start += len(page)
+            last = len(page) < page_size
+            if not last:
+                next_page = asyncio.ensure_future(fetch(start, page_size))
+            yield page
+            if last:
+                return
+    finally:
+        if not next_page.done():
+            next_page.cancel()
+
+
+async def iter_people(
+    session: "Session",
+    search_filter="*",
+    by="cn",
+    profile_name="Person",
+    attributes="*",
+    page_size=100,
+    start=0,
+) -> AsyncIterator[Person]:
+    """
+    Person search without result limit. See pyisim.search.iter_people().
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+        by (str, optional): LDAP Attribute to search by. Defaults to "cn".
+        profile_name (str, optional): Person/BPPerson. Defaults to "Person".
+        attributes (str, optional): Attributes to return in the Person instance. Defaults to "*".
+        page_size (int, optional): People requested per page. Defaults to 100.
+        start (int, optional): Position of the first result (cursor). Defaults to 0.
+
+    Yields:
+        Person: Search results
+    """
+
+    def fetch(start, limit):
+        return session.restclient.buscarPersonas(
+            profile_name,
+            atributos=_with_dn(attributes),
+            embedded="",
+            buscar_por=by,
+            filtro=search_filter,
+            limit=limit,
+            start=start,
+        )
+
+    async for page in _pages(fetch, page_size, start):
+        for p in await asyncio.gather(*[_person(session, p, attributes) for p in page]):
+            yield p
+
+
+async def iter_access(
+    session: "Session",
+    by="accessName",
+    search_filter="*",
+    attributes="",
+    page_size=100,
+    start=0,
+) -> AsyncIterator[Access]:
+    """
+    Access search without result limit. See pyisim.search.iter_access().
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        by (str, optional): Defaults to "accessName".
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+        page_size (int, optional): Accesses requested per page. Defaults to 100.
+        start (int, optional): Position of the first result (cursor). Defaults to 0.
+
+    Yields:
+        Access: Search results
+    """
+
+    def fetch(start, limit):
+        return session.restclient.buscarAcceso(
+            by=by, filtro=search_filter, atributos=attributes, limit=limit, start=start
+        )
+
+    async for page in _pages(fetch, page_size, start):
+        for a in page:
+            yield Access(access=a)
+
+
+async def iter_organizational_container(
+    session: "Session",
+    profile_name: str,
+    search_filter: str,
+    by="name",
+    page_size=100,
+    start=0,
+) -> AsyncIterator[OrganizationalContainer]:
+    """
+    Organizational container search without result limit. See pyisim.search.iter_organizational_container().
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        profile_name (str): Organizational container profile name. See organizational_container().
+        search_filter (str): Filter to search by.
+        by (str, optional): Attribute to search by. Defaults to "name".
+        page_size (int, optional): Containers requested per page. Defaults to 100.
+        start (int, optional): Position of the first result (cursor). Defaults to 0.
+
+    Yields:
+        OrganizationalContainer: Search results
+    """
+
+    buscar_por = None if by == "name" else by
+
+    def fetch(start, limit):
+        return session.restclient.buscarOUs(
+            profile_name,
+            buscar_por=buscar_por,
+            filtro=search_filter,
+            attributes="dn",
+            limit=limit,
+            start=start,
+        )
+
+    async for page in _pages(fetch, page_size, start):
+        for ou in await asyncio.gather(*[_container(session, ou) for ou in page]):
+            yield ou
+
+
+async def iter_activities(
+    session: "Session", by="activityName", search_filter="*", page_size=100, start=0
+) -> AsyncIterator[Activity]:
+    """
+    Pending activity search without result limit. See pyisim.search.iter_activities().
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        by (str, optional): Filters available in ISIMs REST API docs (activityId, activityName, serviceName, participantName). Defaults to "activityName".
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+        page_size (int, optional): Activities requested per page. Defaults to 100.
+        start (int, optional): Position of the first result (cursor). Defaults to 0.
+
+    Yields:
+        Activity: Search results
+    """
+
+    def fetch(start, limit):
+        return session.restclient.buscarActividad(
+            search_attr=by, search_filter=search_filter, limit=limit, start=start
+        )
+
+    async for page in _pages(fetch, page_size, start):
+        for a in page:
+            yield Activity(session, activity=a)
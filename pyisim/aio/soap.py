@@ -0,0 +1,664 @@
+import asyncio
+import ssl
+import time
+
+import httpx
+from zeep import AsyncClient, Settings
+from zeep.xsd import Nil
+from zeep.transports import AsyncTransport
+from zeep.cache import InMemoryCache
+from zeep.exceptions import Fault, TransportError
+from zeep.helpers import serialize_object
+
+from pyisim.exceptions import NotFoundError
+from pyisim.cache import cached, invalidates, namespace
+from pyisim.concurrency import SingleFlight, coalesced
+from pyisim.retry import RetryPolicy
+from pyisim.soap import (
+    SERVICES,
+    endpoint,
+    falla_transitoria,
+    clave_servicio,
+    familia,
+    primer_arg,
+    tags_escritura_persona,
+    reintentable,
+    sesion_expirada,
+    tags_cuentas,
+    tags_grupos,
+    tags_politica,
+    tags_propietario,
+    tags_servicios,
+)
+
+# Cliente asíncrono de los servicios SOAP. Mismos métodos y parámetros que pyisim.soap.ISIMClient,
+# pero todos son corrutinas. Todas las operaciones comparten la misma WSSession (obtenida en login())
+# y un único pool de conexiones.
+# La carga de los WSDL en zeep es síncrona, por lo que se hace en un hilo para no bloquear el event loop.
+
+
+class ISIMClient:
+    def __init__(
+        self,
+        url,
+        user_,
+        pass_,
+        cert_path=None,
+        max_connections=100,
+        wsdl_cache=None,
+        retry=None,
+        rate_limiter=None,
+        cache=None,
+    ):
+
+        self.addr = url + "/itim/services/"
+        self.cert_path = cert_path
+        self.wsdl_cache = wsdl_cache
+        self.retry = retry or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.cache_namespace = namespace(url, user_)
+        self.flights = SingleFlight()
+        self.load_times = {}
+        self.__user = user_
+        self.__pass = pass_
+        self.max_connections = max_connections
+        self.s = None
+        self.__http = None
+        self.__wsdl_http = None
+        self.__client_locks = {}
+        self.__login_lock = asyncio.Lock()
+        self.relogins = 0
+
+    async def login(self, user_=None, pass_=None):
+        assert self.cert_path is not None, "No certificate passed"
+        url = self.addr + "WSSessionService?wsdl"
+        client = await self.get_client(url)
+        session = await client.service.login(user_ or self.__user, pass_ or self.__pass)
+        self.s = session
+        return session
+
+    def restaurar(self, state):
+        # Una WSSession restaurada no se valida aquí: si expiró, la primera llamada vuelve a hacer login (ver _call)
+        self.s = dict(state)
+
+    def exportar(self):
+        # Estado de la sesión (ver pyisim.store.SessionStore)
+        return dict(serialize_object(self.s))
+
+    async def relogin(self, s):
+        # Solo una corrutina vuelve a autenticarse, las demás esperan el lock y usan la nueva sesión
+        async with self.__login_lock:
+            if self.s is s:
+                await self.login()
+                self.relogins += 1
+
+    async def _call(self, client, operation, *args):
+        # Todas las operaciones pasan por aquí. Las fallas transitorias se reintentan (solo lecturas y las
+        # escrituras declaradas en RetryPolicy.idempotent) y cada servicio tiene su circuit breaker.
+        return await self.retry.acall(
+            endpoint(client),
+            lambda: self.__call(client, operation, *args),
+            retry=reintentable(operation) or operation in self.retry.idempotent,
+            errors=(httpx.TransportError, TransportError, Fault),
+            transient=falla_transitoria,
+        )
+
+    async def __call(self, client, operation, *args):
+        # Si la WSSession expiró, se autentica de nuevo (una sola vez para todas las corrutinas) y se repite la llamada.
+        if self.rate_limiter:
+            await self.rate_limiter.aacquire(familia(operation))
+        s = self.s
+        try:
+            return await getattr(client.service, operation)(s, *args)
+        except Fault as e:
+            if not sesion_expirada(e):
+                raise
+
+        await self.relogin(s)
+        return await getattr(client.service, operation)(self.s, *args)
+
+    async def close(self):
+        if self.__http is not None:
+            await self.__http.aclose()
+            self.__wsdl_http.close()
+            self.__http = None
+            self.__wsdl_http = None
+
+    def __create_client(self, url):
+        settings = Settings(strict=False)
+        transport = AsyncTransport(
+            client=self.__http,
+            wsdl_client=self.__wsdl_http,
+            cache=self.wsdl_cache or InMemoryCache(),
+        )
+        wsdl = (
+            self.wsdl_cache.document(url, transport, settings)
+            if self.wsdl_cache
+            else url
+        )
+        client = AsyncClient(wsdl, settings=settings, transport=transport)
+        # necesario porque los WSDL de SIM queman el puerto y no funciona con balanceador.
+        # Se copian las opciones porque la definición del servicio puede ser compartida (ver WSDLCache)
+        client.service._binding_options = {
+            **client.service._binding_options,
+            "address": url[:-5],
+        }
+        return client
+
+    async def get_client(self, url):
+
+        # Igual que en pyisim.soap, pero la inicialización se protege con un lock por cliente
+        # para que las corrutinas concurrentes no carguen el mismo WSDL varias veces.
+        client_name = url.split("/")[-1][:-5].lower()
+        client = getattr(self, client_name, None)
+
+        if client is None:
+            if self.__http is None:
+                verify = ssl.create_default_context(cafile=self.cert_path)
+                self.__http = httpx.AsyncClient(
+                    verify=verify,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                    timeout=None,
+                )
+                self.__wsdl_http = httpx.Client(verify=verify, timeout=300)
+
+            lock = self.__client_locks.setdefault(client_name, asyncio.Lock())
+            async with lock:
+                client = getattr(self, client_name, None)
+                if client is None:
+                    inicio = time.perf_counter()
+                    loop = asyncio.get_running_loop()
+                    client = await loop.run_in_executor(None, self.__create_client, url)
+                    setattr(self, client_name, client)
+                    self.load_times[client_name] = time.perf_counter() - inicio
+
+        return client
+
+    async def prewarm(self, services=SERVICES):
+        # Carga en paralelo los clientes de los servicios indicados (ver pyisim.soap.ISIMClient.prewarm)
+        await asyncio.gather(
+            *[self.get_client(self.addr + service + "?wsdl") for service in services]
+        )
+        return self.load_times
+
+    @cached("container", tags=lambda r, dn: [dn])
+    @coalesced()
+    async def lookupContainer(self, dn):
+
+        url = self.addr + "WSOrganizationalContainerServiceService?wsdl"
+        client = await self.get_client(url)
+
+        cont = await self._call(client, "lookupContainer", dn)
+
+        return cont
+
+    async def buscarOrganizacion(self, perfil, nombre):
+
+        url = self.addr + "WSOrganizationalContainerServiceService?wsdl"
+        client = await self.get_client(url)
+
+        ous = await self._call(client, "searchContainerByName", Nil, perfil, nombre)
+
+        return ous
+
+    async def buscarPoliticaSuministro(self, wsou, nombre_politica, find_unique=True):
+
+        url = self.addr + "WSProvisioningPolicyServiceService?wsdl"
+        client = await self.get_client(url)
+
+        politicas = await self._call(client, "getPolicies", wsou, nombre_politica)
+
+        if find_unique:
+            assert (
+                len(politicas) > 0
+            ), f"No se ha encontrado la política {nombre_politica}."
+            assert (
+                len(politicas) == 1
+            ), f"Se ha encontrado más de la política con: {nombre_politica}"
+            return politicas[0]
+        else:
+            return politicas
+
+    async def crearPolitica(self, ou, wsprovisioningpolicy, date):
+
+        url = self.addr + "WSProvisioningPolicyServiceService?wsdl"
+        client = await self.get_client(url)
+
+        s = await self._call(client, "createPolicy", ou, wsprovisioningpolicy, date)
+
+        return s
+
+    @invalidates(tags_politica)
+    async def modificarPolitica(self, ou, wsprovisioningpolicy, date):
+
+        url = self.addr + "WSProvisioningPolicyServiceService?wsdl"
+        client = await self.get_client(url)
+
+        s = await self._call(client, "modifyPolicy", ou, wsprovisioningpolicy, date)
+
+        return s
+
+    @invalidates(lambda ou, dn, *args: [dn])
+    async def eliminarPolitica(self, ou, dn, date):
+        url = self.addr + "WSProvisioningPolicyServiceService?wsdl"
+        client = await self.get_client(url)
+
+        s = await self._call(client, "deletePolicy", ou, dn, date)
+
+        return s
+
+    async def buscarRol(self, filtro, find_unique=True):
+
+        url = self.addr + "WSRoleServiceService?wsdl"
+        client = await self.get_client(url)
+
+        roles = await self._call(client, "searchRoles", filtro)
+
+        if find_unique:
+            assert (
+                len(roles) > 0
+            ), f"No se ha encontrado el rol con el filtro: {filtro}. Verifique que sea un filtro LDAP válido."
+            assert len(roles) == 1, f"Se ha encontrado más de un rol con: {filtro}"
+            return roles[0]
+        else:
+            return roles
+
+    @cached("role", tags=lambda r, dn: [dn])
+    @coalesced()
+    async def lookupRole(self, dn):
+
+        url = self.addr + "WSRoleServiceService?wsdl"
+        client = await self.get_client(url)
+
+        try:
+            r = await self._call(client, "lookupRole", dn)
+        except Fault as e:
+            # Solo el Fault del rol inexistente. Los Faults transitorios que quedan tras los reintentos, el circuito
+            # abierto y los errores de conexión se propagan: no son "no existe" y no deben quedar en el cache
+            if falla_transitoria(e):
+                raise
+            raise NotFoundError("Rol no encontrado") from e
+        if r is None:
+            raise NotFoundError("Rol no encontrado")
+        return r
+
+    async def crearRolEstatico(self, wsrole, wsou):
+
+        url = self.addr + "WSRoleServiceService?wsdl"
+        client = await self.get_client(url)
+
+        return await self._call(client, "createStaticRole", wsou, wsrole)
+
+    @invalidates(primer_arg)
+    async def modificarRolEstatico(self, role_dn, wsattr_list):
+
+        url = self.addr + "WSRoleServiceService?wsdl"
+        client = await self.get_client(url)
+
+        return await self._call(client, "modifyStaticRole", role_dn, wsattr_list)
+
+    @invalidates(primer_arg)
+    async def eliminarRol(self, role_dn, date=None):
+
+        url = self.addr + "WSRoleServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+        return await self._call(client, "removeRole", role_dn, date)
+
+    async def buscarPersona(self, filtro):
+
+        url = self.addr + "WSPersonServiceService?wsdl"
+        client = await self.get_client(url)
+
+        personas = await self._call(client, "searchPersonsFromRoot", filtro, Nil)
+
+        assert (
+            len(personas) > 0
+        ), f"No se ha encontrado la persona con el filtro: {filtro}. Verifique que sea un filtro LDAP válido."
+        assert len(personas) == 1, f"Se ha encontrado más de una persona con: {filtro}"
+        return personas[0]
+
+    @cached("service", tags=tags_servicios, key=clave_servicio)
+    @coalesced(key=clave_servicio)
+    async def buscarServicio(self, ou, filtro, find_unique=True):
+
+        url = self.addr + "WSServiceServiceService?wsdl"
+        client = await self.get_client(url)
+        servicios = await self._call(client, "searchServices", ou, filtro)
+
+        if find_unique:
+            if len(servicios) == 0:
+                raise NotFoundError(
+                    f"No se ha encontrado el servicio con el filtro:  {filtro}. Verifique que sea un filtro LDAP válido."
+                )
+            assert (
+                len(servicios) == 1
+            ), f"Se ha encontrado más de un servicio con: {filtro}"
+            return servicios[0]
+        else:
+            return servicios
+
+    async def searchWorkflow(self, nombre, org_name):
+        """
+        Busca flujos de cuenta y acceso por el nombre.
+        Retorna el DN.
+        """
+
+        url = self.addr + "WSSearchDataServiceService?wsdl"
+        client = await self.get_client(url)
+
+        """
+        Category puede ser (usar EstaCapitalizacion y quitar _):
+        ACCESS_TYPE, ACCOUNT_TEMPLATE, ADOPTION_POLICY, AGENT_OPERATION, ATTRIBUTE_CONSTRAINT, 
+        BPUNIT, CATEGORIES_FOR_LIFE_CYCLE_MGT, CONFIG, CONTAINER, CREDENTIAL, CREDENTIAL_COMPONENT, 
+        CREDENTIAL_LEASE, CREDENTIAL_POOL, CREDENTIAL_SERVICE, CUSTOM_PROCESS, DYNAMIC_ROLE, FORM_TEMPLATE, 
+        GLOBAL_ACCOUNT_TEMPLATE, GROUP, HOST_SELECTION_POLICY, IDENTITY_POLICY, JOIN_DIRECTIVE, JOINDIRECTIVE, 
+        LIFECYCLE_PROFILE, LOCATION, OBJECT_PROFILE, ORG, ORGROLE, ORGUNIT, ORPHANED_ACCOUNT, OWNERSHIP_TYPE, 
+        PASSWORD_POLICY, PRIVILEGE_RULE, PROVISIONING_POLICY, RECERTIFICATION_POLICY, ROLE, SECURITY_DOMAIN, 
+        SEPARATION_OF_DUTY_POLICY, SEPARATION_OF_DUTY_RULE, SERVICE, SERVICE_MODEL, SERVICE_PROFILE, 
+        SHARED_ACCESS_POLICY, SYSTEM_ROLE, SYSTEM_USER, TENANT, USERACCESS
+        """
+        flujos = await self._call(
+            client,
+            "findSearchControlObjects",
+            {
+                "objectclass": "erWorkflowDefinition",
+                "contextDN": f"ou=workflow,erglobalid=00000000000000000000,ou={org_name},dc={org_name}",
+                "returnedAttributeName": "dn",
+                "filter": f"(erProcessName={nombre})",
+                "base": "global",
+                "category": "CustomProcess",
+            },
+        )
+
+        assert (
+            len(flujos) > 0
+        ), f"No se ha encontrado el flujo: {nombre}. Verifique que sea un filtro LDAP válido."
+        assert len(flujos) == 1, f"Se ha encontrado más de un servicio con: {nombre}"
+
+        return flujos[0]["value"]
+
+    @cached("group", tags=tags_grupos)
+    async def buscarGruposPorServicio(self, dn_servicio, profile_name, info):
+
+        url = self.addr + "WSGroupServiceService?wsdl"
+        client = await self.get_client(url)
+
+        grps = await self._call(
+            client, "getGroupsByService", dn_servicio, profile_name, info
+        )
+        return grps
+
+    async def buscarActividadesRecursivo(self, process_id, act_list):
+        url = self.addr + "WSRequestServiceService?wsdl"
+        client = await self.get_client(url)
+
+        acts = await self._call(client, "getActivities", int(process_id), False)
+        act_list.extend(acts)
+
+        subprocesses = await self._call(client, "getChildProcesses", int(process_id))
+        await asyncio.gather(
+            *[
+                self.buscarActividadesRecursivo(s.requestId, act_list)
+                for s in subprocesses
+            ]
+        )
+        return "ok"
+
+    async def buscarActividadesDeSolicitud(self, process_id, pending_only=True):
+        """
+        The customer can accomplish this by using a combination of getActivities() and getChildProcesses().
+        """
+        actividades = []
+        await self.buscarActividadesRecursivo(int(process_id), actividades)
+
+        # Filtra solo las actividades manuales (M) y pendientes (R)
+        if pending_only:
+            actividades = [
+                a for a in actividades if a.activityType == "M" and a.state == "R"
+            ]
+
+        return actividades
+
+    @invalidates(tags_escritura_persona)
+    async def suspenderPersona(self, dn, justification, href=None):
+        # suspendPerson(session: ns1:WSSession, personDN: xsd:string, justification: xsd:string)
+        url = self.addr + "WSPersonServiceService?wsdl"
+        client = await self.get_client(url)
+
+        r = await self._call(client, "suspendPerson", dn, justification)
+        return r
+
+    @invalidates(tags_escritura_persona)
+    async def restaurarPersona(
+        self, dn, restore_accounts, password, date, justification, href=None
+    ):
+        # restorePerson(session: ns1:WSSession, personDN: xsd:string, restoreAccounts: xsd:boolean, password: xsd:string, date: xsd:dateTime, justification: xsd:string) -> restorePersonReturn: ns1:WSRequest
+        url = self.addr + "WSPersonServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+
+        r = await self._call(
+            client,
+            "restorePerson",
+            dn,
+            restore_accounts,
+            password or Nil,
+            date,
+            justification,
+        )
+        return r
+
+    @invalidates(tags_escritura_persona)
+    async def eliminarPersona(self, dn, justification, href=None):
+        # deletePerson(session: ns1:WSSession, personDN: xsd:string, date: xsd:dateTime, justification: xsd:string) -> deletePersonReturn: ns1:WSRequest
+        url = self.addr + "WSPersonServiceService?wsdl"
+        client = await self.get_client(url)
+
+        r = await self._call(client, "deletePerson", dn, Nil, justification)
+        return r
+
+    async def crearRolDinamico(self, wsrole, wsou, date=None):
+
+        url = self.addr + "WSRoleServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+
+        return await self._call(client, "createDynamicRole", wsou, wsrole, date)
+
+    @invalidates(primer_arg)
+    async def modificarRolDinamico(self, role_dn, wsattr_list, date=None):
+
+        url = self.addr + "WSRoleServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+
+        return await self._call(client, "modifyDynamicRole", role_dn, wsattr_list, date)
+
+    async def getDefaultAccountAttributesByPerson(self, service_dn, person_dn):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        r = await self._call(
+            client, "getDefaultAccountAttributesByPerson", service_dn, person_dn
+        )
+        return r
+
+    async def getDefaultAccountAttributes(self, service_dn):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        r = await self._call(client, "getDefaultAccountAttributes", service_dn)
+        return r
+
+    @coalesced()
+    async def getAccountProfileForService(self, service_dn):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        r = await self._call(client, "getAccountProfileForService", service_dn)
+        return r
+
+    async def searchAccounts(self, search_arguments):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        search_arguments = {k: v for k, v in search_arguments.items() if v is not None}
+
+        r = await self._call(client, "searchAccounts", search_arguments)
+        return r
+
+    # createAccount(session: ns1:WSSession, serviceDN: xsd:string, wsAttrs: ns1:WSAttribute[], date: xsd:dateTime, justification: xsd:string) -> createAccountReturn: ns1:WSRequest
+    @invalidates(tags_propietario)
+    async def createAccount(self, service_dn, wsattrs, date, justification):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+
+        r = await self._call(
+            client, "createAccount", service_dn, wsattrs, date, justification
+        )
+        return r
+
+    # getAccountsByOwner(session: ns1:WSSession, personDN: xsd:string) -> getAccountsByOwnerReturn: ns1:WSAccount[]
+    @cached("accounts", tags=tags_cuentas)
+    async def getAccountsByOwner(self, person_dn):
+        url = self.addr + "WSPersonServiceService?wsdl"
+        client = await self.get_client(url)
+
+        r = await self._call(client, "getAccountsByOwner", person_dn)
+        return r
+
+    # suspendAccount(session: ns1:WSSession, accountDN: xsd:string, date: xsd:dateTime, justification: xsd:string) -> suspendAccountReturn: ns1:WSRequest
+    @invalidates(primer_arg)
+    async def suspendAccount(self, account_dn, date, justification):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+
+        r = await self._call(client, "suspendAccount", account_dn, date, justification)
+        return r
+
+    # restoreAccount(session: ns1:WSSession, accountDN: xsd:string, newPassword: xsd:string, date: xsd:dateTime, justification: xsd:string) -> restoreAccountReturn: ns1:WSRequest
+    @invalidates(primer_arg)
+    async def restoreAccount(self, account_dn, password, date, justification):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+
+        r = await self._call(
+            client, "restoreAccount", account_dn, password, date, justification
+        )
+        return r
+
+    # deprovisionAccount(session: ns1:WSSession, accountDN: xsd:string, date: xsd:dateTime, justification: xsd:string) -> deprovisionAccountReturn: ns1:WSRequest
+    @invalidates(primer_arg)
+    async def deprovisionAccount(self, account_dn, date, justification):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+
+        r = await self._call(
+            client, "deprovisionAccount", account_dn, date, justification
+        )
+        return r
+
+    # orphanSingleAccount(session: ns1:WSSession, accountDN: xsd:string) ->
+    @invalidates(primer_arg)
+    async def orphanSingleAccount(self, account_dn):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        r = await self._call(client, "orphanSingleAccount", account_dn)
+        return r
+
+    # modifyAccount(session: ns1:WSSession, accountDN: xsd:string, wsAttrs: ns1:WSAttribute[], date: xsd:dateTime, justification: xsd:string) -> modifyAccountReturn: ns1:WSRequest
+    @invalidates(primer_arg)
+    async def modifyAccount(self, account_dn, wsattrs, date, justification):
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+
+        r = await self._call(
+            client, "modifyAccount", account_dn, wsattrs, date, justification
+        )
+        return r
+
+    @invalidates(tags_escritura_persona)
+    async def suspendPersonAdvanced(
+        self, person_dn, include_accounts, date, justification, href=None
+    ):
+        # suspendPersonAdvanced(session: ns1:WSSession, personDN: xsd:string, includeAccounts: xsd:boolean, date: xsd:dateTime, justification: xsd:string) -> suspendPersonAdvancedReturn: ns1:WSRequest
+        url = self.addr + "WSPersonServiceService?wsdl"
+        client = await self.get_client(url)
+
+        if date:
+            raise NotImplementedError()
+        else:
+            date = Nil
+
+        r = await self._call(
+            client,
+            "suspendPersonAdvanced",
+            person_dn,
+            include_accounts,
+            date,
+            justification,
+        )
+        return r
+
+    @cached("request", tags=lambda r, request_id: [str(request_id)])
+    async def getRequest(self, request_id):
+        # getRequest(session: ns1:WSSession, requestId: xsd:long) -> getRequestReturn: ns1:WSRequest
+        url = self.addr + "WSRequestServiceService?wsdl"
+        client = await self.get_client(url)
+        r = await self._call(client, "getRequest", request_id)
+        return r
+
+    @invalidates(lambda request_id, *args: [str(request_id)])
+    async def abortRequest(self, request_id, justification):
+        # abortRequest(session: ns1:WSSession, requestId: xsd:long, justification: xsd:string) ->
+        url = self.addr + "WSRequestServiceService?wsdl"
+        client = await self.get_client(url)
+        r = await self._call(client, "abortRequest", request_id, justification)
+        return r
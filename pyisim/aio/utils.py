@@ -0,0 +1,59 @@
+import asyncio
+from typing import List, TYPE_CHECKING, Union
+
+from pyisim.utils import _attribute_list, _missing
+
+if TYPE_CHECKING:
+    from pyisim.aio.auth import Session
+    from pyisim.entities import Person
+
+
+async def resolve_dns(session: "Session", people: List["Person"]) -> List[str]:
+    """
+    Resolves the DN of many people concurrently.
+
+    Only people whose DN was not returned in their search results are looked up.
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        people (List[Person]): People to resolve. Must have a reference to ISIM (href).
+
+    Returns:
+        List[str]: DNs of the people, in the same order.
+    """
+
+    async def lookup(person):
+        r = await session.restclient.lookupPersona(person.href, attributes="dn")
+        person.__dict__["dn"] = r["_attributes"]["dn"]
+
+    await asyncio.gather(*[lookup(p) for p in people if "dn" not in p.__dict__])
+
+    return [p.dn for p in people]
+
+
+async def prefetch(
+    session: "Session", people: List["Person"], attributes: Union[str, List[str]]
+) -> List["Person"]:
+    """
+    Loads attributes missing from many people concurrently. Attributes are not loaded on first access with an
+    asyncio session, so they must be prefetched.
+
+    Args:
+        session (Session): Active asyncio ISIM Session
+        people (List[Person]): People to complete. Must have a reference to ISIM (href).
+        attributes (Union[str, List[str]]): Attributes to load, as a list or comma separated. "*" loads every attribute.
+
+    Returns:
+        List[Person]: The same people.
+    """
+    attrs = _attribute_list(attributes)
+
+    async def lookup(person):
+        r = await session.restclient.lookupPersona(
+            person.href, attributes=",".join(attrs)
+        )
+        person._fill(r["_attributes"], attrs == ["*"])
+
+    await asyncio.gather(*[lookup(p) for p in people if _missing(p, attrs)])
+
+    return people
@@ -1,6 +1,28 @@
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING, Union
+
+import requests
+
 import pyisim.rest as simrest
 import pyisim.soap as simsoap
 from pyisim.entities import Person
+from pyisim.entities.base import IdentityMap
+from pyisim.exceptions import AuthenticationError
+from pyisim.retry import RetryPolicy
+from pyisim.transport import HTTPTransport
+
+if TYPE_CHECKING:
+    from pyisim.cache import EntityCache
+    from pyisim.ratelimit import RateLimiter
+    from pyisim.store import SessionStore
+    from pyisim.wsdl_cache import WSDLCache
+
+logger = logging.getLogger(__name__)
 
 
 class Session:
@@ -8,19 +30,99 @@ class Session:
     Handles user session for the IBM Security Identity Manager application
     """
 
-    def __init__(self, url: str, username: str, password: str, certificate_path: str):
+    def __init__(
+        self,
+        url: str,
+        username: str,
+        password: str,
+        certificate_path: str,
+        store: "SessionStore" = None,
+        wsdl_cache: "WSDLCache" = None,
+        prewarm: Union[bool, List[str]] = False,
+        pool_size: int = 10,
+        transport: HTTPTransport = None,
+        retry: RetryPolicy = None,
+        rate_limiter: "RateLimiter" = None,
+        cache: "EntityCache" = None,
+        identity_map: bool = False,
+        raw_xml: bool = False,
+    ):
         """
         Performs login on specified ISIM URL
 
+        The session can be shared by worker threads. Size the connection pools (pool_size) to the number of workers.
+
         Args:
             url (str): ISIM Base URL. Example: https://iam.isim.com:9082
             username (str): Login name of user
             password (str): User password
             certificate_path (str): Path to application server root certificate. Example: "./MyCA.cer"
+            store (SessionStore, optional): Resume the session saved in this store if it's still valid, and save the new one. Defaults to None.
+            wsdl_cache (WSDLCache, optional): Persistent cache for the SOAP service definitions. Defaults to None (in memory, per session).
+            prewarm (Union[bool, List[str]], optional): SOAP services (see pyisim.soap.SERVICES) whose clients are loaded concurrently during login, instead of on first use. True loads all of them. Load times are kept in soapclient.load_times. Defaults to False.
+            pool_size (int, optional): Maximum connections kept open to ISIM, shared by the REST and SOAP clients. Ignored if transport is given. Defaults to 10.
+            transport (HTTPTransport, optional): Connection pool and HTTP settings for all the session requests. Defaults to a new HTTPTransport with pool_size connections.
+            retry (RetryPolicy, optional): Retry and circuit breaker policy shared by the REST and SOAP clients. Defaults to RetryPolicy().
+            rate_limiter (RateLimiter, optional): Requests per second allowed for each family of operations. Defaults to None (no limit).
+            cache (EntityCache, optional): Cache for container, role, person, activity and request lookups. Defaults to None (no cache).
+            identity_map (bool, optional): Return the same entity instance for the same DN (href for people) while it's referenced, instead of building and looking it up again. Defaults to False.
+            raw_xml (bool, optional): Parse the responses of bulk SOAP reads (see pyisim.rawxml.OPERATIONS) with lxml straight into dicts, skipping zeep's object model. Defaults to False.
         """
+        self.url = url
         self.username = username
-        self.restclient = simrest.ISIMClient(url, username, password, certificate_path)
-        self.soapclient = simsoap.ISIMClient(url, username, password, certificate_path)
+        self.store = store
+        self.cache = cache
+        self.identity_map = IdentityMap() if identity_map else None
+
+        self.transport = transport or HTTPTransport(
+            certificate_path, pool_size=pool_size
+        )
+        self.retry = retry or RetryPolicy()
+        state = store.load(url, username) if store else None
+
+        # REST login runs in another thread while SOAP login and prewarm run in this one
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            rest = executor.submit(
+                simrest.ISIMClient,
+                url,
+                username,
+                password,
+                certificate_path,
+                state=state["rest"] if state else None,
+                transport=self.transport,
+                retry=self.retry,
+                rate_limiter=rate_limiter,
+                cache=cache,
+            )
+            self.soapclient = simsoap.ISIMClient(
+                url,
+                username,
+                password,
+                certificate_path,
+                state=state["soap"] if state else None,
+                wsdl_cache=wsdl_cache,
+                transport=self.transport,
+                retry=self.retry,
+                rate_limiter=rate_limiter,
+                cache=cache,
+                raw_xml=raw_xml,
+            )
+            if prewarm:
+                self.soapclient.prewarm(
+                    simsoap.SERVICES if prewarm is True else prewarm
+                )
+            self.restclient = rest.result()
+
+        if store:
+            self.save_state()
+
+    def save_state(self) -> None:
+        """Saves the current REST and SOAP session state into the session store."""
+        self.store.save(
+            self.url,
+            self.username,
+            {"rest": self.restclient.exportar(), "soap": self.soapclient.exportar()},
+        )
 
     def current_person(self, attributes="*") -> Person:
         """Returns the current logged in person entity.
@@ -32,4 +134,196 @@ class Session:
             pyisim.entities.Person: Person entity of the currently logged user.
         """
         p = self.restclient.lookupCurrentPerson(attributes, "")
-        return Person(self, person=p)
+        return Person(self, person=p, attributes=attributes)
+
+
+class SessionPool:
+    """
+    Pool of authenticated ISIM sessions to be shared by worker threads.
+
+    Sessions are checked out and checked back in, either explicitly or with the session() context manager::
+
+        pool = SessionPool(url, [("svc1", "pw1"), ("svc2", "pw2")], cert, size=8)
+        with pool.session() as sess:
+            search.people(sess, ...)
+
+    Broken sessions are logged in again in a background thread and return to the pool once they're usable.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        credentials: List[Tuple[str, str]],
+        certificate_path: str,
+        size: int = None,
+        reauth_interval: float = 5,
+    ):
+        """
+        Logs in all the pool sessions concurrently.
+
+        Args:
+            url (str): ISIM Base URL. Example: https://iam.isim.com:9082
+            credentials (List[Tuple[str, str]]): (username, password) pairs. Sessions are distributed evenly between them.
+            certificate_path (str): Path to application server root certificate. Example: "./MyCA.cer"
+            size (int, optional): Number of sessions. Defaults to one per credential.
+            reauth_interval (float, optional): Seconds between login attempts of a broken session. Defaults to 5.
+        """
+        self.url = url
+        self.certificate_path = certificate_path
+        self.size = size or len(credentials)
+        self.reauth_interval = reauth_interval
+
+        self._available = queue.Queue()
+        self._credentials = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._in_use = 0
+        self._reauthenticating = 0
+        self._checkouts = 0
+        self._reauthentications = 0
+
+        pool_credentials = list(
+            itertools.islice(itertools.cycle(credentials), self.size)
+        )
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            sessions = list(executor.map(self._login, pool_credentials))
+
+        for session in sessions:
+            self._available.put(session)
+
+    def _login(self, credentials: Tuple[str, str]) -> Session:
+        username, password = credentials
+        session = Session(self.url, username, password, self.certificate_path)
+        with self._lock:
+            self._credentials[id(session)] = credentials
+        return session
+
+    def checkout(self, timeout: float = None) -> Session:
+        """
+        Takes a session from the pool, waiting until one is available.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. Defaults to None (wait forever).
+
+        Raises:
+            queue.Empty: No session was available after the timeout.
+
+        Returns:
+            Session: Authenticated session. Must be returned with checkin().
+        """
+        session = self._available.get(timeout=timeout)
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+        return session
+
+    def checkin(self, session: Session, broken: bool = False) -> None:
+        """
+        Returns a session to the pool.
+
+        Args:
+            session (Session): Session obtained from checkout()
+            broken (bool, optional): If True, the session is replaced by a new login in the background. Defaults to False.
+        """
+        with self._lock:
+            self._in_use -= 1
+            if broken:
+                self._reauthenticating += 1
+
+        if broken:
+            threading.Thread(
+                target=self._reauthenticate, args=(session,), daemon=True
+            ).start()
+        else:
+            self._put(session)
+
+    def _put(self, session: Session) -> None:
+        # después de close() las sesiones devueltas se cierran en vez de volver al pool
+        self._available.put(session)
+        if self._closed.is_set():
+            self._drain()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                session = self._available.get_nowait()
+            except queue.Empty:
+                return
+            session.transport.close()
+
+    def _reauthenticate(self, session: Session) -> None:
+        with self._lock:
+            credentials = self._credentials.pop(id(session))
+
+        try:
+            while not self._closed.is_set():
+                try:
+                    new_session = self._login(credentials)
+                except Exception:
+                    # el login puede fallar de muchas formas (Fault, WSDL inválido, assert de estado HTTP...):
+                    # se sigue intentando hasta que se cierre el pool
+                    logger.exception("Pool session login failed for %s", credentials[0])
+                    self._closed.wait(self.reauth_interval)
+                    continue
+
+                with self._lock:
+                    self._reauthentications += 1
+                self._put(new_session)
+                return
+        finally:
+            with self._lock:
+                self._reauthenticating -= 1
+
+    @contextmanager
+    def session(
+        self,
+        timeout: float = None,
+        broken_errors=(AuthenticationError, requests.ConnectionError),
+    ) -> Iterator[Session]:
+        """
+        Checks out a session for the duration of the with block.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for a session. Defaults to None (wait forever).
+            broken_errors (tuple, optional): Exceptions which mark the session as broken if raised inside the block.
+
+        Yields:
+            Session: Authenticated session.
+        """
+        session = self.checkout(timeout)
+        try:
+            yield session
+        except broken_errors:
+            self.checkin(session, broken=True)
+            raise
+        except BaseException:
+            self.checkin(session)
+            raise
+        else:
+            self.checkin(session)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Pool utilization.
+
+        Returns:
+            Dict[str, float]: size, available, in_use, reauthenticating, checkouts, reauthentications and utilization (in_use / size).
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "available": self._available.qsize(),
+                "in_use": self._in_use,
+                "reauthenticating": self._reauthenticating,
+                "checkouts": self._checkouts,
+                "reauthentications": self._reauthentications,
+                "utilization": self._in_use / self.size,
+            }
+
+    def close(self) -> None:
+        """
+        Stops background logins and closes the connections of the available sessions.
+        Sessions already checked out remain usable, and are closed when they're checked in.
+        """
+        self._closed.set()
+        self._drain()
@@ -0,0 +1,499 @@
+import asyncio
+import functools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from zeep.helpers import serialize_object
+
+# Tipos de entidad cacheados y su TTL por defecto (segundos)
+DEFAULT_TTLS = {
+    "container": 3600,
+    "container_search": 3600,
+    "service": 3600,
+    "group": 600,
+    "role": 600,
+    "person": 300,
+    "accounts": 60,
+    "activity": 15,
+    "request": 15,
+}
+
+# Tipos que SQLiteCache guarda por defecto: datos estables que conviene compartir entre procesos
+SHARED_KINDS = ("container", "container_search", "role", "service", "group")
+
+# Tipos cuyas etiquetas son nombres alternativos de la misma entidad (href y DN de una persona)
+ALIAS_KINDS = {"person"}
+
+
+def namespace(url: str, user: str) -> str:
+    """
+    Returns:
+        str: Prefix of the cache keys of the clients of a Session, so that sessions of different ISIM servers or
+        users sharing a cache never read each other's entries.
+    """
+    return f"{user}@{url} "
+
+
+class EntityCache:
+    """
+    LRU cache with a time to live per entity type, in front of the ISIM lookup operations of a Session.
+
+    Cached operations: lookupContainer and buscarOUs (container, container_search), lookupRole (role),
+    buscarServicio (service), buscarGruposPorServicio (group), lookupPersona (person), getAccountsByOwner (accounts),
+    lookupActividad (activity) and getRequest (request)::
+
+        cache = EntityCache(max_size=50000, ttls={"role": 3600})
+        sess = Session(url, user, password, cert, cache=cache)
+        roles = search.roles(sess, search_filter="*")  # one container lookup per business unit
+        cache.stats()
+
+    Returned values are shared between callers and must not be modified.
+
+    Entries are tagged with the DNs and hrefs of the entities they hold. Writes made through the library (person,
+    account, role and provisioning policy operations, access requests, work item completion, request abortion)
+    invalidate every entry tagged with the written entity, including derived ones such as the owner's account list.
+    ISIM applies most writes asynchronously, so a lookup made before the request completes may still cache the
+    old value until its TTL expires.
+    """
+
+    def __init__(
+        self, max_size: int = 10000, ttls: Dict[str, float] = None, default_ttl=300
+    ):
+        """
+        Args:
+            max_size (int, optional): Maximum cached entries. The least recently used entry is evicted. Defaults to 10000.
+            ttls (Dict[str, float], optional): Seconds each entity type stays cached, overriding DEFAULT_TTLS. 0 disables caching of the type.
+            default_ttl (int, optional): TTL of types not in ttls nor DEFAULT_TTLS. Defaults to 300.
+        """
+        self.max_size = max_size
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def ttl(self, kind: str) -> float:
+        return self.ttls.get(kind, self.default_ttl)
+
+    def get(self, kind: str, key: str) -> Tuple[bool, Any]:
+        """
+        Args:
+            kind (str): Entity type
+            key (str): Entity key
+
+        Returns:
+            Tuple[bool, Any]: (True, value) if cached, (False, None) otherwise.
+        """
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None:
+                expires, value, _ = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end((kind, key))
+                    self._stats[kind]["hits"] += 1
+                    return True, value
+                self._remove((kind, key))
+            self._stats[kind]["misses"] += 1
+            return False, None
+
+    def set(self, kind: str, key: str, value: Any, tags: Iterable[str] = ()) -> None:
+        """
+        Args:
+            kind (str): Entity type
+            key (str): Entity key
+            value (Any): Value to cache
+            tags (Iterable[str], optional): Tags (e.g. DNs) to invalidate the entry by. Defaults to ().
+        """
+        ttl = self.ttl(kind)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._remove((kind, key))
+            tags = frozenset(t for t in tags if t)
+            self._entries[(kind, key)] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags[tag].add((kind, key))
+
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats[oldest[0]]["evictions"] += 1
+
+    def _remove(self, entry_key):
+        # se llama con el lock tomado
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            for tag in entry[2]:
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(entry_key)
+                    if not keys:
+                        del self._tags[tag]
+
+    def invalidate(self, kind: str, key: str) -> None:
+        """Removes one entry."""
+        with self._lock:
+            self._remove((kind, key))
+
+    def invalidate_tag(self, tag: str) -> int:
+        """
+        Removes every entry tagged with tag. The href and DN of a cached person are aliases: removing a person entry
+        also removes the entries tagged with its other alias (e.g. its account list, tagged with the DN).
+
+        Returns:
+            int: Removed entries.
+        """
+        removed = 0
+        with self._lock:
+            pending, seen = [tag], set()
+            while pending:
+                t = pending.pop()
+                if t in seen:
+                    continue
+                seen.add(t)
+                for entry_key in list(self._tags.get(t, ())):
+                    entry = self._entries.get(entry_key)
+                    if entry is not None and entry_key[0] in ALIAS_KINDS:
+                        pending.extend(entry[2])
+                    self._remove(entry_key)
+                    removed += 1
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns:
+            Dict[str, Dict[str, int]]: hits, misses and evictions per entity type, and totals (including size) under "total".
+        """
+        with self._lock:
+            ret = {kind: dict(s) for kind, s in self._stats.items()}
+            total = defaultdict(int)
+            for s in ret.values():
+                for name, n in s.items():
+                    total[name] += n
+            ret["total"] = {**total, "size": len(self._entries)}
+        return ret
+
+
+class SQLiteCache:
+    """
+    Entity cache stored in a SQLite database (WAL mode), shared by every process of the host that uses the same
+    file. Same interface as EntityCache, so it plugs into the same lookups through Session(cache=...)::
+
+        cache = SQLiteCache("/var/cache/pyisim/entities.db")
+        sess = Session(url, user, password, cert, cache=cache)
+
+    Short-lived worker processes find the containers, services, roles and groups loaded by previous workers on
+    local disk instead of asking ISIM for them. By default only those stable types (SHARED_KINDS) are stored;
+    other types can be enabled through ttls.
+
+    Keys are prefixed with the ISIM URL and user of the session, so one file can be shared by sessions of
+    different servers or users.
+
+    Values are stored as plain dicts and lists (zeep objects are converted with serialize_object) using pickle,
+    so the database must only be writable by trusted users. When full, the entries closest to expiry are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join("~", ".cache", "pyisim", "entities.db"),
+        max_size: int = 100000,
+        ttls: Dict[str, float] = None,
+        default_ttl: float = 0,
+        timeout: float = 30,
+    ):
+        """
+        Args:
+            path (str, optional): Database file. Defaults to ~/.cache/pyisim/entities.db.
+            max_size (int, optional): Maximum stored entries. Defaults to 100000.
+            ttls (Dict[str, float], optional): Seconds each entity type stays cached, overriding the DEFAULT_TTLS of SHARED_KINDS. 0 disables caching of the type.
+            default_ttl (float, optional): TTL of the other types. Defaults to 0 (not stored).
+            timeout (float, optional): Seconds to wait for a database lock held by another process. Defaults to 30.
+        """
+        self.path = os.path.expanduser(str(path))
+        self.max_size = max_size
+        self.ttls = {**{k: DEFAULT_TTLS[k] for k in SHARED_KINDS}, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.timeout = timeout
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connection() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    kind TEXT, key TEXT, expires REAL, value BLOB, PRIMARY KEY (kind, key)
+                );
+                CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires);
+                CREATE TABLE IF NOT EXISTS tags (tag TEXT, kind TEXT, key TEXT);
+                CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+                CREATE INDEX IF NOT EXISTS tags_entry ON tags (kind, key);
+                """)
+
+    def _connection(self):
+        # una conexión por hilo: sqlite3 no permite compartirlas entre hilos
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _count(self, kind, stat, n=1):
+        with self._lock:
+            self._stats[kind][stat] += n
+
+    def ttl(self, kind: str) -> float:
+        return self.ttls.get(kind, self.default_ttl)
+
+    def get(self, kind: str, key: str) -> Tuple[bool, Any]:
+        """
+        Args:
+            kind (str): Entity type
+            key (str): Entity key
+
+        Returns:
+            Tuple[bool, Any]: (True, value) if cached, (False, None) otherwise.
+        """
+        if self.ttl(kind) <= 0:
+            return False, None
+
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value FROM entries WHERE kind = ? AND key = ? AND expires > ?",
+                (kind, key, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            self._count(kind, "misses")
+            return False, None
+        self._count(kind, "hits")
+        return True, pickle.loads(row[0])
+
+    def set(self, kind: str, key: str, value: Any, tags: Iterable[str] = ()) -> None:
+        """
+        Args:
+            kind (str): Entity type
+            key (str): Entity key
+            value (Any): Value to cache
+            tags (Iterable[str], optional): Tags (e.g. DNs) to invalidate the entry by. Defaults to ().
+        """
+        ttl = self.ttl(kind)
+        if ttl <= 0:
+            return
+
+        data = pickle.dumps(serialize_object(value), pickle.HIGHEST_PROTOCOL)
+        tags = {t for t in tags if t}
+        db = self._connection()
+        with db:
+            db.execute("DELETE FROM tags WHERE kind = ? AND key = ?", (kind, key))
+            db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (kind, key, time.time() + ttl, data),
+            )
+            db.executemany(
+                "INSERT INTO tags VALUES (?, ?, ?)", [(t, kind, key) for t in tags]
+            )
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % 100 == 0
+        if evict:
+            self._evict()
+
+    def _evict(self):
+        # cada 100 escrituras se borran las entradas vencidas y, si sobran, las más próximas a vencer
+        db = self._connection()
+        with db:
+            db.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+            excess = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            excess -= self.max_size
+            if excess > 0:
+                evicted = db.execute(
+                    "SELECT rowid, kind FROM entries ORDER BY expires LIMIT ?",
+                    (excess,),
+                ).fetchall()
+                db.executemany(
+                    "DELETE FROM entries WHERE rowid = ?", [(r,) for r, _ in evicted]
+                )
+                for _, kind in evicted:
+                    self._count(kind, "evictions")
+            db.execute(
+                "DELETE FROM tags WHERE NOT EXISTS (SELECT 1 FROM entries e "
+                "WHERE e.kind = tags.kind AND e.key = tags.key)"
+            )
+
+    def invalidate(self, kind: str, key: str) -> None:
+        """Removes one entry."""
+        db = self._connection()
+        with db:
+            db.execute("DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key))
+            db.execute("DELETE FROM tags WHERE kind = ? AND key = ?", (kind, key))
+
+    def invalidate_tag(self, tag: str) -> int:
+        """
+        Removes every entry tagged with tag, for every process. Person hrefs and DNs are aliases, as in
+        EntityCache.invalidate_tag().
+
+        Returns:
+            int: Removed entries.
+        """
+        removed = 0
+        db = self._connection()
+        with db:
+            pending, seen = [tag], set()
+            while pending:
+                t = pending.pop()
+                if t in seen:
+                    continue
+                seen.add(t)
+                entries = db.execute(
+                    "SELECT DISTINCT kind, key FROM tags WHERE tag = ?", (t,)
+                ).fetchall()
+                for kind, key in entries:
+                    if kind in ALIAS_KINDS:
+                        pending.extend(
+                            r[0]
+                            for r in db.execute(
+                                "SELECT tag FROM tags WHERE kind = ? AND key = ?",
+                                (kind, key),
+                            )
+                        )
+                    removed += db.execute(
+                        "DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key)
+                    ).rowcount
+                    db.execute(
+                        "DELETE FROM tags WHERE kind = ? AND key = ?", (kind, key)
+                    )
+        return removed
+
+    def clear(self) -> None:
+        db = self._connection()
+        with db:
+            db.execute("DELETE FROM entries")
+            db.execute("DELETE FROM tags")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns:
+            Dict[str, Dict[str, int]]: hits, misses and evictions of this process per entity type, and totals (including the shared size) under "total".
+        """
+        with self._lock:
+            ret = {kind: dict(s) for kind, s in self._stats.items()}
+        total = defaultdict(int)
+        for s in ret.values():
+            for name, n in s.items():
+                total[name] += n
+        size = (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM entries WHERE expires > ?", (time.time(),))
+            .fetchone()[0]
+        )
+        ret["total"] = {**total, "size": size}
+        return ret
+
+
+def cached(kind: str, tags: Callable = None, key: Callable = None):
+    """
+    Caches the result of a client method in the client cache (self.cache), if it has one.
+    The key is built from the call arguments, prefixed with the client cache_namespace (see namespace()).
+    Works on regular and coroutine methods.
+
+    Args:
+        kind (str): Entity type
+        tags (Callable, optional): tags(result, *args) returns the entry tags. Defaults to None.
+        key (Callable, optional): key(*args, **kwargs) returns the entry key. Defaults to the repr of the arguments.
+    """
+
+    def decorator(method):
+        def make_key(self, args, kwargs):
+            # el prefijo (servidor y usuario) del cliente separa las entradas de sesiones distintas
+            prefix = getattr(self, "cache_namespace", "")
+            if key:
+                return prefix + key(*args, **kwargs)
+            return prefix + repr((args, sorted(kwargs.items())))
+
+        if asyncio.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(self, *args, **kwargs):
+                if self.cache is None:
+                    return await method(self, *args, **kwargs)
+                k = make_key(self, args, kwargs)
+                hit, value = self.cache.get(kind, k)
+                if not hit:
+                    value = await method(self, *args, **kwargs)
+                    self.cache.set(kind, k, value, tags(value, *args) if tags else ())
+                return value
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.cache is None:
+                return method(self, *args, **kwargs)
+            k = make_key(self, args, kwargs)
+            hit, value = self.cache.get(kind, k)
+            if not hit:
+                value = method(self, *args, **kwargs)
+                self.cache.set(kind, k, value, tags(value, *args) if tags else ())
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidates(tags: Callable):
+    """
+    Invalidates the client cache entries tagged with tags(*args, **kwargs) after a write method runs, even if it
+    fails (the request may have reached ISIM). Works on regular and coroutine methods.
+
+    Args:
+        tags (Callable): Returns the DNs/hrefs written by the call.
+    """
+
+    def decorator(method):
+        def invalidate(self, args, kwargs):
+            if self.cache is not None:
+                for tag in tags(*args, **kwargs):
+                    if tag:
+                        self.cache.invalidate_tag(tag)
+
+        if asyncio.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(self, *args, **kwargs):
+                try:
+                    return await method(self, *args, **kwargs)
+                finally:
+                    invalidate(self, args, kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                invalidate(self, args, kwargs)
+
+        return wrapper
+
+    return decorator
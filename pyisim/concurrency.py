@@ -0,0 +1,379 @@
+import asyncio
+import functools
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List
+
+import requests
+
+from pyisim.exceptions import CircuitOpenError
+
+# Errores que indican que el servidor está sobrecargado
+BACKOFF_ERRORS = (
+    requests.Timeout,
+    requests.ConnectionError,
+    TimeoutError,
+    asyncio.TimeoutError,
+    CircuitOpenError,
+)
+
+try:
+    import httpx
+
+    BACKOFF_ERRORS += (httpx.TimeoutException, httpx.NetworkError)
+except ImportError:
+    pass
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit for bulk operations, using additive increase / multiplicative decrease (AIMD).
+
+    Each call runs in a slot. While latency stays healthy the limit grows by ``increase`` per window of completed
+    calls; on a timeout, a connection error, an open circuit or a latency spike it's multiplied by ``decrease``::
+
+        limiter = AIMDLimiter(max_limit=32)
+        results = list(limiter.map(lambda p: p.modify(sess, "Bulk update"), people))
+
+        async_results = await limiter.amap(lambda a: asearch.people(sess, search_filter=a), filters)
+
+    The same limiter can be shared by several bulk jobs hitting the same ISIM server.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1,
+        decrease: float = 0.5,
+        latency_threshold: float = None,
+        spike_factor: float = 2,
+        backoff_errors=BACKOFF_ERRORS,
+    ):
+        """
+        Args:
+            initial (int, optional): Initial concurrency limit. Defaults to 4.
+            min_limit (int, optional): Defaults to 1.
+            max_limit (int, optional): Defaults to 64.
+            increase (float, optional): Limit increase per window of successful calls. Defaults to 1.
+            decrease (float, optional): Limit factor on overload. Defaults to 0.5.
+            latency_threshold (float, optional): Calls slower than this (seconds) count as overload. Defaults to None (use spike_factor).
+            spike_factor (float, optional): Calls slower than spike_factor times the average latency count as overload. Defaults to 2.
+            backoff_errors (tuple, optional): Exceptions that count as overload. Defaults to timeouts, connection errors and CircuitOpenError.
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.spike_factor = spike_factor
+        self.backoff_errors = backoff_errors
+
+        self._limit = float(initial)
+        self.in_flight = 0
+        self.average_latency = None
+        self.__last_decrease = 0.0
+        self.__lock = threading.Lock()
+        self.__available = threading.Condition(self.__lock)
+        self.__async_available = None
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit."""
+        return int(self._limit)
+
+    def _acquire(self):
+        # se llama con el lock tomado
+        if self.in_flight < int(self._limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def _release(self, start, error=None):
+        latency = time.monotonic() - start
+        with self.__lock:
+            self.in_flight -= 1
+            overload = isinstance(error, self.backoff_errors) or (
+                error is None and self._spike(latency)
+            )
+            if overload:
+                # una sola reducción por ventana: las llamadas que empezaron antes de la última
+                # reducción no vuelven a reducir el límite
+                if start > self.__last_decrease:
+                    self._limit = max(self.min_limit, self._limit * self.decrease)
+                    self.__last_decrease = time.monotonic()
+            elif error is None:
+                self._limit = min(
+                    self.max_limit, self._limit + self.increase / self._limit
+                )
+            if error is None:
+                # la referencia se actualiza también con los picos: si la latencia normal sube,
+                # las llamadas dejan de contarse como picos y el límite se recupera
+                self.average_latency = (
+                    latency
+                    if self.average_latency is None
+                    else 0.8 * self.average_latency + 0.2 * latency
+                )
+            self.__available.notify_all()
+
+    def _spike(self, latency):
+        if self.latency_threshold is not None:
+            return latency > self.latency_threshold
+        return (
+            self.average_latency is not None
+            and latency > self.spike_factor * self.average_latency
+        )
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Waits until a call can start and measures it.
+        """
+        with self.__available:
+            self.__available.wait_for(self._acquire)
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._release(start, e)
+            raise
+        else:
+            self._release(start)
+
+    @asynccontextmanager
+    async def aslot(self):
+        """
+        Same as slot(), for coroutines.
+        """
+        if self.__async_available is None:
+            self.__async_available = asyncio.Condition()
+        available = self.__async_available
+
+        async with available:
+
+            def acquire():
+                with self.__lock:
+                    return self._acquire()
+
+            await available.wait_for(acquire)
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._release(start, e)
+            raise
+        else:
+            self._release(start)
+        finally:
+            async with available:
+                available.notify_all()
+
+    def map(self, fn: Callable, items: Iterable) -> Iterator:
+        """
+        Calls fn(item) for every item in a thread pool, with at most limit calls in flight.
+
+        Items are read from the iterable as results are consumed: at most max_limit calls are submitted ahead of
+        the result being yielded, so items can be a generator over millions of entries.
+
+        Args:
+            fn (Callable): Function to call.
+            items (Iterable): Arguments.
+
+        Returns:
+            Iterator: Results, in the same order as items.
+        """
+
+        def run(item):
+            with self.slot():
+                return fn(item)
+
+        with ThreadPoolExecutor(max_workers=self.max_limit) as executor:
+            pending = deque()
+            try:
+                for item in items:
+                    pending.append(executor.submit(run, item))
+                    if len(pending) >= self.max_limit:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # si el consumidor deja de iterar o una llamada falla, no se empiezan las que faltan
+                for future in pending:
+                    future.cancel()
+
+    async def amap(self, fn: Callable[..., Awaitable], items: Iterable) -> List:
+        """
+        Awaits fn(item) for every item, with at most limit calls in flight.
+
+        max_limit workers take the items from the iterable one at a time, so no coroutine is created before its
+        item is processed.
+
+        Args:
+            fn (Callable[..., Awaitable]): Coroutine function to call.
+            items (Iterable): Arguments.
+
+        Returns:
+            List: Results, in the same order as items.
+        """
+        results = {}
+        numbered = enumerate(items)
+
+        async def worker():
+            # todos los workers consumen el mismo iterador
+            for i, item in numbered:
+                async with self.aslot():
+                    results[i] = await fn(item)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.max_limit)]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for w in workers:
+                w.cancel()
+            raise
+        return [results[i] for i in range(len(results))]
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call with a given key is in flight, other callers with the same
+    key wait for it and receive its result (or its exception) instead of making their own call.
+
+    The SOAP and REST clients keep one in their ``flights`` attribute for lookupContainer, lookupRole,
+    getAccountProfileForService and buscarServicio::
+
+        with ThreadPoolExecutor(32) as executor:
+            ous = list(executor.map(lambda dn: OrganizationalContainer(sess, dn=dn), dns))
+        sess.soapclient.flights.stats()  # {'lookupContainer': {'calls': 1, 'shared': 31}, ...}
+    """
+
+    def __init__(self):
+        self.__flights = {}
+        self.__tasks = {}
+        self.__stats = defaultdict(lambda: defaultdict(int))
+        self.__lock = threading.Lock()
+
+    def _count(self, name, stat):
+        # se llama con el lock tomado
+        self.__stats[name][stat] += 1
+
+    def do(self, name: str, key: str, fn: Callable):
+        """
+        Calls fn(), unless a call with the same name and key is already in flight.
+
+        Args:
+            name (str): Operation name, for stats().
+            key (str): Call key (e.g. the repr of the arguments).
+            fn (Callable): Call to make.
+
+        Returns:
+            Result of fn(), shared between the coalesced callers.
+        """
+        with self.__lock:
+            flight = self.__flights.get((name, key))
+            if flight is None:
+                flight = self.__flights[(name, key)] = _Flight()
+                leader = True
+                self._count(name, "calls")
+            else:
+                leader = False
+                self._count(name, "shared")
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__flights[(name, key)]
+            flight.done.set()
+
+    async def ado(self, name: str, key: str, fn: Callable[..., Awaitable]):
+        """Same as do(), for coroutine functions. Coalesces tasks of the same event loop."""
+        # una tarea solo se puede esperar desde su propio loop
+        clave = (name, key, id(asyncio.get_running_loop()))
+        with self.__lock:
+            task = self.__tasks.get(clave)
+            if task is None:
+                task = asyncio.ensure_future(fn())
+                self.__tasks[clave] = task
+                task.add_done_callback(lambda t: self.__soltar(clave, t))
+                self._count(name, "calls")
+            else:
+                self._count(name, "shared")
+
+        # shield: si un llamador se cancela, la llamada sigue para los demás
+        return await asyncio.shield(task)
+
+    def __soltar(self, clave, task):
+        # el id de un loop cerrado se puede reutilizar: solo se quita la tarea propia
+        with self.__lock:
+            if self.__tasks.get(clave) is task:
+                del self.__tasks[clave]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns:
+            Dict[str, Dict[str, int]]: Per operation calls made and shared (calls saved by joining one in flight).
+        """
+        with self.__lock:
+            return {name: dict(s) for name, s in self.__stats.items()}
+
+
+def coalesced(key: Callable = None):
+    """
+    Coalesces concurrent identical calls of a client method through the client SingleFlight (self.flights).
+    Works on regular and coroutine methods.
+
+    Args:
+        key (Callable, optional): key(*args, **kwargs) returns the call key. Defaults to the repr of the arguments.
+    """
+
+    def decorator(method):
+        def make_key(args, kwargs):
+            if key:
+                return key(*args, **kwargs)
+            return repr((args, sorted(kwargs.items())))
+
+        if asyncio.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(self, *args, **kwargs):
+                return await self.flights.ado(
+                    method.__name__,
+                    make_key(args, kwargs),
+                    lambda: method(self, *args, **kwargs),
+                )
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            return self.flights.do(
+                method.__name__,
+                make_key(args, kwargs),
+                lambda: method(self, *args, **kwargs),
+            )
+
+        return wrapper
+
+    return decorator
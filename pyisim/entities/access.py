@@ -1,4 +1,10 @@
-class Access:
+from .base import Entity
+
+
+class Access(Entity):
+    _identity_type = "access"
+    _key_attr = "href"
+
     def __init__(self, access=None):
         """
         ISIM Access entity. Used in person.request_access() method. Holds its name and URL.
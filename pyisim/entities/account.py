@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING
 
 from ..response import Response
+from .base import Entity
 
 if TYPE_CHECKING:
     from pyisim.auth import Session
@@ -9,7 +10,9 @@ if TYPE_CHECKING:
     from .service import Service
 
 
-class Account:
+class Account(Entity):
+    _identity_type = "account"
+
     def __init__(
         self,
         session: "Session",
@@ -2,12 +2,16 @@ from typing import TYPE_CHECKING, Dict, List, Union
 
 from ..exceptions import NotFoundError
 from ..response import Response
+from .base import Entity
 
 if TYPE_CHECKING:
     from ..auth import Session
 
 
-class Activity:
+class Activity(Entity):
+    _identity_type = "activity"
+    _key_attr = "href"
+
     def __init__(self, session: "Session", activity=None, id: str = None):
         """
         Represents an ISIM Activity. Can do lookup using the id attribute.
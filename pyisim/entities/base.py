@@ -0,0 +1,127 @@
+import threading
+import weakref
+from typing import Any, Callable, Hashable, Tuple
+
+
+class IdentityMap:
+    """
+    Entities of a Session indexed by type and DN (href for people), so that searches and lookups that hit an entity
+    already in memory return the same instance instead of building, and looking up, a new one.
+
+    Only weak references are kept: an entity leaves the map when no one else references it.
+    """
+
+    def __init__(self):
+        self._entities = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entities)
+
+    def get_or_create(self, key: Tuple[str, Hashable], cls: type, factory: Callable):
+        """
+        Args:
+            key (Tuple[str, Hashable]): Entity type and key
+            cls (type): Expected class. An instance of another class with the same key is not reused.
+            factory (Callable): Builds the entity if it's not in the map.
+
+        Returns:
+            The mapped entity, or the new one.
+        """
+        with self._lock:
+            entity = self._entities.get(key)
+            if isinstance(entity, cls):
+                self.hits += 1
+                return entity
+            self.misses += 1
+
+        # la construcción puede hacer lookups: se hace sin el lock
+        entity = factory()
+        with self._lock:
+            mapped = self._entities.setdefault(key, entity)
+        return mapped if isinstance(mapped, cls) else entity
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entities.clear()
+
+
+class EntityMeta(type):
+    # Si la sesión tiene identity map y los argumentos identifican la entidad, devuelve la instancia ya creada
+    def __call__(cls, *args, **kwargs):
+        session = args[0] if args else kwargs.get("session")
+        identity_map = getattr(session, "identity_map", None)
+        if identity_map is None:
+            return super().__call__(*args, **kwargs)
+
+        init_kwargs = {k: v for k, v in kwargs.items() if k != "session"}
+        key = cls._identity(*args[1:], **init_kwargs)
+        if key is None:
+            return super().__call__(*args, **kwargs)
+
+        created = []
+
+        def factory():
+            created.append(super(EntityMeta, cls).__call__(*args, **kwargs))
+            return created[0]
+
+        entity = identity_map.get_or_create((cls._identity_type, key), cls, factory)
+        if not created:
+            entity._merge(*args[1:], **init_kwargs)
+        return entity
+
+
+class Entity(metaclass=EntityMeta):
+    """
+    Base class of the ISIM entities.
+
+    Entities are equal, and hash equally, when they have the same type and DN (href for people and accesses).
+    Entities not yet created in ISIM (without DN) are only equal to themselves.
+
+    The key is fixed the first time an entity is hashed, so that it can still be found in the sets and dicts that
+    hold it: an entity hashed before it had a DN stays equal only to itself after getting one.
+    """
+
+    # la clave del primer hash va en un slot, fuera de los atributos de la entidad (__dict__)
+    __slots__ = ("__dict__", "__weakref__", "_hashed_key")
+
+    _identity_type = None
+    _key_attr = "dn"
+
+    @classmethod
+    def _identity(cls, *args, **kwargs) -> Any:
+        # Clave de la entidad a partir de los argumentos del constructor, sin hacer lookups.
+        # None si no se puede saber (la entidad no se guarda en el identity map)
+        return None
+
+    def _merge(self, *args, **kwargs) -> None:
+        # Llamado con los argumentos del constructor cuando el identity map devuelve una instancia existente
+        pass
+
+    def _key(self):
+        value = self.__dict__.get(self._key_attr)
+        return None if value is None else (self._identity_type, value)
+
+    def _stable_key(self):
+        # después del primer hash se usa la clave fijada, para que __eq__ siga siendo coherente con __hash__
+        try:
+            return self._hashed_key
+        except AttributeError:
+            return self._key()
+
+    def __eq__(self, o) -> bool:
+        if not isinstance(o, Entity):
+            return NotImplemented
+        key = self._stable_key()
+        return self is o or (key is not None and key == o._stable_key())
+
+    def __hash__(self) -> int:
+        try:
+            key = self._hashed_key
+        except AttributeError:
+            key = self._key()
+            # sin pasar por el __setattr__ de las entidades, que registra cambios
+            object.__setattr__(self, "_hashed_key", key)
+        return hash(key) if key is not None else object.__hash__(self)
@@ -1,10 +1,14 @@
 from typing import TYPE_CHECKING
 
+from .base import Entity
+
 if TYPE_CHECKING:
     from pyisim.auth import Session
 
 
-class Group:
+class Group(Entity):
+    _identity_type = "group"
+
     def __init__(self, session: "Session", group: dict = None):
         """
         Represents an ISIM service group. Holds all of its attributes and metadata.
@@ -22,6 +26,6 @@ class Group:
             self.description = group["description"]
             self.profile_name = group["profileName"]
             self.attributes = {
-                attr.name: [v for v in attr.values.item]
-                for attr in group.attributes.item
+                attr["name"]: [v for v in attr["values"]["item"]]
+                for attr in group["attributes"]["item"]
             }
@@ -1,12 +1,26 @@
 from typing import TYPE_CHECKING
 
+from .base import Entity
+
 if TYPE_CHECKING:
     from pyisim.auth import Session
 
 
-class OrganizationalContainer:
+class OrganizationalContainer(Entity):
+    _identity_type = "container"
+
+    @classmethod
+    def _identity(cls, dn=None, organizational_container=None, wsou=None):
+        if organizational_container:
+            return organizational_container["_attributes"]["dn"]
+        return dn
+
     def __init__(
-        self, session: "Session", dn: str = None, organizational_container: dict = None
+        self,
+        session: "Session",
+        dn: str = None,
+        organizational_container: dict = None,
+        wsou=None,
     ):
         """
         Represents an ISIM Business Unit. Can do lookup using the DN parameter or searched using the pyisim.search.organizational_container() module function
@@ -15,10 +29,11 @@ class OrganizationalContainer:
             session (Session): Active ISIM Session
             dn (str, optional): Organizationl Container DN. Defaults to None.
             organizational_container (dict, optional): Used for initialization after search operations. Defaults to None.
+            wsou (WSOrganizationalContainer, optional): SOAP container of the search result, if already looked up. Defaults to None.
         """
         if dn:
             self.wsou = session.soapclient.lookupContainer(dn)
-            self.name = self.wsou.name
+            self.name = self.wsou["name"]
             self.dn = self.wsou["itimDN"]
             self.profile_name = self.wsou["profileName"]
 
@@ -37,8 +52,5 @@ class OrganizationalContainer:
             self.name = organizational_container["_links"]["self"]["title"]
             self.href = organizational_container["_links"]["self"]["href"]
             self.dn = organizational_container["_attributes"]["dn"]
-            self.wsou = session.soapclient.lookupContainer(self.dn)
+            self.wsou = wsou or session.soapclient.lookupContainer(self.dn)
             self.profile_name = self.wsou["profileName"]
-
-    def __eq__(self, o) -> bool:
-        return self.dn == o.dn
@@ -1,6 +1,10 @@
+import asyncio
+
 from pyisim.exceptions import NotFoundError
-from typing import List, TYPE_CHECKING
+from pyisim.records import AccountRecord
+from typing import Iterator, List, TYPE_CHECKING, Union
 from .account import Account
+from .base import Entity
 from ..response import Response
 
 if TYPE_CHECKING:
@@ -9,7 +13,7 @@ if TYPE_CHECKING:
     from .access import Access
 
 
-class Person:
+class Person(Entity):
     """
     Represents a Person object in ISIMs directory server
 
@@ -17,6 +21,28 @@ class Person:
     """
 
     profile_name = "Person"
+    _identity_type = "person"
+    _key_attr = "href"
+
+    @classmethod
+    def _identity(cls, person=None, href=None, person_attrs=None, attributes=None):
+        if person:
+            return person["_links"]["self"]["href"]
+        return href
+
+    def _merge(self, person=None, href=None, person_attrs=None, attributes=None):
+        # Actualiza la instancia existente con los valores del servidor, sin registrarlos como cambios
+        if person:
+            self._fill(person["_attributes"], attributes == "*")
+        elif href:
+            # Person(session, href=...) es una búsqueda: se hace aunque la instancia ya exista
+            session = self.__dict__.get("_session")
+            if session is not None and not asyncio.iscoroutinefunction(
+                session.restclient.lookupPersona
+            ):
+                attributes = attributes or "*"
+                r = session.restclient.lookupPersona(href, attributes=attributes)
+                self._fill(r["_attributes"], attributes == "*")
 
     def __init__(
         self,
@@ -24,6 +50,7 @@ class Person:
         person: dict = None,
         href: str = None,
         person_attrs: dict = None,
+        attributes: str = None,
     ):
         """
         Args:
@@ -31,33 +58,86 @@ class Person:
             person (dict, optional): Used for initialization after search operations. Defaults to None.
             href (str, optional): Used for initialization for lookup operations. Defaults to None.
             person_attrs: Dictionary of person attributes
+            attributes (str, optional): Comma separated attributes looked up with href, or requested in the search that returned person. Defaults to "*" for lookups.
+
+        Attributes outside the loaded projection are fetched from ISIM on first access, with a single lookup of every
+        attribute (see pyisim.utils.prefetch() for many people).
         """
 
         self.changes = {}
+        complete = person_attrs is not None and not (person or href)
 
         if person:
             self.href = person["_links"]["self"]["href"]
-            self.dn = session.restclient.lookupPersona(self.href, attributes="dn")[
-                "_attributes"
-            ]["dn"]
             person_attrs = person["_attributes"]
+            complete = attributes == "*"
 
         elif href:
-            r = session.restclient.lookupPersona(href, attributes="*")
+            attributes = attributes or "*"
+            r = session.restclient.lookupPersona(href, attributes=attributes)
             if r["_links"]["self"]["href"] != href:
                 raise NotFoundError(f"Invalid or not found person: {href}")
 
             self.href = href
-            self.dn = session.restclient.lookupPersona(self.href, attributes="dn")[
-                "_attributes"
-            ]["dn"]
             person_attrs = r["_attributes"]
+            complete = attributes == "*"
+
+        # Attributes that were not part of the REST payload are looked up on first access (see __getattr__)
+        self._session = session
+        self._complete = complete
 
         for k, v in person_attrs.items():
             setattr(self, k, v)
 
+        # desde aquí toda asignación de un atributo público es un cambio (ver __setattr__)
+        self._initialized = True
+
+    def _fill(self, attrs: dict, complete: bool = False):
+        # Los valores del servidor reemplazan a los cargados antes; los que tienen un cambio pendiente se conservan
+        for k, v in attrs.items():
+            if k in self.changes:
+                self.__dict__.setdefault(k, v)
+            else:
+                self.__dict__[k] = v
+        if complete:
+            self.__dict__["_complete"] = True
+
+    def _lookup(self, attributes: str) -> bool:
+        # Completa la instancia con una búsqueda de la persona. False si no se puede buscar
+        session = self.__dict__.get("_session")
+        href = self.__dict__.get("href")
+        if session is None or href is None:
+            return False
+        # la proyección "*" del API no trae el DN: se busca aunque la instancia tenga todos los atributos
+        if attributes != "dn" and self.__dict__.get("_complete"):
+            return False
+        if asyncio.iscoroutinefunction(session.restclient.lookupPersona):
+            # con una sesión asyncio no se puede buscar aquí: ver pyisim.aio.utils.prefetch()
+            return False
+
+        r = session.restclient.lookupPersona(href, attributes=attributes)
+        self._fill(r["_attributes"], attributes == "*")
+        return True
+
+    def __getattr__(self, attr):
+        # Only called when the attribute is not set in the instance
+        if not attr.startswith("_"):
+            # el DN se busca solo; cualquier otro atributo trae todos los atributos de la persona
+            if self._lookup("dn" if attr == "dn" else "*") and attr in self.__dict__:
+                return self.__dict__[attr]
+
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{attr}'"
+        )
+
     def __setattr__(self, attr, val):
-        if hasattr(self, attr):
+        # Se registra aunque el atributo no esté cargado (proyecciones parciales). Las cargas de _fill() y los
+        # atributos internos escriben en __dict__ o empiezan con "_" y no son cambios
+        if (
+            self.__dict__.get("_initialized")
+            and not attr.startswith("_")
+            and attr != "changes"
+        ):
             self.changes[attr] = val
         super().__setattr__(attr, val)
 
@@ -161,10 +241,14 @@ class Person:
                 dn = session.restclient.lookupPersona(self.href, attributes="dn")[
                     "_attributes"
                 ]["dn"]
-                self.dn = dn
+                self.__dict__["dn"] = dn
 
             ret = session.soapclient.suspendPersonAdvanced(
-                dn, suspend_accounts, None, justification
+                dn,
+                suspend_accounts,
+                None,
+                justification,
+                href=self.__dict__.get("href"),
             )
             return Response(session, ret)
         except AttributeError:
@@ -198,10 +282,15 @@ class Person:
                 dn = session.restclient.lookupPersona(self.href, attributes="dn")[
                     "_attributes"
                 ]["dn"]
-                self.dn = dn
+                self.__dict__["dn"] = dn
 
             ret = session.soapclient.restaurarPersona(
-                self.dn, restore_accounts, password, None, justification
+                self.dn,
+                restore_accounts,
+                password,
+                None,
+                justification,
+                href=self.__dict__.get("href"),
             )
             return Response(session, ret)
         except AttributeError:
@@ -228,24 +317,29 @@ class Person:
                 dn = session.restclient.lookupPersona(self.href, attributes="dn")[
                     "_attributes"
                 ]["dn"]
-                self.dn = dn
+                self.__dict__["dn"] = dn
 
-            ret = session.soapclient.eliminarPersona(self.dn, justification)
+            ret = session.soapclient.eliminarPersona(
+                self.dn, justification, href=self.__dict__.get("href")
+            )
             return Response(session, ret)
         except AttributeError:
             raise Exception(
                 "Person has no reference to ISIM, search for it or initialize it with href to link it."
             )
 
-    def get_accounts(self, session: "Session") -> List[Account]:
+    def get_accounts(
+        self, session: "Session", compact: bool = False
+    ) -> List[Union[Account, AccountRecord]]:
         """
         Retrieves all registered accounts of the referenced person.
 
         Args:
             session (Session): Active ISIM Session
+            compact (bool, optional): Return read-only AccountRecords instead of Account entities. Defaults to False.
 
         Returns:
-            List[Account]: List of the person account entities.
+            List[Union[Account, AccountRecord]]: List of the person account entities.
         """
 
         try:
@@ -255,12 +349,44 @@ class Person:
                 dn = session.restclient.lookupPersona(self.href, attributes="dn")[
                     "_attributes"
                 ]["dn"]
-                self.dn = dn
+                self.__dict__["dn"] = dn
 
             result = session.soapclient.getAccountsByOwner(self.dn)
+            if compact:
+                return [AccountRecord.from_soap(r) for r in result]
             return [Account(session, account=r) for r in result]
 
         except AttributeError:
             raise Exception(
                 "Person has no reference to ISIM, search for it or initialize it with href to link it."
             )
+
+    def iter_accounts(
+        self, session: "Session", attributes: List[str] = None
+    ) -> Iterator[AccountRecord]:
+        """
+        Yields the registered accounts of the referenced person one at a time, parsing the SOAP response as it
+        arrives instead of holding every account in memory.
+
+        Args:
+            session (Session): Active ISIM Session
+            attributes (List[str], optional): Account attributes to keep, the rest are discarded while parsing. Defaults to None (all).
+
+        Yields:
+            AccountRecord: Person accounts
+        """
+
+        try:
+            try:
+                dn = self.dn
+            except AttributeError:
+                dn = session.restclient.lookupPersona(self.href, attributes="dn")[
+                    "_attributes"
+                ]["dn"]
+                self.__dict__["dn"] = dn
+        except AttributeError:
+            raise Exception(
+                "Person has no reference to ISIM, search for it or initialize it with href to link it."
+            )
+
+        yield from session.soapclient.streamAccountsByOwner(dn, attributes)
@@ -4,6 +4,7 @@ from typing import TYPE_CHECKING, Dict, List, Literal, Optional, Union
 
 from .organizational_container import OrganizationalContainer
 from ..response import Response
+from .base import Entity
 
 if TYPE_CHECKING:
     from ..auth import Session
@@ -125,7 +126,9 @@ class ProvisioningPolicyAttributes:
     """
 
 
-class ProvisioningPolicy:
+class ProvisioningPolicy(Entity):
+    _identity_type = "provisioning_policy"
+
     def __init__(
         self,
         session: "Session",
@@ -252,10 +255,10 @@ class ProvisioningPolicy:
             else:
                 parameters = {}
                 for param in wsparams["item"]:
-                    attr_name = param.name
-                    values = param.values.item
-                    types = param.expressionTypes.item
-                    enforcement = param.enforcementTypes.item
+                    attr_name = param["name"]
+                    values = param["values"]["item"]
+                    types = param["expressionTypes"]["item"]
+                    enforcement = param["enforcementTypes"]["item"]
                     attr_values = list(zip(values, enforcement, types))
                     attr_values = [
                         {
@@ -1,5 +1,6 @@
 from typing import List, TYPE_CHECKING
 from ..exceptions import NotFoundError
+from .base import Entity
 
 
 if TYPE_CHECKING:
@@ -7,7 +8,10 @@ if TYPE_CHECKING:
     from ..auth import Session
 
 
-class Request:
+class Request(Entity):
+    _identity_type = "request"
+    _key_attr = "id"
+
     def __init__(self, session: "Session", request=None, id: str = None) -> None:
         """
         Represents an ISIM Request. Holds all of its attributes and metadata.
@@ -62,7 +66,7 @@ class Request:
         from .activity import Activity
 
         results = session.soapclient.buscarActividadesDeSolicitud(self.id)
-        return [Activity(session, id=a.id) for a in results]
+        return [Activity(session, id=a["id"]) for a in results]
 
     def abort(self, session: "Session", justification: str) -> None:
         """
@@ -1,5 +1,6 @@
 from collections import defaultdict
 from ..response import Response
+from .base import Entity
 from .organizational_container import OrganizationalContainer
 import dataclasses
 from typing import Dict, List, Literal, TYPE_CHECKING, Union
@@ -69,8 +70,17 @@ class RoleAttributes:
     """
 
 
-class Role:
+class Role(Entity):
     type = None
+    _identity_type = "role"
+
+    @classmethod
+    def _identity(cls, dn=None, rol=None, role_attrs=None):
+        if role_attrs:
+            return None
+        if rol:
+            return rol["itimDN"]
+        return dn
 
     def __init__(
         self,
@@ -1,10 +1,18 @@
 from typing import TYPE_CHECKING
 
+from .base import Entity
+
 if TYPE_CHECKING:
     from pyisim.auth import Session
 
 
-class Service:
+class Service(Entity):
+    _identity_type = "service"
+
+    @classmethod
+    def _identity(cls, service=None):
+        return service["itimDN"] if service else None
+
     def __init__(self, session: "Session", service=None):
         """
         Represents an ISIM Service. Initialized only through search.service() for now.
@@ -20,3 +20,11 @@ class ContratoNoEncontradoError(Exception):
 
 class InvalidOptionError(Exception):
     pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class InvalidResponseError(Exception):
+    pass
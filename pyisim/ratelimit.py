@@ -0,0 +1,188 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Familias de operaciones con límite propio
+READ = "read"
+PERSON_WRITE = "person_write"
+ACCOUNT_WRITE = "account_write"
+WORKFLOW = "workflow"
+WRITE = "write"
+
+
+class TokenBucket:
+    """
+    Token bucket shared by the threads of a process. Refills at rate tokens per second, up to capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate (float): Tokens per second.
+            capacity (float, optional): Maximum burst, at least 1. Defaults to rate (one second worth of tokens), or 1 for rates below 1.
+
+        Raises:
+            ValueError: rate is not positive or capacity is below 1 (a request could never be made).
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if capacity is not None and capacity < 1:
+            raise ValueError("capacity must be at least 1 token")
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def take(self, tokens: float = 1) -> float:
+        """
+        Takes tokens if available.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise seconds to wait before trying again.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1) -> None:
+        """Waits until tokens can be taken."""
+        wait = self.take(tokens)
+        while wait:
+            time.sleep(wait)
+            wait = self.take(tokens)
+
+    async def aacquire(self, tokens: float = 1) -> None:
+        """Same as acquire(), without blocking the event loop."""
+        wait = self.take(tokens)
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.take(tokens)
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket shared by every process of the host, stored in a small file guarded by an exclusive file lock.
+    """
+
+    def __init__(self, path: str, rate: float, capacity: float = None):
+        """
+        Args:
+            path (str): Bucket file. Processes using the same file share the bucket.
+            rate (float): Tokens per second.
+            capacity (float, optional): Maximum burst, at least 1. Defaults to rate (one second worth of tokens), or 1 for rates below 1.
+        """
+        super().__init__(rate, capacity)
+        self.path = path
+        self.__lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def take(self, tokens: float = 1) -> float:
+        # el lock de hilos evita que dos hilos del mismo proceso compitan por el lock del archivo
+        with self.__lock, open(self.path, "a+") as f:
+            _lock(f)
+            try:
+                f.seek(0)
+                state = f.read().split()
+                now = time.time()
+                if len(state) == 2:
+                    available = min(
+                        self.capacity,
+                        float(state[0]) + max(0.0, now - float(state[1])) * self.rate,
+                    )
+                else:
+                    available = self.capacity
+
+                wait = 0
+                if available >= tokens:
+                    available -= tokens
+                else:
+                    wait = (tokens - available) / self.rate
+
+                f.seek(0)
+                f.truncate()
+                f.write(f"{available} {now}")
+                f.flush()
+                return wait
+            finally:
+                _unlock(f)
+
+
+def _lock(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class RateLimiter:
+    """
+    Requests per second allowed for each family of ISIM operations, enforced by the REST and SOAP clients.
+
+    Families:
+
+    * read: REST GETs and SOAP lookup/search/get/find operations
+    * person_write: person creation, modification, suspension, restore and deletion
+    * account_write: access requests and account operations
+    * workflow: work item completion and request abortion
+    * write: any other write (roles, provisioning policies)
+
+    Families without a limit are not throttled. With path, buckets are files in that directory and the limits apply
+    to every process of the host using it::
+
+        limiter = RateLimiter({"person_write": 5, "account_write": 2}, path="/var/run/pyisim")
+        sess = Session(url, user, password, cert, rate_limiter=limiter)
+    """
+
+    def __init__(self, limits: Dict[str, Union[float, TokenBucket]], path: str = None):
+        """
+        Args:
+            limits (Dict[str, Union[float, TokenBucket]]): Requests per second, or a bucket, for each family.
+            path (str, optional): Directory for buckets shared between processes. Defaults to None (per process).
+        """
+        self.buckets = {}
+        for family, limit in limits.items():
+            if isinstance(limit, TokenBucket):
+                self.buckets[family] = limit
+            elif path:
+                self.buckets[family] = FileTokenBucket(
+                    os.path.join(path, f"{family}.bucket"), limit
+                )
+            else:
+                self.buckets[family] = TokenBucket(limit)
+
+    def acquire(self, family: str) -> None:
+        """Waits until a request of the family can be made."""
+        bucket = self.buckets.get(family)
+        if bucket:
+            bucket.acquire()
+
+    async def aacquire(self, family: str) -> None:
+        """Same as acquire(), without blocking the event loop."""
+        bucket = self.buckets.get(family)
+        if bucket:
+            await bucket.aacquire()
@@ -0,0 +1,87 @@
+from typing import Any, Dict, List, Tuple
+
+from lxml import etree
+from zeep.xsd import ComplexType
+
+XSI_NIL = "{http://www.w3.org/2001/XMLSchema-instance}nil"
+
+# Lecturas masivas que Session(raw_xml=True) parsea sin zeep
+OPERATIONS = (
+    "searchAccounts",
+    "searchRoles",
+    "getGroupsByService",
+    "getPolicies",
+    "getActivities",
+)
+
+
+class Extractor:
+    """
+    Converts the elements of a SOAP response into plain dicts and lists, the same that
+    ``zeep.helpers.serialize_object(value, dict)`` returns for the value parsed by zeep.
+
+    The fields of each complex type, and the converter of each simple value, are taken from the service schema
+    once and reused for every element, instead of going through zeep's generic deserialization::
+
+        extract = extractor(client, "searchRoles")
+        roles = [extract(e) for e in elements]
+    """
+
+    def __init__(self, xsd_type):
+        """
+        Args:
+            xsd_type (zeep.xsd.Type): Type of the elements to convert.
+        """
+        self.xsd_type = xsd_type
+        self._fields = {}
+
+    def __call__(self, element: etree._Element) -> Any:
+        return self._value(element, self.xsd_type)
+
+    def _value(self, element, xsd_type):
+        if element.get(XSI_NIL) in ("true", "1"):
+            return None
+        if isinstance(xsd_type, ComplexType):
+            return self._object(element, xsd_type)
+        if element.text is None:
+            return None
+        return xsd_type.pythonvalue(element.text)
+
+    def _object(self, element, xsd_type) -> Dict[str, Any]:
+        children = {}
+        for child in element:
+            # se ignoran comentarios e instrucciones de procesamiento
+            if isinstance(child.tag, str):
+                children.setdefault(etree.QName(child).localname, []).append(child)
+
+        value = {}
+        for name, field_type, multiple in self._compiled(xsd_type):
+            found = children.get(name, ())
+            if multiple:
+                value[name] = [self._value(c, field_type) for c in found]
+            else:
+                value[name] = self._value(found[0], field_type) if found else None
+        return value
+
+    def _compiled(self, xsd_type) -> List[Tuple[str, Any, bool]]:
+        # (nombre, tipo, es lista) de los campos del tipo, en el orden del esquema
+        fields = self._fields.get(id(xsd_type))
+        if fields is None:
+            fields = self._fields[id(xsd_type)] = [
+                (name, e.type, e.max_occurs != 1) for name, e in xsd_type.elements
+            ]
+        return fields
+
+
+def extractor(client, operation: str) -> Extractor:
+    """
+    Args:
+        client (zeep.Client): SOAP service client.
+        operation (str): Operation name. Its response must wrap a list of <operation>Return elements.
+
+    Returns:
+        Extractor: Converter of the <operation>Return elements of the operation response.
+    """
+    body = client.service._binding.get(operation).output.body
+    name, element = body.type.elements[0]
+    return Extractor(element.type)
@@ -0,0 +1,232 @@
+import functools
+import sys
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Tuple
+
+from lxml import etree
+
+if TYPE_CHECKING:
+    from pyisim.auth import Session
+    from pyisim.entities import Account, Person
+
+# Esquemas compartidos que se conservan. Los registros de cuentas tienen un esquema por combinación de atributos
+# no vacíos: el cache se acota para que no crezca sin límite en procesos largos
+SCHEMA_CACHE_SIZE = 1024
+
+
+class Schema:
+    """
+    Attribute names and their positions, shared by every record with the same attributes.
+    """
+
+    __slots__ = ("names", "index")
+
+    def __init__(self, names: Tuple[str, ...]):
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+
+
+@functools.lru_cache(maxsize=SCHEMA_CACHE_SIZE)
+def schema(names: Tuple[str, ...]) -> Schema:
+    """
+    Returns:
+        Schema: The shared schema of the attribute names, which are interned. The SCHEMA_CACHE_SIZE most recently
+        used schemas are kept.
+    """
+    return Schema(tuple(sys.intern(n) for n in names))
+
+
+class Record:
+    """
+    Read-only search result. Values are kept in a tuple, indexed by a schema shared by the records with the same
+    attributes, without change tracking nor per instance dictionary.
+
+    Attributes are read like entity attributes (record.cn) or by name (record["cn"]). Use to_entity() to get a
+    full entity that can be modified.
+    """
+
+    __slots__ = ("_schema", "_values")
+
+    def __init__(self, attrs: Dict[str, Any]):
+        object.__setattr__(self, "_schema", schema(tuple(attrs)))
+        object.__setattr__(self, "_values", tuple(attrs.values()))
+
+    def __getattr__(self, name):
+        # solo se llama para los atributos que no son slots
+        if name.startswith("_"):
+            raise AttributeError(name)
+        i = self._schema.index.get(name)
+        if i is None:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        return self._values[i]
+
+    def __getitem__(self, name):
+        try:
+            return self._values[self._schema.index[name]]
+        except KeyError:
+            raise KeyError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            f"'{type(self).__name__}' is read-only, use to_entity() to modify it"
+        )
+
+    def __contains__(self, name) -> bool:
+        return name in self._schema.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._schema.names)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, o) -> bool:
+        if type(o) is not type(self):
+            return NotImplemented
+        # un esquema desalojado del cache puede tener otra instancia con los mismos nombres
+        return (
+            self._schema is o._schema or self._schema.names == o._schema.names
+        ) and self._values == o._values
+
+    def __hash__(self):
+        # los valores pueden ser listas: se usa el DN o href del registro
+        return hash((type(self), self.get("dn"), self.get("href")))
+
+    def __reduce__(self):
+        return type(self), (self.to_dict(),)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def get(self, name: str, default=None):
+        i = self._schema.index.get(name)
+        return default if i is None else self._values[i]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._schema.names, self._values))
+
+
+class PersonRecord(Record):
+    """
+    Compact, read-only person search result. Holds href and the requested attributes.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_rest(cls, person: dict) -> "PersonRecord":
+        """
+        Args:
+            person (dict): Person returned by the REST API.
+        """
+        return cls({"href": person["_links"]["self"]["href"], **person["_attributes"]})
+
+    def to_entity(self, session: "Session") -> "Person":
+        """
+        Returns:
+            Person: Person entity with the record attributes. Other attributes are looked up on first access.
+        """
+        from pyisim.entities import Person
+
+        attrs = self.to_dict()
+        href = attrs.pop("href")
+        return Person(
+            session, person={"_links": {"self": {"href": href}}, "_attributes": attrs}
+        )
+
+
+# Atributos fijos de las cuentas, fuera de la lista de atributos del WSAccount
+ACCOUNT_FIELDS = ("id", "dn", "profile_name", "service_name")
+
+
+def _text(element):
+    # xsi:nil y elementos ausentes -> None, como en zeep
+    return None if element is None else element.text
+
+
+class AccountRecord(Record):
+    """
+    Compact, read-only account search result. Holds id, dn, profile_name, service_name and the account attributes
+    (sorted by name), like Account.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_soap(cls, account) -> "AccountRecord":
+        """
+        Args:
+            account (WSAccount): Account returned by the SOAP API.
+        """
+        attrs = {
+            "id": account["name"],
+            "dn": account["itimDN"],
+            "profile_name": account["profileName"],
+            "service_name": account["serviceName"],
+        }
+        for a in sorted(account["attributes"]["item"], key=lambda a: a["name"]):
+            values = a["values"]["item"]
+            if values[0].strip():
+                attrs[a["name"]] = values if len(values) > 1 else values[0]
+        return cls(attrs)
+
+    @classmethod
+    def from_xml(cls, account, attributes: Iterable[str] = None) -> "AccountRecord":
+        """
+        Args:
+            account (lxml.etree._Element): WSAccount element of a SOAP response.
+            attributes (Iterable[str], optional): Account attributes to keep. Defaults to None (all).
+        """
+        fields = {etree.QName(e).localname: e for e in account}
+        attrs = {
+            "id": _text(fields.get("name")),
+            "dn": _text(fields.get("itimDN")),
+            "profile_name": _text(fields.get("profileName")),
+            "service_name": _text(fields.get("serviceName")),
+        }
+        items = fields.get("attributes")
+        found = {}
+        for a in items.iterfind("{*}item") if items is not None else ():
+            name = _text(a.find("{*}name"))
+            if attributes is not None and name not in attributes:
+                continue
+            values = [v.text or "" for v in a.iterfind("{*}values/{*}item")]
+            if values and values[0].strip():
+                found[name] = values if len(values) > 1 else values[0]
+        # mismo orden que from_soap, para que las cuentas con los mismos atributos compartan esquema
+        for name in sorted(found):
+            attrs[name] = found[name]
+        return cls(attrs)
+
+    def attributes(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Account attributes, without the fixed fields.
+        """
+        return {
+            k: v
+            for k, v in zip(self._schema.names, self._values)
+            if k not in ACCOUNT_FIELDS
+        }
+
+    def to_entity(self, session: "Session") -> "Account":
+        """
+        Returns:
+            Account: Account entity with the record attributes.
+        """
+        from pyisim.entities import Account
+
+        account = {
+            "name": self.id,
+            "itimDN": self.dn,
+            "profileName": self.profile_name,
+            "serviceName": self.service_name,
+            "attributes": {
+                "item": [
+                    {"name": k, "values": {"item": v if isinstance(v, list) else [v]}}
+                    for k, v in self.attributes().items()
+                ]
+            },
+        }
+        return Account(session, account=account)
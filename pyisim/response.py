@@ -2,6 +2,8 @@ from .entities.request import Request
 from typing import TYPE_CHECKING
 from zeep.helpers import serialize_object
 
+from pyisim.rest import json_respuesta
+
 if TYPE_CHECKING:
     from pyisim.auth import Session
 
@@ -27,7 +29,7 @@ class Response:
             self.raw = serialize_object(raw, dict)
             self.type = "SOAP"
         else:
-            self.raw = raw.json()
+            self.raw = json_respuesta(raw)
             self.type = "REST"
 
         if self.raw:
@@ -1,8 +1,24 @@
 import json
+import threading
 import requests
 import urllib
-from urllib.parse import urlencode
-from pyisim.exceptions import NotFoundError, MultipleFoundError, AuthenticationError
+from urllib.parse import urlencode, urlsplit
+from pyisim.exceptions import (
+    AuthenticationError,
+    InvalidResponseError,
+    MultipleFoundError,
+    NotFoundError,
+)
+from pyisim import ratelimit
+from pyisim.cache import cached, invalidates, namespace
+from pyisim.concurrency import SingleFlight, coalesced
+from pyisim.retry import RetryPolicy
+from pyisim.transport import HTTPTransport
+
+try:
+    import orjson
+except ImportError:  # extra opcional: pip install pyisim[orjson]
+    orjson = None
 
 requests.packages.urllib3.disable_warnings()
 
@@ -13,19 +29,222 @@ requests.packages.urllib3.disable_warnings()
 # si viene con algún atrubuto, lo recupera
 
 
+# Respuestas que se consideran fallas transitorias del servidor
+RETRY_STATUS = (500, 502, 503, 504)
+# Métodos que se pueden repetir sin efectos adicionales. Los PUT de ISIM envían solicitudes (modificar personas,
+# completar actividades), por eso no se incluyen: ver RetryPolicy(idempotent=...)
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+
+def decodificar_json(data):
+    # Parsea el JSON directo de los bytes, con orjson si está instalado
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_respuesta(r):
+    # El cuerpo de cada respuesta se decodifica una sola vez: el resultado queda guardado en la respuesta
+    # y lo reutilizan las demás llamadas (ej. pyisim.response.Response)
+    try:
+        return r._pyisim_json
+    except AttributeError:
+        r._pyisim_json = decodificar_json(r.content)
+        return r._pyisim_json
+
+
+def lista_respuesta(r):
+    # Resultados de una búsqueda (requests o httpx). Solo un 2xx sin cuerpo es una búsqueda sin resultados:
+    # un error que queda tras los reintentos o una página HTML (login, error) no puede tomarse por una página vacía,
+    # porque los generadores paginados terminan en la primera página vacía
+    if not 200 <= r.status_code < 300:
+        raise InvalidResponseError(
+            f"HTTP {r.status_code} en {r.request.method} {r.url}: {r.text[:200]}"
+        )
+    if r.status_code == 204 or not r.content.strip():
+        return []
+    content_type = r.headers.get("Content-Type", "")
+    try:
+        if content_type and "json" not in content_type.lower():
+            raise ValueError(content_type)
+        return list(json_respuesta(r))
+    except ValueError:
+        raise InvalidResponseError(
+            f"Respuesta no JSON ({content_type or 'sin Content-Type'}) en {r.request.method} {r.url}: {r.text[:200]}"
+        ) from None
+
+
+def falla_transitoria(r):
+    # r es la respuesta o la excepción de conexión/timeout
+    return isinstance(r, Exception) or r.status_code in RETRY_STATUS
+
+
+def recurso(url):
+    # ej. https://<ITIMURL>/itim/rest/people/ZXJnbG9... -> /itim/rest/people
+    return "/".join(urlsplit(url).path.split("/")[:4])
+
+
+def endpoint(method, url):
+    return method + " " + recurso(url)
+
+
+# Familia de límite de peticiones de las escrituras, según el recurso (ver pyisim.ratelimit)
+WRITE_FAMILIES = {
+    "/itim/rest/people": ratelimit.PERSON_WRITE,
+    "/itim/rest/access": ratelimit.ACCOUNT_WRITE,
+    "/itim/rest/workitems": ratelimit.WORKFLOW,
+}
+
+
+def familia(method, url):
+    if method in ("GET", "HEAD"):
+        return ratelimit.READ
+    return WRITE_FAMILIES.get(recurso(url), ratelimit.WRITE)
+
+
+def tags_persona(persona, href, *args):
+    return [href, persona.get("_attributes", {}).get("dn")]
+
+
+def tags_solicitud(accesos, persona, *args):
+    # no se usa persona.dn para no buscar el DN si no está cargado
+    return [persona.href, vars(persona).get("dn")]
+
+
+def tags_actividad(actividad, *args):
+    return [actividad.get("_links", {}).get("self", {}).get("href")]
+
+
+def tags_actividades(actividades, *args):
+    return [t for a in actividades for t in tags_actividad(a)]
+
+
 class ISIMClient:
-    def __init__(self, url, user_, pass_, cert_path=None):
+    def __init__(
+        self,
+        url,
+        user_,
+        pass_,
+        cert_path=None,
+        state=None,
+        pool_size=10,
+        transport=None,
+        retry=None,
+        rate_limiter=None,
+        cache=None,
+    ):
 
         self.__addr = url
-        self.s, self.CSRF = self.autenticar(user_, pass_, cert_path)
+        self.__user = user_
+        self.__pass = pass_
+        self.__cert = cert_path
+        self.__login_lock = threading.Lock()
+        self.transport = transport or HTTPTransport(cert_path, pool_size=pool_size)
+        self.retry = retry or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.cache_namespace = namespace(url, user_)
+        self.flights = SingleFlight()
+        self.relogins = 0
+        restaurada = self.restaurar(state) if state else None
+        # La sesión y su token CSRF se reemplazan juntos, para que ningún hilo use el token de otra sesión
+        self.__sesion = restaurada or self.autenticar(user_, pass_, cert_path)
+
+    @property
+    def s(self):
+        return self.__sesion[0]
+
+    @property
+    def CSRF(self):
+        return self.__sesion[1]
+
+    def nueva_sesion(self, cert=None):
+        # Las sesiones nuevas (login, re-login) usan el pool de conexiones del transporte
+        s = self.transport.new_session()
+        if cert:
+            s.verify = cert
+        return s
+
+    def exportar(self):
+        # Estado de la sesión (ver pyisim.store.SessionStore)
+        cookies = [
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+            for c in self.s.cookies
+        ]
+        return {"cookies": cookies, "csrf": self.CSRF}
+
+    def restaurar(self, state):
+        # Reutiliza las cookies de una sesión anterior. Una sola petición valida que sigan vigentes
+        # y entrega el token CSRF. Si no lo están, devuelve None para hacer el login completo.
+        s = self.nueva_sesion()
+        for cookie in state["cookies"]:
+            s.cookies.set(**cookie)
+
+        url = self.__addr + "/itim/rest/systemusers/me"
+        r = s.get(url, headers={"Accept": "*/*"})
+        if (
+            r.status_code != 200
+            or self.sesion_expirada(r)
+            or "CSRFToken" not in r.headers
+        ):
+            # no se cierra la sesión: cerraría el pool de conexiones compartido
+            return None
+        return s, r.headers["CSRFToken"]
+
+    def reautenticar(self, s):
+        # Solo un hilo vuelve a autenticarse, los demás esperan el lock y usan la nueva sesión
+        with self.__login_lock:
+            if self.s is s:
+                self.__sesion = self.autenticar(self.__user, self.__pass, self.__cert)
+                self.relogins += 1
+
+    def sesion_expirada(self, response):
+        # La sesión expiró (redirige al login o responde ISIMLoginRequired) o se rechazó el token CSRF
+        return (
+            response.status_code == 401
+            or (response.status_code == 403 and "CSRFToken" in response.request.headers)
+            or "/restlogin/login.jsp" in response.url
+            or b"ISIMLoginRequired" in response.content
+        )
+
+    def _request(self, method, url, **kwargs):
+        # Todas las llamadas al API pasan por aquí. Las fallas transitorias se reintentan (solo lecturas y las
+        # escrituras declaradas en RetryPolicy.idempotent) y cada endpoint tiene su circuit breaker.
+        return self.retry.call(
+            endpoint(method, url),
+            lambda: self.__request(method, url, **kwargs),
+            retry=method in IDEMPOTENT_METHODS
+            or endpoint(method, url) in self.retry.idempotent,
+            errors=(requests.ConnectionError, requests.Timeout),
+            transient=falla_transitoria,
+        )
+
+    def __request(self, method, url, **kwargs):
+        # Si la sesión expiró, se autentica de nuevo (una sola vez para todos los hilos) y se repite la llamada.
+        if self.rate_limiter:
+            self.rate_limiter.acquire(familia(method, url))
+        sesion = self.__sesion
+        r = self.__enviar(sesion, method, url, **kwargs)
+
+        if self.sesion_expirada(r):
+            self.reautenticar(sesion[0])
+            r = self.__enviar(self.__sesion, method, url, **kwargs)
+
+        return r
+
+    def __enviar(self, sesion, method, url, headers=None, **kwargs):
+        # El token CSRF se toma de la misma sesión que hace la llamada
+        s, CSRF = sesion
+        if headers and "CSRFToken" in headers:
+            headers = {**headers, "CSRFToken": CSRF}
+        return s.request(method, url, headers=headers, **kwargs)
 
     def autenticar(self, user_, pass_, cert=None):
 
         assert cert is not None, "No certificate passed"
         url = self.__addr + "/itim/restlogin/login.jsp"
-        s = requests.Session()
+        s = self.nueva_sesion(cert)
         # print(cert)
-        s.verify = cert
         headers = {"Accept": "*/*"}
         r1 = s.get(url, headers=headers)
 
@@ -50,8 +269,15 @@ class ISIMClient:
             )
         return s, CSRF
 
+    @cached("container_search")
     def buscarOUs(
-        self, profile_name, filtro, buscar_por=None, attributes="", limit=100
+        self,
+        profile_name,
+        filtro,
+        buscar_por=None,
+        attributes="",
+        limit=100,
+        start=None,
     ):
 
         url = self.__addr + "/itim/rest/organizationcontainers/" + profile_name
@@ -80,14 +306,22 @@ class ISIMClient:
             buscar_por = name_attrs[profile_name]
 
         data = {"attributes": attributes, "limit": limit, buscar_por: filtro}
+        headers = self.rango(start, limit)
 
-        OUs = json.loads(self.s.get(url, params=data).text)
+        OUs = json_respuesta(self._request("GET", url, params=data, headers=headers))
 
         return list(OUs)
 
     # si filtro="*" busca todo
     def buscarPersonas(
-        self, perfil, atributos="cn", embedded="", buscar_por="cn", filtro="*", limit=50
+        self,
+        perfil,
+        atributos="cn",
+        embedded="",
+        buscar_por="cn",
+        filtro="*",
+        limit=50,
+        start=None,
     ):
 
         assert perfil.lower() in ("person", "bpperson")
@@ -102,19 +336,11 @@ class ISIMClient:
             "limit": limit,
             buscar_por: filtro,
         }
-        headers = {"Cache-Control": "no-cache"}
+        headers = {"Cache-Control": "no-cache", **self.rango(start, limit)}
         data = urlencode(data, quote_via=urllib.parse.quote)
 
-        try:
-            response = self.s.get(url, params=data, headers=headers).text
-            if response.find("ISIMLoginRequired") != -1:
-                # TODO handle this
-                raise Exception("Please login.")
-            personas = json.loads(response)
-        except Exception:
-            personas = []
-
-        return list(personas)
+        response = self._request("GET", url, params=data, headers=headers)
+        return lista_respuesta(response)
 
     def crearPersona(self, person, orgid, justification):
 
@@ -127,8 +353,11 @@ class ISIMClient:
         #     raise Exception(
         #         "No es una tipo válido de persona. Seleccione un tipo de persona entre los siguientes: "+str(tipos))
 
-        person_data = person.__dict__.copy()
-        person_data.pop("changes", "")
+        person_data = {
+            k: v
+            for k, v in person.__dict__.items()
+            if k != "changes" and not k.startswith("_")
+        }
 
         data = {
             "justification": justification,
@@ -144,9 +373,10 @@ class ISIMClient:
             # "X-HTTP-Method-Override": "submit-in-batch" FP2
         }
 
-        ret = self.s.post(url, json=data, headers=headers)
+        ret = self._request("POST", url, json=data, headers=headers)
         return ret
 
+    @invalidates(lambda href, *args: [href])
     def modificarPersona(self, href, changes, justification):
         url = self.__addr + href
 
@@ -161,7 +391,7 @@ class ISIMClient:
             "Accept": "*/*",
         }
 
-        ret = self.s.put(url, json=data, headers=headers)
+        ret = self._request("PUT", url, json=data, headers=headers)
         return ret
 
     def buscarAcceso(
@@ -171,6 +401,7 @@ class ISIMClient:
         filtro="*",
         limit=20,
         requestee_href=None,
+        start=None,
     ):
 
         url = self.__addr + "/itim/rest/access"
@@ -184,11 +415,21 @@ class ISIMClient:
         }
         data = urlencode(data, quote_via=urllib.parse.quote)
 
-        res = self.s.get(url, params=data).text
-        accesos = json.loads(res)
+        headers = self.rango(start, limit)
+
+        res = self._request("GET", url, params=data, headers=headers)
+        accesos = json_respuesta(res)
 
         return list(accesos)
 
+    def rango(self, start, limit):
+        # Paginación del API REST: devuelve los resultados [start, start + limit - 1]
+        if start is None:
+            return {}
+        if limit is None:
+            return {"Range": f"items={start}-"}
+        return {"Range": f"items={start}-{start + limit - 1}"}
+
     def verificarResultadoUnico(self, json_):
         if len(json_) > 1:
             raise MultipleFoundError()
@@ -207,7 +448,9 @@ class ISIMClient:
 
         return {"_links": {tipo: {"href": json_["_links"]["self"]["href"]}}}
 
-    def buscarActividad(self, search_attr="activityName", search_filter="*"):
+    def buscarActividad(
+        self, search_attr="activityName", search_filter="*", limit=None, start=None
+    ):
 
         url = self.__addr + "/itim/rest/activities"
         data = {
@@ -216,12 +459,15 @@ class ISIMClient:
             search_attr: search_filter,
         }
 
-        headers = {"Cache-Control": "no-cache"}
+        headers = {"Cache-Control": "no-cache", **self.rango(start, limit)}
 
-        actividades = json.loads(self.s.get(url, params=data, headers=headers).text)
+        actividades = json_respuesta(
+            self._request("GET", url, params=data, headers=headers)
+        )
 
         return list(actividades)
 
+    @invalidates(tags_solicitud)
     def solicitarAccesos(self, accesos, persona, justification):
         url = self.__addr + "/itim/rest/access/assignments"
 
@@ -251,14 +497,14 @@ class ISIMClient:
         }
 
         # print(data)
-        return self.s.post(url, json=data, headers=headers)
+        return self._request("POST", url, json=data, headers=headers)
 
     def parse_rfi_form(self, workitem_id, rfi_values):
 
-        response = self.s.get(
-            f"{self.__addr}/itim/rest/activities/rfiformdetails/{workitem_id}"
+        response = self._request(
+            "GET", f"{self.__addr}/itim/rest/activities/rfiformdetails/{workitem_id}"
         )
-        form_details = json.loads(response.text)
+        form_details = json_respuesta(response)
         # esto es un arreglo con la info del formulario
         form = form_details["template"]["page"]["body"]["tabbedForm"]["tab"]
 
@@ -297,6 +543,7 @@ class ISIMClient:
         return rfi_form
 
     # falta tener en cuenta cuando llegan varias actividades
+    @invalidates(tags_actividades)
     def completarActividades(self, actividades, resultado, justification="ok"):
 
         url = self.__addr + "/itim/rest/workitems"
@@ -360,7 +607,9 @@ class ISIMClient:
                     "Accept": "*/*",
                 }
 
-                return self.s.put(f"{url}/{workitem_id}", json=action, headers=headers)
+                return self._request(
+                    "PUT", f"{url}/{workitem_id}", json=action, headers=headers
+                )
 
             body.append(action)
 
@@ -372,7 +621,7 @@ class ISIMClient:
             "methodOverride": "submit-in-batch",
         }
 
-        return self.s.put(url, json=body, headers=headers)
+        return self._request("PUT", url, json=body, headers=headers)
 
     def buscarFormulario(self, perfil):
 
@@ -381,10 +630,11 @@ class ISIMClient:
         assert perfil in ["Person", "BPPerson"], "Invalid profile."
 
         urlPerfil = url + "/" + perfil
-        resp = self.s.get(urlPerfil)
+        resp = self._request("GET", urlPerfil)
 
-        return json.loads(resp.text)["template"]["page"]["body"]["tabbedForm"]["tab"]
+        return json_respuesta(resp)["template"]["page"]["body"]["tabbedForm"]["tab"]
 
+    @coalesced()
     def buscarServicio(self, search_attr, search_filter, limit, atributos=""):
 
         url = self.__addr + "/itim/rest/services"
@@ -396,7 +646,7 @@ class ISIMClient:
         }
         data = urlencode(data, quote_via=urllib.parse.quote)
 
-        servicios = json.loads(self.s.get(url, params=data).content)
+        servicios = json_respuesta(self._request("GET", url, params=data))
 
         if len(servicios) == 0:
             raise NotFoundError(f"Service not found: ({search_attr}={search_filter})")
@@ -428,20 +678,22 @@ class ISIMClient:
         url_req = url + "/" + requestID
         data = {"attributes": "*"}
 
-        solicitud = json.loads(self.s.get(url_req, params=data).text)
+        solicitud = json_respuesta(self._request("GET", url_req, params=data))
 
         return solicitud
 
+    @cached("activity", tags=tags_actividad)
     def lookupActividad(self, activityID):
         url = self.__addr + "/itim/rest/activities"
 
         url_act = url + "/" + activityID
         data = {"attributes": "*"}
 
-        actividad = json.loads(self.s.get(url_act, params=data).text)
+        actividad = json_respuesta(self._request("GET", url_act, params=data))
 
         return actividad
 
+    @cached("person", tags=tags_persona)
     def lookupPersona(self, href, attributes="dn"):
         url = self.__addr + href
 
@@ -450,9 +702,9 @@ class ISIMClient:
             "forms": False,
         }
 
-        person = self.s.get(url, params=params)
+        person = self._request("GET", url, params=params)
 
-        return json.loads(person.text)
+        return json_respuesta(person)
 
     def lookupCurrentPerson(self, attributes="*", embedded=""):
         url = self.__addr + "/itim/rest/people/me"
@@ -462,6 +714,6 @@ class ISIMClient:
             "embedded": embedded,
         }
 
-        person = self.s.get(url, params=params)
+        person = self._request("GET", url, params=params)
 
-        return json.loads(person.text)
+        return json_respuesta(person)
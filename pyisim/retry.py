@@ -0,0 +1,257 @@
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, Tuple, Type
+
+from pyisim.exceptions import CircuitOpenError
+
+# Estados del circuit breaker
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an endpoint after failure_threshold consecutive transient failures. After reset_timeout seconds
+    a single trial call is let through: if it succeeds the breaker closes again, otherwise it stays open.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        Args:
+            failure_threshold (int, optional): Consecutive failures that open the breaker. Defaults to 5.
+            reset_timeout (float, optional): Seconds the breaker stays open before a trial call. Defaults to 30.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.__lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Returns:
+            bool: True if a call can be made now.
+        """
+        with self.__lock:
+            if self.state == CLOSED:
+                return True
+            if (
+                self.state == OPEN
+                and time.monotonic() - self.opened_at >= self.reset_timeout
+            ):
+                # solo una llamada de prueba
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def success(self) -> None:
+        with self.__lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def abandon(self) -> None:
+        """
+        Called when a call ends without a success or failure outcome (e.g. it was cancelled or raised a
+        non-transient error). A trial call in that state gives way to a new trial.
+        """
+        with self.__lock:
+            if self.state == HALF_OPEN:
+                # opened_at no cambia: la siguiente llamada puede volver a probar
+                self.state = OPEN
+
+    def failure(self) -> bool:
+        """
+        Records a transient failure.
+
+        Returns:
+            bool: True if this failure opened the breaker.
+        """
+        with self.__lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED and self.failures >= self.failure_threshold
+            ):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class RetryPolicy:
+    """
+    Retries transient failures (connection errors, timeouts, 5xx responses, transient SOAP faults) of ISIM calls
+    with exponential backoff and full jitter, and keeps a circuit breaker per endpoint.
+
+    Only reads are retried by default: ISIM writes submit a request, and retrying one the server already accepted
+    would submit it twice. Writes known to be safe to repeat can be opted in by SOAP operation name or by REST
+    endpoint ("METHOD /itim/rest/resource"). Every call, retried or not, goes through the endpoint breaker.
+    A Session shares one policy between its REST and SOAP clients, so metrics() covers both::
+
+        policy = RetryPolicy(max_attempts=5, backoff=1, idempotent={"modifyStaticRole"})
+        sess = Session(url, user, password, cert, retry=policy)
+        ...
+        sess.retry.metrics()
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        idempotent: Iterable[str] = (),
+    ):
+        """
+        Args:
+            max_attempts (int, optional): Attempts per call, including the first one. Defaults to 4.
+            backoff (float, optional): Base delay in seconds, doubled on each retry. Defaults to 0.5.
+            max_backoff (float, optional): Maximum delay in seconds. Defaults to 30.
+            failure_threshold (int, optional): Consecutive transient failures that open an endpoint breaker. Defaults to 5.
+            reset_timeout (float, optional): Seconds an open breaker waits before a trial call. Defaults to 30.
+            idempotent (Iterable[str], optional): Writes that may be retried, as SOAP operation names (e.g. "modifyAccount") or REST endpoints (e.g. "PUT /itim/rest/people"). Defaults to none.
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.idempotent = frozenset(idempotent)
+        self.__breakers = {}
+        self.__metrics = defaultdict(lambda: defaultdict(int))
+        self.__lock = threading.Lock()
+
+    def delays(self) -> Iterator[float]:
+        """
+        Yields:
+            float: Seconds to wait before each retry.
+        """
+        for attempt in range(self.max_attempts - 1):
+            yield random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self.__lock:
+            if endpoint not in self.__breakers:
+                self.__breakers[endpoint] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout
+                )
+            return self.__breakers[endpoint]
+
+    def _count(self, endpoint, metric):
+        with self.__lock:
+            self.__metrics[endpoint][metric] += 1
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns:
+            Dict[str, Dict[str, int]]: Per endpoint calls, failures, retries, trips, rejected (calls refused by an open breaker) and breaker state.
+        """
+        with self.__lock:
+            ret = {e: dict(m) for e, m in self.__metrics.items()}
+            for endpoint, breaker in self.__breakers.items():
+                ret.setdefault(endpoint, {})["state"] = breaker.state
+        return ret
+
+    def _attempts(self, endpoint, retry):
+        # Genera (breaker, delay antes del siguiente intento o None si es el último)
+        breaker = self.breaker(endpoint)
+        delays = list(self.delays()) if retry else []
+        for delay in delays + [None]:
+            if not breaker.allow():
+                self._count(endpoint, "rejected")
+                raise CircuitOpenError(
+                    f"Circuit open for {endpoint} after repeated failures"
+                )
+            self._count(endpoint, "calls")
+            yield breaker, delay
+
+    def _failed(self, endpoint, breaker, delay):
+        self._count(endpoint, "failures")
+        if breaker.failure():
+            self._count(endpoint, "trips")
+        if delay is not None:
+            self._count(endpoint, "retries")
+
+    def call(
+        self,
+        endpoint: str,
+        fn: Callable,
+        retry: bool,
+        errors: Tuple[Type[BaseException], ...] = (),
+        transient: Callable = None,
+    ):
+        """
+        Calls fn() through the endpoint breaker, retrying transient failures.
+
+        Args:
+            endpoint (str): Breaker and metrics key.
+            fn (Callable): Call to make.
+            retry (bool): Retry transient failures. Only for reads and writes declared idempotent.
+            errors (tuple, optional): Exceptions that may be transient.
+            transient (Callable, optional): Returns True if an exception from errors, or a returned value, is a transient failure.
+
+        Raises:
+            CircuitOpenError: The endpoint breaker is open.
+
+        Returns:
+            Result of the last attempt. Transient results are returned as-is if no attempts are left.
+        """
+        for breaker, delay in self._attempts(endpoint, retry):
+            try:
+                result = fn()
+            except errors as e:
+                if transient and not transient(e):
+                    breaker.success()
+                    raise
+                self._failed(endpoint, breaker, delay)
+                if delay is None:
+                    raise
+            except BaseException:
+                # cancelaciones y errores fuera de errors: no deben dejar el breaker en half-open
+                breaker.abandon()
+                raise
+            else:
+                if not (transient and transient(result)):
+                    breaker.success()
+                    return result
+                self._failed(endpoint, breaker, delay)
+                if delay is None:
+                    return result
+            time.sleep(delay)
+
+    async def acall(
+        self,
+        endpoint: str,
+        fn: Callable,
+        retry: bool,
+        errors: Tuple[Type[BaseException], ...] = (),
+        transient: Callable = None,
+    ):
+        """Same as call(), for coroutine functions. Waits with asyncio.sleep()."""
+        for breaker, delay in self._attempts(endpoint, retry):
+            try:
+                result = await fn()
+            except errors as e:
+                if transient and not transient(e):
+                    breaker.success()
+                    raise
+                self._failed(endpoint, breaker, delay)
+                if delay is None:
+                    raise
+            except BaseException:
+                # cancelaciones y errores fuera de errors: no deben dejar el breaker en half-open
+                breaker.abandon()
+                raise
+            else:
+                if not (transient and transient(result)):
+                    breaker.success()
+                    return result
+                self._failed(endpoint, breaker, delay)
+                if delay is None:
+                    return result
+            await asyncio.sleep(delay)
@@ -1,5 +1,6 @@
 from pyisim.entities.role import Role
 from pyisim.exceptions import InvalidOptionError
+from pyisim.records import AccountRecord, PersonRecord
 from pyisim.entities import (
     Activity,
     Access,
@@ -13,7 +14,10 @@ from pyisim.entities import (
     Account,
 )
 
-from typing import List, TYPE_CHECKING
+import string
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, List, TYPE_CHECKING, Union
 
 if TYPE_CHECKING:
     from pyisim.auth import Session
@@ -65,7 +69,8 @@ def people(
     profile_name="Person",
     attributes="*",
     limit=50,
-) -> List[Person]:
+    compact=False,
+) -> List[Union[Person, PersonRecord]]:
     """
     Person search
 
@@ -76,23 +81,38 @@ def people(
         profile_name (str, optional): Person/BPPerson. Defaults to "Person".
         attributes (str, optional): Attributes to return in the Person instance. Defaults to "*".
         limit (int, optional): Defaults to 50.
+        compact (bool, optional): Return read-only PersonRecords instead of Person entities, for large result sets. Defaults to False.
 
     Returns:
-        List[Person]: Search results
+        List[Union[Person, PersonRecord]]: Search results
     """
 
     ret = session.restclient.buscarPersonas(
         profile_name,
-        atributos=attributes,
+        atributos=_with_dn(attributes),
         embedded="",
         buscar_por=by,
         filtro=search_filter,
         limit=limit,
     )
-    personas = [Person(session, person=p) for p in ret]
+    if compact:
+        return [PersonRecord.from_rest(p) for p in ret]
+    personas = [Person(session, person=p, attributes=attributes) for p in ret]
     return personas
 
 
+def _with_dn(attributes: str) -> str:
+    """
+    Adds the DN to an explicit attribute projection so people don't need a lookup each to get it.
+
+    "*" is left as is: the DN of those results is resolved on first access.
+    """
+    attrs = [a.strip() for a in attributes.split(",") if a.strip()]
+    if "*" in attrs or "dn" in [a.lower() for a in attrs]:
+        return attributes
+    return ",".join(attrs + ["dn"])
+
+
 def provisioning_policy(
     session: "Session", name: str, parent: OrganizationalContainer
 ) -> List[ProvisioningPolicy]:
@@ -131,7 +151,7 @@ def roles(session: "Session", by="errolename", search_filter="*") -> List[Role]:
     results = soap.buscarRol(f"({by}={search_filter})", find_unique=False)
 
     is_dynamic = [
-        any(filter(lambda i: i.name == "erjavascript", r.attributes.item))  # type: ignore
+        any(i["name"] == "erjavascript" for i in r["attributes"]["item"])
         for r in results
     ]
     return [
@@ -157,7 +177,7 @@ def activities(
 
     if by == "requestId":
         results = session.soapclient.buscarActividadesDeSolicitud(search_filter)
-        return [Activity(session, id=a.id) for a in results]
+        return [Activity(session, id=a["id"]) for a in results]
 
     else:
         results = session.restclient.buscarActividad(
@@ -258,19 +278,340 @@ def account(
     session: "Session",
     ldap_search_filter: str,
     service: "Service" = None,
-) -> List[Account]:
+    compact: bool = False,
+) -> List[Union[Account, AccountRecord]]:
+    """
+    Account search
+
+    Args:
+        session (Session): Active ISIM Session
+        ldap_search_filter (str): LDAP filter
+        service (Service, optional): Only return accounts of this service. Defaults to None.
+        compact (bool, optional): Return read-only AccountRecords instead of Account entities, for large result sets. Defaults to False.
+
+    Returns:
+        List[Union[Account, AccountRecord]]: Search results
+    """
 
     args = {"filter": ldap_search_filter}
+    build = (
+        AccountRecord.from_soap if compact else lambda r: Account(session, account=r)
+    )
 
     if service:
         profile_name = session.soapclient.getAccountProfileForService(service.dn)
         args["profile"] = profile_name
         results = session.soapclient.searchAccounts(args)
-        return [
-            Account(session, account=r)
-            for r in results
-            if r["serviceName"] == service.name
-        ]
+        return [build(r) for r in results if r["serviceName"] == service.name]
     else:
         results = session.soapclient.searchAccounts(args)
-        return [Account(session, account=r) for r in results]
+        return [build(r) for r in results]
+
+
+def iter_account(
+    session: "Session",
+    ldap_search_filter: str,
+    service: "Service" = None,
+    attributes: List[str] = None,
+) -> Iterator[AccountRecord]:
+    """
+    Account search without holding the results in memory. The SOAP response is parsed as it arrives and accounts
+    are yielded one at a time, so memory use doesn't grow with the number of accounts found.
+
+    Args:
+        session (Session): Active ISIM Session
+        ldap_search_filter (str): LDAP filter
+        service (Service, optional): Only return accounts of this service. Defaults to None.
+        attributes (List[str], optional): Account attributes to keep, the rest are discarded while parsing. Defaults to None (all).
+
+    Yields:
+        AccountRecord: Search results
+    """
+
+    args = {"filter": ldap_search_filter}
+    if service:
+        args["profile"] = session.soapclient.getAccountProfileForService(service.dn)
+
+    for r in session.soapclient.streamSearchAccounts(args, attributes):
+        if not service or r.service_name == service.name:
+            yield r
+
+
+def _pages(
+    fetch: Callable[[int, int], List], page_size: int, start: int
+) -> Iterator[List]:
+    """
+    Yields result pages from fetch(start, page_size) until a short page is returned.
+
+    The next page is requested in a background thread while the current one is being consumed,
+    so at most two pages are held in memory.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_page = executor.submit(fetch, start, page_size)
+        previous_first = None
+        while True:
+            page = next_page.result()
+            # if the server ignores the Range header it keeps sending the first page
+            if not page or (previous_first is not None and page[0] == previous_first):
+                return
+            previous_first = page[0]
+            start += len(page)
+            last = len(page) < page_size
+            if not last:
+                next_page = executor.submit(fetch, start, page_size)
+            yield page
+            if last:
+                return
+
+
+def iter_people(
+    session: "Session",
+    search_filter="*",
+    by="cn",
+    profile_name="Person",
+    attributes="*",
+    page_size=100,
+    start=0,
+) -> Iterator[Person]:
+    """
+    Person search without result limit. Yields people page by page, keeping only the current page in memory
+    while the next one is fetched in the background.
+
+    To resume an interrupted iteration, pass the number of people already consumed as start.
+
+    Args:
+        session (Session): Active ISIM Session
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+        by (str, optional): LDAP Attribute to search by. Defaults to "cn".
+        profile_name (str, optional): Person/BPPerson. Defaults to "Person".
+        attributes (str, optional): Attributes to return in the Person instance. Defaults to "*".
+        page_size (int, optional): People requested per page. Defaults to 100.
+        start (int, optional): Position of the first result (cursor). Defaults to 0.
+
+    Yields:
+        Person: Search results
+    """
+
+    def fetch(start, limit):
+        return session.restclient.buscarPersonas(
+            profile_name,
+            atributos=_with_dn(attributes),
+            embedded="",
+            buscar_por=by,
+            filtro=search_filter,
+            limit=limit,
+            start=start,
+        )
+
+    for page in _pages(fetch, page_size, start):
+        for p in page:
+            yield Person(session, person=p, attributes=attributes)
+
+
+def iter_access(
+    session: "Session",
+    by="accessName",
+    search_filter="*",
+    attributes="",
+    page_size=100,
+    start=0,
+) -> Iterator[Access]:
+    """
+    Access search without result limit. Yields accesses page by page (see iter_people()).
+
+    Args:
+        session (Session): Active ISIM Session
+        by (str, optional): Defaults to "accessName".
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+        page_size (int, optional): Accesses requested per page. Defaults to 100.
+        start (int, optional): Position of the first result (cursor). Defaults to 0.
+
+    Yields:
+        Access: Search results
+    """
+
+    def fetch(start, limit):
+        return session.restclient.buscarAcceso(
+            by=by, filtro=search_filter, atributos=attributes, limit=limit, start=start
+        )
+
+    for page in _pages(fetch, page_size, start):
+        for a in page:
+            yield Access(access=a)
+
+
+def iter_organizational_container(
+    session: "Session",
+    profile_name: str,
+    search_filter: str,
+    by="name",
+    page_size=100,
+    start=0,
+) -> Iterator[OrganizationalContainer]:
+    """
+    Organizational container search without result limit. Yields containers page by page (see iter_people()).
+
+    Args:
+        session (Session): Active ISIM Session
+        profile_name (str): Organizational container profile name. See organizational_container().
+        search_filter (str): Filter to search by.
+        by (str, optional): Attribute to search by. Defaults to "name".
+        page_size (int, optional): Containers requested per page. Defaults to 100.
+        start (int, optional): Position of the first result (cursor). Defaults to 0.
+
+    Yields:
+        OrganizationalContainer: Search results
+    """
+
+    buscar_por = None if by == "name" else by
+
+    def fetch(start, limit):
+        return session.restclient.buscarOUs(
+            profile_name,
+            buscar_por=buscar_por,
+            filtro=search_filter,
+            attributes="dn",
+            limit=limit,
+            start=start,
+        )
+
+    for page in _pages(fetch, page_size, start):
+        for ou in page:
+            yield OrganizationalContainer(session, organizational_container=ou)
+
+
+def iter_activities(
+    session: "Session", by="activityName", search_filter="*", page_size=100, start=0
+) -> Iterator[Activity]:
+    """
+    Pending activity search without result limit. Yields activities page by page (see iter_people()).
+
+    Args:
+        session (Session): Active ISIM Session
+        by (str, optional): Filters available in ISIMs REST API docs (activityId, activityName, serviceName, participantName). Defaults to "activityName".
+        search_filter (str, optional): Filter to search by. Defaults to "*".
+        page_size (int, optional): Activities requested per page. Defaults to 100.
+        start (int, optional): Position of the first result (cursor). Defaults to 0.
+
+    Yields:
+        Activity: Search results
+    """
+
+    def fetch(start, limit):
+        return session.restclient.buscarActividad(
+            search_attr=by, search_filter=search_filter, limit=limit, start=start
+        )
+
+    for page in _pages(fetch, page_size, start):
+        for a in page:
+            yield Activity(session, activity=a)
+
+
+SHARD_ALPHABET = string.ascii_lowercase + string.digits + "áéíóúñü .-_'@"
+"""
+First characters of the person search shards in scan_people(). LDAP matching is case insensitive.
+"""
+
+
+def scan_people(
+    session: "Session",
+    by="cn",
+    profile_name="Person",
+    attributes="*",
+    shard_limit=500,
+    max_workers=8,
+    alphabet=SHARD_ALPHABET,
+    complete=True,
+) -> Iterator[Person]:
+    """
+    Full directory person scan.
+
+    Splits the search keyspace by filter prefix (cn=a*, cn=b*, ...) and runs each shard in a worker pool.
+    Every shard that fills a page of shard_limit results is read page by page (Range header, see iter_people()),
+    with each next page requested as a new task of the pool, so no search is ever truncated by the REST API limit.
+    People found in more than one shard are returned once.
+
+    The shards only hold people whose search attribute starts with a character in the alphabet. With complete=True,
+    a final pass pages the unfiltered search projecting only the DN, and yields the people no shard returned
+    (e.g. names starting with "ç" or "("). Their other attributes are loaded on first access.
+
+    Args:
+        session (Session): Active ISIM Session
+        by (str, optional): LDAP Attribute to shard by. Defaults to "cn".
+        profile_name (str, optional): Person/BPPerson. Defaults to "Person".
+        attributes (str, optional): Attributes to return in the Person instance. Defaults to "*".
+        shard_limit (int, optional): Results requested per shard page. Defaults to 500.
+        max_workers (int, optional): Concurrent shard searches. Defaults to 8.
+        alphabet (str, optional): First characters of the shards. Defaults to SHARD_ALPHABET.
+        complete (bool, optional): Run the final pass for people outside the alphabet. Defaults to True.
+
+    Yields:
+        Person: Search results, in no particular order
+    """
+
+    def fetch(prefix, start=0, previous_first=None):
+        results = session.restclient.buscarPersonas(
+            profile_name,
+            atributos=_with_dn(attributes),
+            embedded="",
+            buscar_por=by,
+            filtro=prefix + "*",
+            limit=shard_limit,
+            start=start or None,
+        )
+        return prefix, start, previous_first, results
+
+    seen = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(fetch, c) for c in alphabet}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    prefix, start, previous_first, results = future.result()
+                    if not results:
+                        continue
+
+                    # si el servidor ignora el header Range, devuelve otra vez la primera página
+                    first = results[0]["_links"]["self"]["href"]
+                    if first == previous_first:
+                        warnings.warn(
+                            f"The server ignored the Range header, the results of {by}={prefix}* "
+                            f"after the first {start} are missing."
+                        )
+                        continue
+
+                    if len(results) >= shard_limit:
+                        pending.add(
+                            executor.submit(fetch, prefix, start + len(results), first)
+                        )
+
+                    for p in results:
+                        href = p["_links"]["self"]["href"]
+                        if href not in seen:
+                            seen.add(href)
+                            yield Person(session, person=p, attributes=attributes)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    if not complete:
+        return
+
+    # pasada final: quienes empiezan con un carácter fuera del alfabeto no están en ningún shard
+    def fetch_all(start, limit):
+        return session.restclient.buscarPersonas(
+            profile_name,
+            atributos="dn",
+            embedded="",
+            buscar_por=by,
+            filtro="*",
+            limit=limit,
+            start=start or None,
+        )
+
+    for page in _pages(fetch_all, shard_limit, 0):
+        for p in page:
+            if p["_links"]["self"]["href"] not in seen:
+                seen.add(p["_links"]["self"]["href"])
+                yield Person(session, person=p, attributes="dn")
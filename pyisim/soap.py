@@ -1,4 +1,10 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import etree
 from zeep import Client, Settings
+from zeep.exceptions import Fault, TransportError
 from zeep.xsd import Nil
 from zeep.transports import Transport
 from zeep.helpers import serialize_object
@@ -6,7 +12,14 @@ from zeep.cache import InMemoryCache
 
 # from isim_classes import StaticRole
 import requests
+from pyisim import ratelimit
+from pyisim.cache import cached, invalidates, namespace
+from pyisim.concurrency import SingleFlight, coalesced
 from pyisim.exceptions import NotFoundError
+from pyisim.rawxml import extractor
+from pyisim.records import AccountRecord
+from pyisim.retry import RetryPolicy
+from pyisim.transport import HTTPTransport
 
 # from pyisim.entities import OrganizationalContainer
 
@@ -14,12 +27,270 @@ from pyisim.exceptions import NotFoundError
 requests.packages.urllib3.disable_warnings()  # type: ignore
 
 
+# Textos con los que ISIM indica en un SOAP Fault que la WSSession ya no es válida
+SESSION_FAULTS = (
+    "invalidsession",
+    "sessionexpired",
+    "session is not valid",
+    "session has expired",
+)
+
+
+# Servicios SOAP usados por el cliente (ver ISIMClient.prewarm)
+SERVICES = [
+    "WSSessionService",
+    "WSAccountServiceService",
+    "WSGroupServiceService",
+    "WSOrganizationalContainerServiceService",
+    "WSPersonServiceService",
+    "WSProvisioningPolicyServiceService",
+    "WSRequestServiceService",
+    "WSRoleServiceService",
+    "WSSearchDataServiceService",
+    "WSServiceServiceService",
+]
+
+
+# Textos de SOAP Faults causados por fallas transitorias del servidor o del directorio
+TRANSIENT_FAULTS = (
+    "timed out",
+    "timeout",
+    "temporarily",
+    "unavailable",
+    "connection reset",
+    "connection refused",
+)
+
+
+def texto_fault(fault):
+    detail = (
+        etree.tostring(fault.detail, encoding="unicode")
+        if fault.detail is not None
+        else ""
+    )
+    return f"{fault.message} {detail}".lower()
+
+
+def sesion_expirada(fault):
+    text = texto_fault(fault)
+    return any(f in text for f in SESSION_FAULTS)
+
+
+def falla_transitoria(e):
+    # e es un Fault o una excepción de conexión/timeout
+    if isinstance(e, Fault):
+        text = texto_fault(e)
+        return any(f in text for f in TRANSIENT_FAULTS)
+    return isinstance(e, Exception)
+
+
+def reintentable(operation):
+    # Solo las lecturas. Las escrituras envían una solicitud de ISIM y un reintento puede duplicarla:
+    # se reintentan solo si se declaran en RetryPolicy(idempotent=...)
+    return operation.startswith(("lookup", "search", "get", "find"))
+
+
+def familia(operation):
+    # Familia de límite de peticiones de la operación (ver pyisim.ratelimit)
+    if operation.startswith(("lookup", "search", "get", "find")):
+        return ratelimit.READ
+    if "Person" in operation:
+        return ratelimit.PERSON_WRITE
+    if "Account" in operation:
+        return ratelimit.ACCOUNT_WRITE
+    if "Request" in operation:
+        return ratelimit.WORKFLOW
+    return ratelimit.WRITE
+
+
+def endpoint(client):
+    # ej. https://<ITIMURL>/itim/services/WSRoleServiceService -> WSRoleServiceService
+    return client.service._binding_options["address"].rsplit("/", 1)[-1]
+
+
+def tags_cuentas(cuentas, person_dn):
+    # La lista de cuentas de una persona se invalida al modificar la persona o cualquiera de sus cuentas
+    return [person_dn] + [c["itimDN"] for c in cuentas or []]
+
+
+def tags_propietario(service_dn, wsattrs, *args):
+    # Al crear una cuenta cambia la lista de cuentas del dueño (atributo owner)
+    return [v for a in wsattrs if a["name"] == "owner" for v in a["values"]["item"]]
+
+
+def tags_politica(ou, wsprovisioningpolicy, *args):
+    return [getattr(wsprovisioningpolicy, "itimDN", None)]
+
+
+def clave_servicio(ou, filtro, find_unique=True):
+    # La OU puede venir de zeep o del cache (dict), se identifica por su DN
+    return repr((ou["itimDN"], filtro, find_unique))
+
+
+def tags_servicios(servicios, *args, **kwargs):
+    servicios = servicios if isinstance(servicios, list) else [servicios]
+    return [s["itimDN"] for s in servicios]
+
+
+def tags_grupos(grupos, dn_servicio, *args):
+    return [dn_servicio] + [g["itimDN"] for g in grupos or []]
+
+
+def primer_arg(dn, *args, **kwargs):
+    # La mayoría de las escrituras reciben el DN de la entidad como primer argumento
+    return [dn]
+
+
+def tags_escritura_persona(dn, *args, href=None, **kwargs):
+    # Las búsquedas REST de la persona con la proyección "*" no traen el DN: se cachean solo con su href
+    return [dn, href]
+
+
+def enviar_stream(client, operation, *args):
+    # Envía la operación y devuelve la respuesta HTTP sin leer el cuerpo. Los errores se procesan como en zeep
+    binding = client.service._binding
+    options = client.service._binding_options
+    envelope, headers = binding._create(
+        operation, args, {}, client=client, options=options
+    )
+    response = client.transport.session.post(
+        options["address"],
+        data=etree.tostring(envelope),
+        headers=headers,
+        timeout=client.transport.operation_timeout,
+        stream=True,
+    )
+    if response.status_code != 200:
+        # lanza el Fault o TransportError correspondiente
+        binding.process_reply(client, binding.get(operation), response)
+    response.raw.decode_content = True
+    return response
+
+
+def elementos_stream(response, tag):
+    # Devuelve los elementos <tag> de la respuesta a medida que se parsean, liberando los ya procesados.
+    # Sin recover: una respuesta cortada o mal formada lanza XMLSyntaxError en vez de entregar registros a medias
+    try:
+        for _, element in etree.iterparse(
+            response.raw, events=("end",), tag="{*}" + tag, huge_tree=True
+        ):
+            yield element
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    finally:
+        response.close()
+
+
 class ISIMClient:
-    def __init__(self, url, user_, pass_, cert_path=None):
+    def __init__(
+        self,
+        url,
+        user_,
+        pass_,
+        cert_path=None,
+        state=None,
+        wsdl_cache=None,
+        pool_size=10,
+        transport=None,
+        retry=None,
+        rate_limiter=None,
+        cache=None,
+        raw_xml=False,
+    ):
 
         self.addr = url + "/itim/services/"
         self.cert_path = cert_path
-        self.s = self.login(user_, pass_)
+        self.wsdl_cache = wsdl_cache
+        self.transport = transport or HTTPTransport(cert_path, pool_size=pool_size)
+        self.retry = retry or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.cache_namespace = namespace(url, user_)
+        self.flights = SingleFlight()
+        self.raw_xml = raw_xml
+        self.__extractors = {}
+        self.load_times = {}
+        self.__client_locks = {}
+        self.__user = user_
+        self.__pass = pass_
+        self.__login_lock = threading.Lock()
+        self.relogins = 0
+        # Una WSSession restaurada no se valida aquí: si expiró, la primera llamada vuelve a hacer login (ver _call)
+        self.s = dict(state) if state else self.login(user_, pass_)
+
+    def exportar(self):
+        # Estado de la sesión (ver pyisim.store.SessionStore)
+        return dict(serialize_object(self.s))
+
+    def relogin(self, s):
+        # Solo un hilo vuelve a autenticarse, los demás esperan el lock y usan la nueva sesión
+        with self.__login_lock:
+            if self.s is s:
+                self.s = self.login(self.__user, self.__pass)
+                self.relogins += 1
+
+    def _call(self, client, operation, *args):
+        # Todas las operaciones pasan por aquí. Las fallas transitorias se reintentan (solo lecturas y las
+        # escrituras declaradas en RetryPolicy.idempotent) y cada servicio tiene su circuit breaker.
+        return self.retry.call(
+            endpoint(client),
+            lambda: self.__call(client, operation, *args),
+            retry=reintentable(operation) or operation in self.retry.idempotent,
+            errors=(requests.ConnectionError, requests.Timeout, TransportError, Fault),
+            transient=falla_transitoria,
+        )
+
+    def __call(self, client, operation, *args):
+        # Si la WSSession expiró, se autentica de nuevo (una sola vez para todos los hilos) y se repite la llamada.
+        if self.rate_limiter:
+            self.rate_limiter.acquire(familia(operation))
+        s = self.s
+        try:
+            return getattr(client.service, operation)(s, *args)
+        except Fault as e:
+            if not sesion_expirada(e):
+                raise
+
+        self.relogin(s)
+        return getattr(client.service, operation)(self.s, *args)
+
+    def _stream(self, client, operation, *args):
+        # Como _call, pero devuelve los elementos <operation>Return a medida que llegan, sin armar la respuesta
+        # completa. Solo se reintenta el envío: una falla a mitad de la lectura se propaga.
+        response = self.retry.call(
+            endpoint(client),
+            lambda: self.__send_stream(client, operation, *args),
+            retry=reintentable(operation) or operation in self.retry.idempotent,
+            errors=(requests.ConnectionError, requests.Timeout, TransportError, Fault),
+            transient=falla_transitoria,
+        )
+        return elementos_stream(response, operation + "Return")
+
+    def _read(self, client, operation, *args):
+        # Lecturas masivas (ver rawxml.OPERATIONS). Con raw_xml la respuesta se convierte con lxml directo
+        # a dicts, sin armar los objetos de zeep
+        if not self.raw_xml:
+            return self._call(client, operation, *args)
+
+        key = (endpoint(client), operation)
+        extract = self.__extractors.get(key)
+        if extract is None:
+            extract = self.__extractors[key] = extractor(client, operation)
+        return [extract(e) for e in self._stream(client, operation, *args)]
+
+    def __send_stream(self, client, operation, *args):
+        if self.rate_limiter:
+            self.rate_limiter.acquire(familia(operation))
+        s = self.s
+        try:
+            return enviar_stream(client, operation, s, *args)
+        except Fault as e:
+            if not sesion_expirada(e):
+                raise
+
+        self.relogin(s)
+        return enviar_stream(client, operation, self.s, *args)
 
     def login(self, user_, pass_):
         url = self.addr + "WSSessionService?wsdl"
@@ -36,26 +307,54 @@ class ISIMClient:
         client = getattr(self, client_name, None)
 
         if client is None:
-            settings = Settings(strict=False)
-            s = requests.Session()
-            s.verify = self.cert_path
-            client = Client(
-                url,
-                settings=settings,
-                transport=Transport(session=s, cache=InMemoryCache()),
-            )
-            # necesario porque los WSDL de SIM queman el puerto y no funciona con balanceador
-            client.service._binding_options["address"] = url[:-5]
-            setattr(self, client_name, client)
+            # un lock por cliente, para que los hilos concurrentes no carguen el mismo WSDL varias veces
+            with self.__client_locks.setdefault(client_name, threading.Lock()):
+                client = getattr(self, client_name, None)
+                if client is None:
+                    client = self.__create_client(url, client_name)
 
         return client
 
+    def __create_client(self, url, client_name):
+        inicio = time.perf_counter()
+        settings = Settings(strict=False)
+        transport = Transport(
+            session=self.transport.new_session(),
+            cache=self.wsdl_cache or InMemoryCache(),
+        )
+        wsdl = (
+            self.wsdl_cache.document(url, transport, settings)
+            if self.wsdl_cache
+            else url
+        )
+        client = Client(wsdl, settings=settings, transport=transport)
+        # necesario porque los WSDL de SIM queman el puerto y no funciona con balanceador.
+        # Se copian las opciones porque la definición del servicio puede ser compartida (ver WSDLCache)
+        client.service._binding_options = {
+            **client.service._binding_options,
+            "address": url[:-5],
+        }
+        setattr(self, client_name, client)
+        self.load_times[client_name] = time.perf_counter() - inicio
+
+        return client
+
+    def prewarm(self, services=SERVICES, max_workers=None):
+        # Carga en paralelo los clientes de los servicios indicados, para que la primera llamada
+        # a cada uno no tenga que esperar la descarga y el parseo del WSDL
+        urls = [self.addr + service + "?wsdl" for service in services]
+        with ThreadPoolExecutor(max_workers=max_workers or len(urls) or 1) as executor:
+            list(executor.map(self.get_client, urls))
+        return self.load_times
+
+    @cached("container", tags=lambda r, dn: [dn])
+    @coalesced()
     def lookupContainer(self, dn):
 
         url = self.addr + "WSOrganizationalContainerServiceService?wsdl"
         client = self.get_client(url)
 
-        cont = client.service.lookupContainer(self.s, dn)
+        cont = self._call(client, "lookupContainer", dn)
 
         return cont
 
@@ -64,7 +363,7 @@ class ISIMClient:
         url = self.addr + "WSOrganizationalContainerServiceService?wsdl"
         client = self.get_client(url)
 
-        ous = client.service.searchContainerByName(self.s, Nil, perfil, nombre)
+        ous = self._call(client, "searchContainerByName", Nil, perfil, nombre)
 
         return ous
 
@@ -73,7 +372,7 @@ class ISIMClient:
         url = self.addr + "WSProvisioningPolicyServiceService?wsdl"
         client = self.get_client(url)
 
-        politicas = client.service.getPolicies(self.s, wsou, nombre_politica)
+        politicas = self._read(client, "getPolicies", wsou, nombre_politica)
 
         if find_unique:
             assert (
@@ -91,24 +390,26 @@ class ISIMClient:
         url = self.addr + "WSProvisioningPolicyServiceService?wsdl"
         client = self.get_client(url)
 
-        s = client.service.createPolicy(self.s, ou, wsprovisioningpolicy, date)
+        s = self._call(client, "createPolicy", ou, wsprovisioningpolicy, date)
 
         return s
 
+    @invalidates(tags_politica)
     def modificarPolitica(self, ou, wsprovisioningpolicy, date):
 
         url = self.addr + "WSProvisioningPolicyServiceService?wsdl"
         client = self.get_client(url)
 
-        s = client.service.modifyPolicy(self.s, ou, wsprovisioningpolicy, date)
+        s = self._call(client, "modifyPolicy", ou, wsprovisioningpolicy, date)
 
         return s
 
+    @invalidates(lambda ou, dn, *args: [dn])
     def eliminarPolitica(self, ou, dn, date):
         url = self.addr + "WSProvisioningPolicyServiceService?wsdl"
         client = self.get_client(url)
 
-        s = client.service.deletePolicy(self.s, ou, dn, date)
+        s = self._call(client, "deletePolicy", ou, dn, date)
 
         return s
 
@@ -117,7 +418,7 @@ class ISIMClient:
         url = self.addr + "WSRoleServiceService?wsdl"
         client = self.get_client(url)
 
-        roles = client.service.searchRoles(self.s, filtro)
+        roles = self._read(client, "searchRoles", filtro)
 
         if find_unique:
             assert (
@@ -128,31 +429,41 @@ class ISIMClient:
         else:
             return roles
 
+    @cached("role", tags=lambda r, dn: [dn])
+    @coalesced()
     def lookupRole(self, dn):
 
         url = self.addr + "WSRoleServiceService?wsdl"
         client = self.get_client(url)
 
         try:
-            r = client.service.lookupRole(self.s, dn)
-            return r
-        except:
+            r = self._call(client, "lookupRole", dn)
+        except Fault as e:
+            # Solo el Fault del rol inexistente. Los Faults transitorios que quedan tras los reintentos, el circuito
+            # abierto y los errores de conexión se propagan: no son "no existe" y no deben quedar en el cache
+            if falla_transitoria(e):
+                raise
+            raise NotFoundError("Rol no encontrado") from e
+        if r is None:
             raise NotFoundError("Rol no encontrado")
+        return r
 
     def crearRolEstatico(self, wsrole, wsou):
 
         url = self.addr + "WSRoleServiceService?wsdl"
         client = self.get_client(url)
 
-        return client.service.createStaticRole(self.s, wsou, wsrole)
+        return self._call(client, "createStaticRole", wsou, wsrole)
 
+    @invalidates(primer_arg)
     def modificarRolEstatico(self, role_dn, wsattr_list):
 
         url = self.addr + "WSRoleServiceService?wsdl"
         client = self.get_client(url)
 
-        return client.service.modifyStaticRole(self.s, role_dn, wsattr_list)
+        return self._call(client, "modifyStaticRole", role_dn, wsattr_list)
 
+    @invalidates(primer_arg)
     def eliminarRol(self, role_dn, date=None):
 
         url = self.addr + "WSRoleServiceService?wsdl"
@@ -162,14 +473,14 @@ class ISIMClient:
             raise NotImplementedError()
         else:
             date = Nil
-        return client.service.removeRole(self.s, role_dn, date)
+        return self._call(client, "removeRole", role_dn, date)
 
     def buscarPersona(self, filtro):
 
         url = self.addr + "WSPersonServiceService?wsdl"
         client = self.get_client(url)
 
-        personas = client.service.searchPersonsFromRoot(self.s, filtro, Nil)
+        personas = self._call(client, "searchPersonsFromRoot", filtro, Nil)
 
         assert (
             len(personas) > 0
@@ -177,11 +488,13 @@ class ISIMClient:
         assert len(personas) == 1, f"Se ha encontrado más de una persona con: {filtro}"
         return personas[0]
 
+    @cached("service", tags=tags_servicios, key=clave_servicio)
+    @coalesced(key=clave_servicio)
     def buscarServicio(self, ou, filtro, find_unique=True):
 
         url = self.addr + "WSServiceServiceService?wsdl"
         client = self.get_client(url)
-        servicios = client.service.searchServices(self.s, ou, filtro)
+        servicios = self._call(client, "searchServices", ou, filtro)
 
         if find_unique:
             if len(servicios) == 0:
@@ -215,8 +528,9 @@ class ISIMClient:
         SEPARATION_OF_DUTY_POLICY, SEPARATION_OF_DUTY_RULE, SERVICE, SERVICE_MODEL, SERVICE_PROFILE, 
         SHARED_ACCESS_POLICY, SYSTEM_ROLE, SYSTEM_USER, TENANT, USERACCESS
         """
-        flujos = client.service.findSearchControlObjects(
-            self.s,
+        flujos = self._call(
+            client,
+            "findSearchControlObjects",
             {
                 "objectclass": "erWorkflowDefinition",
                 "contextDN": f"ou=workflow,erglobalid=00000000000000000000,ou={org_name},dc={org_name}",
@@ -234,24 +548,23 @@ class ISIMClient:
 
         return flujos[0]["value"]
 
+    @cached("group", tags=tags_grupos)
     def buscarGruposPorServicio(self, dn_servicio, profile_name, info):
 
         url = self.addr + "WSGroupServiceService?wsdl"
         client = self.get_client(url)
 
-        grps = client.service.getGroupsByService(
-            self.s, dn_servicio, profile_name, info
-        )
+        grps = self._read(client, "getGroupsByService", dn_servicio, profile_name, info)
         return grps
 
     def buscarActividadesRecursivo(self, process_id, act_list):
         url = self.addr + "WSRequestServiceService?wsdl"
         client = self.get_client(url)
 
-        acts = client.service.getActivities(self.s, int(process_id), False)
+        acts = self._read(client, "getActivities", int(process_id), False)
         act_list.extend(acts)
 
-        subprocesses = client.service.getChildProcesses(self.s, int(process_id))
+        subprocesses = self._call(client, "getChildProcesses", int(process_id))
         for s in subprocesses:
             self.buscarActividadesRecursivo(s.requestId, act_list)
         return "ok"
@@ -269,20 +582,24 @@ class ISIMClient:
         # Filtra solo las actividades manuales (M) y pendientes (R)
         if pending_only:
             actividades = [
-                a for a in actividades if a.activityType == "M" and a.state == "R"
+                a for a in actividades if a["activityType"] == "M" and a["state"] == "R"
             ]
 
         return actividades
 
-    def suspenderPersona(self, dn, justification):
+    @invalidates(tags_escritura_persona)
+    def suspenderPersona(self, dn, justification, href=None):
         # suspendPerson(session: ns1:WSSession, personDN: xsd:string, justification: xsd:string)
         url = self.addr + "WSPersonServiceService?wsdl"
         client = self.get_client(url)
 
-        r = client.service.suspendPerson(self.s, dn, justification)
+        r = self._call(client, "suspendPerson", dn, justification)
         return r
 
-    def restaurarPersona(self, dn, restore_accounts, password, date, justification):
+    @invalidates(tags_escritura_persona)
+    def restaurarPersona(
+        self, dn, restore_accounts, password, date, justification, href=None
+    ):
         # restorePerson(session: ns1:WSSession, personDN: xsd:string, restoreAccounts: xsd:boolean, password: xsd:string, date: xsd:dateTime, justification: xsd:string) -> restorePersonReturn: ns1:WSRequest
         url = self.addr + "WSPersonServiceService?wsdl"
         client = self.get_client(url)
@@ -292,17 +609,24 @@ class ISIMClient:
         else:
             date = Nil
 
-        r = client.service.restorePerson(
-            self.s, dn, restore_accounts, password or Nil, date, justification
+        r = self._call(
+            client,
+            "restorePerson",
+            dn,
+            restore_accounts,
+            password or Nil,
+            date,
+            justification,
         )
         return r
 
-    def eliminarPersona(self, dn, justification):
+    @invalidates(tags_escritura_persona)
+    def eliminarPersona(self, dn, justification, href=None):
         # deletePerson(session: ns1:WSSession, personDN: xsd:string, date: xsd:dateTime, justification: xsd:string) -> deletePersonReturn: ns1:WSRequest
         url = self.addr + "WSPersonServiceService?wsdl"
         client = self.get_client(url)
 
-        r = client.service.deletePerson(self.s, dn, Nil, justification)
+        r = self._call(client, "deletePerson", dn, Nil, justification)
         return r
 
     def crearRolDinamico(self, wsrole, wsou, date=None):
@@ -315,8 +639,9 @@ class ISIMClient:
         else:
             date = Nil
 
-        return client.service.createDynamicRole(self.s, wsou, wsrole, date)
+        return self._call(client, "createDynamicRole", wsou, wsrole, date)
 
+    @invalidates(primer_arg)
     def modificarRolDinamico(self, role_dn, wsattr_list, date=None):
 
         url = self.addr + "WSRoleServiceService?wsdl"
@@ -327,14 +652,14 @@ class ISIMClient:
         else:
             date = Nil
 
-        return client.service.modifyDynamicRole(self.s, role_dn, wsattr_list, date)
+        return self._call(client, "modifyDynamicRole", role_dn, wsattr_list, date)
 
     def getDefaultAccountAttributesByPerson(self, service_dn, person_dn):
         url = self.addr + "WSAccountServiceService?wsdl"
         client = self.get_client(url)
 
-        r = client.service.getDefaultAccountAttributesByPerson(
-            self.s, service_dn, person_dn
+        r = self._call(
+            client, "getDefaultAccountAttributesByPerson", service_dn, person_dn
         )
         return r
 
@@ -342,14 +667,15 @@ class ISIMClient:
         url = self.addr + "WSAccountServiceService?wsdl"
         client = self.get_client(url)
 
-        r = client.service.getDefaultAccountAttributes(self.s, service_dn)
+        r = self._call(client, "getDefaultAccountAttributes", service_dn)
         return r
 
+    @coalesced()
     def getAccountProfileForService(self, service_dn):
         url = self.addr + "WSAccountServiceService?wsdl"
         client = self.get_client(url)
 
-        r = client.service.getAccountProfileForService(self.s, service_dn)
+        r = self._call(client, "getAccountProfileForService", service_dn)
         return r
 
     def searchAccounts(self, search_arguments):
@@ -358,10 +684,21 @@ class ISIMClient:
 
         search_arguments = {k: v for k, v in search_arguments.items() if v is not None}
 
-        r = client.service.searchAccounts(self.s, search_arguments)
+        r = self._read(client, "searchAccounts", search_arguments)
         return r
 
+    def streamSearchAccounts(self, search_arguments, attributes=None):
+        # Como searchAccounts, pero devuelve AccountRecords a medida que se parsea la respuesta (sin cache)
+        url = self.addr + "WSAccountServiceService?wsdl"
+        client = self.get_client(url)
+
+        search_arguments = {k: v for k, v in search_arguments.items() if v is not None}
+
+        for e in self._stream(client, "searchAccounts", search_arguments):
+            yield AccountRecord.from_xml(e, attributes)
+
     # createAccount(session: ns1:WSSession, serviceDN: xsd:string, wsAttrs: ns1:WSAttribute[], date: xsd:dateTime, justification: xsd:string) -> createAccountReturn: ns1:WSRequest
+    @invalidates(tags_propietario)
     def createAccount(self, service_dn, wsattrs, date, justification):
         url = self.addr + "WSAccountServiceService?wsdl"
         client = self.get_client(url)
@@ -371,20 +708,30 @@ class ISIMClient:
         else:
             date = Nil
 
-        r = client.service.createAccount(
-            self.s, service_dn, wsattrs, date, justification
+        r = self._call(
+            client, "createAccount", service_dn, wsattrs, date, justification
         )
         return r
 
     # getAccountsByOwner(session: ns1:WSSession, personDN: xsd:string) -> getAccountsByOwnerReturn: ns1:WSAccount[]
+    @cached("accounts", tags=tags_cuentas)
     def getAccountsByOwner(self, person_dn):
         url = self.addr + "WSPersonServiceService?wsdl"
         client = self.get_client(url)
 
-        r = client.service.getAccountsByOwner(self.s, person_dn)
+        r = self._call(client, "getAccountsByOwner", person_dn)
         return r
 
+    def streamAccountsByOwner(self, person_dn, attributes=None):
+        # Como getAccountsByOwner, pero devuelve AccountRecords a medida que se parsea la respuesta (sin cache)
+        url = self.addr + "WSPersonServiceService?wsdl"
+        client = self.get_client(url)
+
+        for e in self._stream(client, "getAccountsByOwner", person_dn):
+            yield AccountRecord.from_xml(e, attributes)
+
     # suspendAccount(session: ns1:WSSession, accountDN: xsd:string, date: xsd:dateTime, justification: xsd:string) -> suspendAccountReturn: ns1:WSRequest
+    @invalidates(primer_arg)
     def suspendAccount(self, account_dn, date, justification):
         url = self.addr + "WSAccountServiceService?wsdl"
         client = self.get_client(url)
@@ -394,10 +741,11 @@ class ISIMClient:
         else:
             date = Nil
 
-        r = client.service.suspendAccount(self.s, account_dn, date, justification)
+        r = self._call(client, "suspendAccount", account_dn, date, justification)
         return r
 
     # restoreAccount(session: ns1:WSSession, accountDN: xsd:string, newPassword: xsd:string, date: xsd:dateTime, justification: xsd:string) -> restoreAccountReturn: ns1:WSRequest
+    @invalidates(primer_arg)
     def restoreAccount(self, account_dn, password, date, justification):
         url = self.addr + "WSAccountServiceService?wsdl"
         client = self.get_client(url)
@@ -407,12 +755,13 @@ class ISIMClient:
         else:
             date = Nil
 
-        r = client.service.restoreAccount(
-            self.s, account_dn, password, date, justification
+        r = self._call(
+            client, "restoreAccount", account_dn, password, date, justification
         )
         return r
 
     # deprovisionAccount(session: ns1:WSSession, accountDN: xsd:string, date: xsd:dateTime, justification: xsd:string) -> deprovisionAccountReturn: ns1:WSRequest
+    @invalidates(primer_arg)
     def deprovisionAccount(self, account_dn, date, justification):
         url = self.addr + "WSAccountServiceService?wsdl"
         client = self.get_client(url)
@@ -422,18 +771,20 @@ class ISIMClient:
         else:
             date = Nil
 
-        r = client.service.deprovisionAccount(self.s, account_dn, date, justification)
+        r = self._call(client, "deprovisionAccount", account_dn, date, justification)
         return r
 
     # orphanSingleAccount(session: ns1:WSSession, accountDN: xsd:string) ->
+    @invalidates(primer_arg)
     def orphanSingleAccount(self, account_dn):
         url = self.addr + "WSAccountServiceService?wsdl"
         client = self.get_client(url)
 
-        r = client.service.orphanSingleAccount(self.s, account_dn)
+        r = self._call(client, "orphanSingleAccount", account_dn)
         return r
 
     # modifyAccount(session: ns1:WSSession, accountDN: xsd:string, wsAttrs: ns1:WSAttribute[], date: xsd:dateTime, justification: xsd:string) -> modifyAccountReturn: ns1:WSRequest
+    @invalidates(primer_arg)
     def modifyAccount(self, account_dn, wsattrs, date, justification):
         url = self.addr + "WSAccountServiceService?wsdl"
         client = self.get_client(url)
@@ -443,12 +794,15 @@ class ISIMClient:
         else:
             date = Nil
 
-        r = client.service.modifyAccount(
-            self.s, account_dn, wsattrs, date, justification
+        r = self._call(
+            client, "modifyAccount", account_dn, wsattrs, date, justification
         )
         return r
 
-    def suspendPersonAdvanced(self, person_dn, include_accounts, date, justification):
+    @invalidates(tags_escritura_persona)
+    def suspendPersonAdvanced(
+        self, person_dn, include_accounts, date, justification, href=None
+    ):
         # suspendPersonAdvanced(session: ns1:WSSession, personDN: xsd:string, includeAccounts: xsd:boolean, date: xsd:dateTime, justification: xsd:string) -> suspendPersonAdvancedReturn: ns1:WSRequest
         url = self.addr + "WSPersonServiceService?wsdl"
         client = self.get_client(url)
@@ -458,21 +812,28 @@ class ISIMClient:
         else:
             date = Nil
 
-        r = client.service.suspendPersonAdvanced(
-            self.s, person_dn, include_accounts, date, justification
+        r = self._call(
+            client,
+            "suspendPersonAdvanced",
+            person_dn,
+            include_accounts,
+            date,
+            justification,
         )
         return r
 
+    @cached("request", tags=lambda r, request_id: [str(request_id)])
     def getRequest(self, request_id):
         # getRequest(session: ns1:WSSession, requestId: xsd:long) -> getRequestReturn: ns1:WSRequest
         url = self.addr + "WSRequestServiceService?wsdl"
         client = self.get_client(url)
-        r = client.service.getRequest(self.s, request_id)
+        r = self._call(client, "getRequest", request_id)
         return r
 
+    @invalidates(lambda request_id, *args: [str(request_id)])
     def abortRequest(self, request_id, justification):
         # abortRequest(session: ns1:WSSession, requestId: xsd:long, justification: xsd:string) ->
         url = self.addr + "WSRequestServiceService?wsdl"
         client = self.get_client(url)
-        r = client.service.abortRequest(self.s, request_id, justification)
+        r = self._call(client, "abortRequest", request_id, justification)
         return r
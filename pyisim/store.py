@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+from typing import Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+
+class SessionStore:
+    """
+    Encrypted local file holding the state of a logged in session (REST cookies and CSRF token, SOAP WSSession).
+
+    Requires the ``store`` extra: ``pip install pyisim[store]``
+
+    Passed to Session(), it lets short lived processes resume the previous session instead of logging in again::
+
+        store = SessionStore("~/.pyisim/session", key=os.environ["PYISIM_STORE_KEY"])
+        sess = Session(url, user, password, cert, store=store)
+    """
+
+    def __init__(self, path: str, key: str, max_age: int = None):
+        """
+        Args:
+            path (str): State file path. Created with owner only permissions.
+            key (str): Fernet key. See SessionStore.generate_key().
+            max_age (int, optional): Saved state older than this (seconds) is ignored. Defaults to None (no limit).
+        """
+        self.path = os.path.expanduser(str(path))
+        self.max_age = max_age
+        self.__fernet = Fernet(key)
+
+    @staticmethod
+    def generate_key() -> str:
+        """
+        Returns:
+            str: New random key for encrypting the state file.
+        """
+        return Fernet.generate_key().decode()
+
+    def load(self, url: str, username: str) -> Optional[dict]:
+        """
+        Reads the saved session state.
+
+        Args:
+            url (str): ISIM Base URL the state must belong to.
+            username (str): User the state must belong to.
+
+        Returns:
+            Optional[dict]: Saved state, or None if there is no valid state for url and username.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                token = f.read()
+            state = json.loads(self.__fernet.decrypt(token, ttl=self.max_age))
+        except (OSError, InvalidToken, ValueError):
+            return None
+
+        if state.get("url") != url or state.get("username") != username:
+            return None
+        return state
+
+    def save(self, url: str, username: str, state: dict) -> None:
+        """
+        Encrypts and writes the session state, replacing the previous one.
+
+        Args:
+            url (str): ISIM Base URL.
+            username (str): Logged in user.
+            state (dict): JSON serializable session state.
+        """
+        token = self.__fernet.encrypt(
+            json.dumps({**state, "url": url, "username": username}).encode()
+        )
+
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(token)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def clear(self) -> None:
+        """Deletes the saved state."""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,71 @@
+from typing import Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class _Adapter(HTTPAdapter):
+    # HTTPAdapter con timeout por defecto para las llamadas que no lo indican
+    def __init__(self, timeout, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(
+            request, timeout=self.timeout if timeout is None else timeout, **kwargs
+        )
+
+
+class HTTPTransport:
+    """
+    HTTP connection pool shared by the REST client and every SOAP service client of a Session.
+
+    All the requests.Session objects created by new_session() use the same HTTPAdapter, so connections to the ISIM
+    host (and their TLS handshake) are reused by REST and SOAP calls alike, and by the sessions created on re-login::
+
+        transport = HTTPTransport("./MyCA.cer", pool_size=32, timeout=(5, 120))
+        sess = Session(url, user, password, "./MyCA.cer", transport=transport)
+    """
+
+    def __init__(
+        self,
+        certificate_path: str,
+        pool_size: int = 10,
+        timeout: Union[float, Tuple[float, float]] = None,
+        keep_alive: bool = True,
+        pool_block: bool = False,
+    ):
+        """
+        Args:
+            certificate_path (str): Path to application server root certificate. Example: "./MyCA.cer"
+            pool_size (int, optional): Maximum connections kept open per host. Defaults to 10.
+            timeout (Union[float, Tuple[float, float]], optional): Default socket timeout in seconds, or (connect, read) timeouts. Defaults to None (no timeout).
+            keep_alive (bool, optional): Keep connections open between requests. Defaults to True.
+            pool_block (bool, optional): Wait for a free connection instead of opening one outside the pool when all are in use. Defaults to False.
+        """
+        self.certificate_path = certificate_path
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.adapter = _Adapter(
+            timeout,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            pool_block=pool_block,
+        )
+
+    def new_session(self) -> requests.Session:
+        """
+        Returns:
+            requests.Session: New session (own cookies and headers) on the shared connection pool.
+        """
+        s = requests.Session()
+        s.verify = self.certificate_path
+        s.mount("https://", self.adapter)
+        s.mount("http://", self.adapter)
+        if not self.keep_alive:
+            s.headers["Connection"] = "close"
+        return s
+
+    def close(self) -> None:
+        """Closes every pooled connection."""
+        self.adapter.close()
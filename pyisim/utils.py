@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, TYPE_CHECKING, Union
 
 if TYPE_CHECKING:
@@ -87,3 +88,84 @@ def get_account_defaults(
             )
 
     return account_attrs
+
+
+def resolve_dns(
+    session: "Session", people: List["Person"], max_workers: int = 10
+) -> List[str]:
+    """
+    Resolves the DN of many people concurrently.
+
+    Only people whose DN was not returned in their search results are looked up, each lookup is done in a worker thread.
+
+    Args:
+        session (Session): Active ISIM Session
+        people (List[Person]): People to resolve. Must have a reference to ISIM (href).
+        max_workers (int, optional): Maximum concurrent lookups. Defaults to 10.
+
+    Returns:
+        List[str]: DNs of the people, in the same order.
+    """
+
+    def lookup(person):
+        dn = session.restclient.lookupPersona(person.href, attributes="dn")[
+            "_attributes"
+        ]["dn"]
+        person.__dict__["dn"] = dn
+
+    missing = [p for p in people if "dn" not in p.__dict__]
+    if missing:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lookup, missing))
+
+    return [p.dn for p in people]
+
+
+def prefetch(
+    session: "Session",
+    people: List["Person"],
+    attributes: Union[str, List[str]],
+    max_workers: int = 10,
+) -> List["Person"]:
+    """
+    Loads attributes missing from many people concurrently, so that reading them does not make one lookup per person.
+
+    Useful after a search with a small projection (e.g. search.people(session, attributes="cn")), when some of the
+    results need more attributes.
+
+    Args:
+        session (Session): Active ISIM Session
+        people (List[Person]): People to complete. Must have a reference to ISIM (href).
+        attributes (Union[str, List[str]]): Attributes to load, as a list or comma separated. "*" loads every attribute.
+        max_workers (int, optional): Maximum concurrent lookups. Defaults to 10.
+
+    Returns:
+        List[Person]: The same people.
+    """
+    attrs = _attribute_list(attributes)
+
+    def lookup(person):
+        r = session.restclient.lookupPersona(person.href, attributes=",".join(attrs))
+        person._fill(r["_attributes"], attrs == ["*"])
+
+    missing = [p for p in people if _missing(p, attrs)]
+    if missing:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lookup, missing))
+
+    return people
+
+
+def _attribute_list(attributes: Union[str, List[str]]) -> List[str]:
+    if isinstance(attributes, str):
+        attributes = attributes.split(",")
+    attrs = [a.strip() for a in attributes if a.strip()]
+    return ["*"] if "*" in attrs else attrs
+
+
+def _missing(person: "Person", attrs: List[str]) -> bool:
+    # True si a la persona le falta alguno de los atributos y no tiene todos cargados
+    if person.__dict__.get("_complete"):
+        # "*" no incluye el DN (ver Person._lookup)
+        return "dn" in attrs and "dn" not in person.__dict__
+    return attrs == ["*"] or any(a not in person.__dict__ for a in attrs)
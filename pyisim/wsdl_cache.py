@@ -0,0 +1,133 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from urllib.parse import urlsplit
+
+from zeep.cache import Base
+from zeep.wsdl import Document
+
+DEFAULT_PATH = os.path.join("~", ".cache", "pyisim", "wsdl")
+
+
+class WSDLCache(Base):
+    """
+    Persistent zeep cache for the ISIM WSDL and XSD files.
+
+    Files are stored in a directory per ISIM version and keyed by URL path, so the same cache (or a bundle exported
+    from it) works for every host running that version. Parsed service definitions are also kept in memory and
+    shared by all the SOAP clients that use this cache, so sessions in the same process parse each WSDL only once::
+
+        cache = WSDLCache(version="6.0.0.20", bundle="isim-6.0.0.20-wsdl.zip")
+        sess = Session(url, user, password, cert, wsdl_cache=cache)
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        version: str = "default",
+        bundle: str = None,
+        share_documents: bool = True,
+    ):
+        """
+        Args:
+            path (str, optional): Cache directory. Defaults to ~/.cache/pyisim/wsdl.
+            version (str, optional): ISIM version the cached files belong to. Defaults to "default".
+            bundle (str, optional): Zip file or directory created by export(), copied into the cache if not there yet. Defaults to None.
+            share_documents (bool, optional): Share parsed service definitions between clients. Defaults to True.
+        """
+        self.path = os.path.join(os.path.expanduser(path), version)
+        self.share_documents = share_documents
+        self.__documents = {}
+        self.__locks = {}
+        self.__lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+        if bundle:
+            self.seed(bundle)
+
+    def _file(self, url):
+        # La llave es la ruta del URL, sin esquema ni host
+        parts = urlsplit(url)
+        key = parts.path + ("?" + parts.query if parts.query else "")
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest())
+
+    def add(self, url, content):
+        if isinstance(content, str):
+            content = content.encode()
+
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, self._file(url))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def get(self, url):
+        try:
+            with open(self._file(url), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def document(self, url: str, transport, settings) -> Document:
+        """
+        Parsed service definition for url, loaded from the cache files.
+
+        Args:
+            url (str): WSDL URL
+            transport (zeep.Transport): Transport used to load the files missing from the cache.
+            settings (zeep.Settings): Parser settings.
+
+        Returns:
+            zeep.wsdl.Document: Service definition. Pass it to zeep.Client instead of the URL.
+        """
+        if not self.share_documents:
+            return Document(url, transport, settings=settings)
+
+        key = self._file(url)
+        with self.__lock:
+            lock = self.__locks.setdefault(key, threading.Lock())
+
+        # un lock por WSDL: se pueden cargar varios en paralelo, pero cada uno una sola vez
+        with lock:
+            document = self.__documents.get(key)
+            if document is None:
+                document = Document(url, transport, settings=settings)
+                self.__documents[key] = document
+        return document
+
+    def seed(self, bundle: str) -> None:
+        """
+        Copies the files of a bundle created by export() into the cache. Files already cached are kept.
+
+        Args:
+            bundle (str): Zip file or directory.
+        """
+        if os.path.isdir(bundle):
+            for name in os.listdir(bundle):
+                target = os.path.join(self.path, name)
+                if not os.path.exists(target):
+                    shutil.copyfile(os.path.join(bundle, name), target)
+        else:
+            with zipfile.ZipFile(bundle) as z:
+                for name in z.namelist():
+                    target = os.path.join(self.path, os.path.basename(name))
+                    if not os.path.exists(target):
+                        with open(target, "wb") as f:
+                            f.write(z.read(name))
+
+    def export(self, bundle: str) -> None:
+        """
+        Writes every cached file into a zip bundle, to seed caches in other machines.
+
+        Args:
+            bundle (str): Zip file path.
+        """
+        with zipfile.ZipFile(bundle, "w", zipfile.ZIP_DEFLATED) as z:
+            for name in os.listdir(self.path):
+                z.write(os.path.join(self.path, name), name)
@@ -15,7 +15,11 @@ AUTHOR = "Andrés Zamora"
 REQUIRES_PYTHON = ">=3.8.0"
 VERSION = "0.3.0"  # Get the version from the package __init__.py
 REQUIRED = ["requests >= 2.23.0", "zeep >= 3.4.0"]
-EXTRAS = {}
+EXTRAS = {
+    "aio": ["httpx >= 0.20.0", "zeep >= 4.0.0"],
+    "store": ["cryptography >= 3.1"],
+    "orjson": ["orjson >= 3.0"],
+}
 
 here = os.path.abspath(os.path.dirname(__file__))
 
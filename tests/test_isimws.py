@@ -1,4 +1,5 @@
 # type: ignore
+import os
 import random
 import time
 
@@ -934,3 +935,935 @@ def test_get_pending_activities_abort(session):
     time.sleep(3)
     aborted = Request(session, id=request_id)
     assert aborted.process_state == "A"
+
+
+def test_aio_search_people():
+    import asyncio
+    from pyisim.aio import search as aiosearch
+    from pyisim.aio.auth import Session as AsyncSession
+
+    async def run():
+        async with AsyncSession(test_url, admin_login, admin_pw, cert) as s:
+            return await aiosearch.people(
+                s, by="employeenumber", search_filter="1015463230", limit=1
+            )
+
+    r = asyncio.run(run())
+    assert len(r) > 0
+    assert r[0].dn
+
+
+def test_aio_soap_concurrent_lookups():
+    import asyncio
+    from pyisim.aio.auth import Session as AsyncSession
+
+    id = "4020615234983983545"  # real id
+
+    async def run():
+        async with AsyncSession(test_url, admin_login, admin_pw, cert) as s:
+            return await asyncio.gather(
+                *[s.soapclient.getRequest(id) for _ in range(20)]
+            )
+
+    r = asyncio.run(run())
+    assert all(str(x["requestId"]) == id for x in r)
+
+
+def test_aio_search_organizational_container():
+    import asyncio
+    from pyisim.aio import search as aiosearch
+    from pyisim.aio.auth import Session as AsyncSession
+
+    async def run():
+        async with AsyncSession(test_url, admin_login, admin_pw, cert) as s:
+            ous = await aiosearch.organizational_container(s, "organizations", test_org)
+            services = await aiosearch.service(s, ous[0])
+            return ous, services
+
+    ous, services = asyncio.run(run())
+    assert ous[0].name == test_org
+    assert ous[0].wsou["itimDN"] == ous[0].dn
+    assert len(services) > 0
+
+
+def test_aio_relogin_closes_replaced_clients(monkeypatch):
+    import asyncio
+
+    import httpx
+    from pyisim.aio import rest as aiorest
+    from pyisim.aio.auth import Session as AsyncSession
+
+    people_calls = []
+
+    def handler(request):
+        if request.url.path.endswith("systemusers/me"):
+            return httpx.Response(200, json={}, headers={"CSRFToken": "t"})
+        if request.url.path == "/itim/rest/people":
+            people_calls.append(request)
+            # la primera búsqueda encuentra la sesión expirada
+            return httpx.Response(401 if len(people_calls) == 1 else 200, json=[])
+        return httpx.Response(200)
+
+    clients = []
+
+    def nuevo_cliente(self, cert=None):
+        clients.append(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        return clients[-1]
+
+    monkeypatch.setattr(aiorest.ISIMClient, "nuevo_cliente", nuevo_cliente)
+
+    async def relogin():
+        client = aiorest.ISIMClient("https://isim", "u", "p", cert)
+        await client.login()
+        assert await client.buscarPersonas("Person") == []
+        assert client.relogins == 1
+        assert [c.is_closed for c in clients] == [True, False]
+        await client.close()
+
+    async def failed_login():
+        async def soap_down():
+            raise ConnectionError("soap down")
+
+        s = AsyncSession("https://isim", "u", "p", cert)
+        s.soapclient.login = soap_down
+        with pytest.raises(ConnectionError):
+            await s.login()
+
+    asyncio.run(relogin())
+    clients.clear()
+    asyncio.run(failed_login())
+    assert clients and all(c.is_closed for c in clients)
+
+
+def test_resolve_dns(session):
+    from pyisim.utils import resolve_dns
+
+    people = search.people(session, search_filter="*", attributes="*", limit=10)
+    dns = resolve_dns(session, people)
+    assert len(dns) == len(people)
+    assert all("erglobalid" in dn for dn in dns)
+
+
+def test_iter_people(session):
+    first = list(search.iter_people(session, attributes="cn", page_size=20))
+    assert len(first) > 20
+    assert len({p.href for p in first}) == len(first)
+
+    resumed = list(search.iter_people(session, attributes="cn", page_size=20, start=20))
+    assert [p.href for p in resumed] == [p.href for p in first[20:]]
+
+
+def test_scan_people(session):
+    scanned = list(search.scan_people(session, attributes="cn", shard_limit=50))
+    assert len({p.href for p in scanned}) == len(scanned)
+    assert len(scanned) >= len(search.people(session, attributes="cn", limit=50))
+
+
+def test_scan_people_pages_saturated_shards(session):
+    # shard_limit=5 llena casi todos los shards: se leen por páginas en lugar de volver a partirlos
+    scanned = {
+        p.href for p in search.scan_people(session, attributes="cn", shard_limit=5)
+    }
+    listed = {
+        p.href for p in search.iter_people(session, attributes="cn", page_size=100)
+    }
+    assert scanned == listed
+
+
+def test_session_pool():
+    from concurrent.futures import ThreadPoolExecutor
+    from pyisim.auth import SessionPool
+
+    pool = SessionPool(test_url, [(admin_login, admin_pw)], cert, size=3)
+
+    def work(_):
+        with pool.session() as s:
+            return len(search.people(s, attributes="cn", limit=1))
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        assert sum(executor.map(work, range(12))) == 12
+
+    stats = pool.stats()
+    assert stats["checkouts"] == 12
+    assert stats["available"] == 3
+    pool.close()
+
+
+def test_session_pool_relogin_survives_unexpected_errors():
+    from pyisim.auth import SessionPool
+
+    pool = SessionPool(
+        test_url, [(admin_login, admin_pw)], cert, size=1, reauth_interval=0.01
+    )
+    login = pool._login
+    failures = [AssertionError("Error 404"), ValueError("invalid WSDL")]
+
+    def flaky_login(credentials):
+        if failures:
+            raise failures.pop(0)
+        return login(credentials)
+
+    pool._login = flaky_login
+    sess = pool.checkout()
+    pool.checkin(sess, broken=True)
+
+    new_sess = pool.checkout(timeout=60)
+    assert new_sess is not sess
+    assert pool.stats()["reauthenticating"] == 0
+    pool.checkin(new_sess)
+    pool.close()
+
+
+def test_session_pool_close(monkeypatch):
+    from types import SimpleNamespace
+    from pyisim.auth import SessionPool
+
+    closed = []
+
+    class Transport:
+        def close(self):
+            closed.append(self)
+
+    down = False
+
+    def login(self, credentials):
+        if down:
+            raise ConnectionError("ISIM caído")
+        session = SimpleNamespace(transport=Transport())
+        self._credentials[id(session)] = credentials
+        return session
+
+    monkeypatch.setattr(SessionPool, "_login", login)
+    pool = SessionPool(test_url, [("a", "a")], cert, size=3, reauth_interval=60)
+    down = True
+
+    kept = pool.checkout()
+    broken = pool.checkout()
+    pool.checkin(broken, broken=True)
+
+    # el hilo de relogin espera 60s entre intentos, close() lo despierta
+    start = time.monotonic()
+    pool.close()
+    while pool.stats()["reauthenticating"] and time.monotonic() - start < 5:
+        time.sleep(0.01)
+    assert pool.stats()["reauthenticating"] == 0
+    assert pool.stats()["available"] == 0
+    assert len(closed) == 1
+
+    # las sesiones en uso se cierran al devolverlas
+    pool.checkin(kept)
+    assert closed[-1] is kept.transport
+
+
+def test_relogin_on_expired_session():
+    sess = Session(test_url, admin_login, admin_pw, cert)
+
+    # REST: drop the LTPA/JSESSIONID cookies
+    sess.restclient.s.cookies.clear()
+    assert len(search.people(sess, attributes="cn", limit=1)) == 1
+    assert sess.restclient.relogins == 1
+
+    # SOAP: end the WSSession server side
+    client = sess.soapclient.get_client(sess.soapclient.addr + "WSSessionService?wsdl")
+    client.service.logout(sess.soapclient.s)
+    search.roles(sess, search_filter="*")
+    assert sess.soapclient.relogins == 1
+
+
+def test_session_store(tmp_path):
+    from pyisim.store import SessionStore
+
+    store = SessionStore(tmp_path / "session", SessionStore.generate_key())
+    first = Session(test_url, admin_login, admin_pw, cert, store=store)
+
+    resumed = Session(test_url, admin_login, admin_pw, cert, store=store)
+    assert resumed.restclient.CSRF == first.restclient.CSRF
+    assert len(search.people(resumed, attributes="cn", limit=1)) == 1
+    assert len(search.roles(resumed, search_filter="*")) > 0
+    assert resumed.soapclient.relogins == 0
+
+
+def test_wsdl_cache(tmp_path):
+    from pyisim.wsdl_cache import WSDLCache
+
+    cache = WSDLCache(tmp_path / "wsdl", version="test")
+    s1 = Session(test_url, admin_login, admin_pw, cert, wsdl_cache=cache)
+    search.roles(s1, search_filter="*")
+    cache.export(tmp_path / "bundle.zip")
+
+    seeded = WSDLCache(
+        tmp_path / "seeded", version="test", bundle=tmp_path / "bundle.zip"
+    )
+    assert sorted(os.listdir(seeded.path)) == sorted(os.listdir(cache.path))
+
+    s2 = Session(test_url, admin_login, admin_pw, cert, wsdl_cache=seeded)
+    assert len(search.roles(s2, search_filter="*")) == len(
+        search.roles(s1, search_filter="*")
+    )
+
+
+def test_session_prewarm():
+    from pyisim.soap import SERVICES
+
+    sess = Session(test_url, admin_login, admin_pw, cert, prewarm=True)
+    assert set(sess.soapclient.load_times) == {s.lower() for s in SERVICES}
+    assert len(search.roles(sess, search_filter="*")) > 0
+
+
+def test_shared_session_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    sess = Session(test_url, admin_login, admin_pw, cert, pool_size=16)
+    people = search.people(sess, attributes="cn", limit=32)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        accounts = list(executor.map(lambda p: p.get_accounts(sess), people))
+
+    assert len(accounts) == len(people)
+    assert sess.soapclient.load_times.keys() >= {"wsaccountserviceservice"}
+
+
+def test_shared_transport():
+    from pyisim.transport import HTTPTransport
+
+    transport = HTTPTransport(cert, pool_size=4, timeout=(10, 300))
+    sess = Session(test_url, admin_login, admin_pw, cert, transport=transport)
+    assert sess.restclient.transport is sess.soapclient.transport is transport
+
+    people = search.people(sess, attributes="cn", limit=1)
+    people[0].get_accounts(sess)
+    assert len(transport.adapter.poolmanager.pools) == 1
+
+
+def test_retry_policy():
+    from pyisim.exceptions import CircuitOpenError
+    from pyisim.retry import RetryPolicy
+
+    policy = RetryPolicy(max_attempts=3, backoff=0.01, failure_threshold=3)
+    sess = Session(test_url, admin_login, admin_pw, cert, retry=policy)
+    search.people(sess, attributes="cn", limit=1)
+    assert policy.metrics()["GET /itim/rest/people"]["calls"] == 1
+
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        policy.call("test", flaky, retry=True, errors=(ConnectionError,))
+    assert len(attempts) == 3
+    assert policy.metrics()["test"]["trips"] == 1
+
+    with pytest.raises(CircuitOpenError):
+        policy.call("test", flaky, retry=True, errors=(ConnectionError,))
+
+
+def test_retry_only_reads_by_default():
+    import requests
+    from pyisim.retry import RetryPolicy
+
+    policy = RetryPolicy(max_attempts=3, backoff=0.01, idempotent={"modifyStaticRole"})
+    sess = Session(test_url, admin_login, admin_pw, cert, retry=policy)
+    calls = []
+
+    def failing(*args):
+        calls.append(args)
+        raise requests.ConnectionError
+
+    client = sess.soapclient.get_client(
+        sess.soapclient.addr + "WSRoleServiceService?wsdl"
+    )
+    for operation, attempts in [("deleteRole", 1), ("modifyStaticRole", 3)]:
+        calls.clear()
+        setattr(client.service, operation, failing)
+        with pytest.raises(requests.ConnectionError):
+            sess.soapclient._call(client, operation, "erglobalid=0")
+        assert len(calls) == attempts
+
+
+def test_lookup_role_not_found_only_on_fault():
+    import requests
+    from pyisim import soap
+    from pyisim.cache import EntityCache
+    from pyisim.concurrency import SingleFlight
+    from pyisim.exceptions import CircuitOpenError
+    from zeep.exceptions import Fault
+
+    client = soap.ISIMClient.__new__(soap.ISIMClient)
+    client.addr = ""
+    client.cache = EntityCache()
+    client.flights = SingleFlight()
+    client.get_client = lambda url: None
+
+    def raising(error):
+        def call(*args):
+            raise error
+
+        return call
+
+    client._call = raising(Fault("ObjectNotFoundException: erglobalid=1"))
+    with pytest.raises(NotFoundError):
+        client.lookupRole("erglobalid=1")
+
+    # una caída no es un rol inexistente
+    for error in (
+        CircuitOpenError("WSRoleService.lookupRole"),
+        requests.ConnectionError(),
+        Fault("Connection timed out"),
+    ):
+        client._call = raising(error)
+        with pytest.raises(type(error)):
+            client.lookupRole("erglobalid=1")
+    assert client.cache.stats()["total"]["size"] == 0
+
+
+def test_circuit_breaker_abandoned_trial():
+    from pyisim.retry import RetryPolicy
+
+    policy = RetryPolicy(failure_threshold=1, reset_timeout=0.01)
+    policy.breaker("test").failure()
+    time.sleep(0.02)
+
+    def cancelled():
+        raise KeyboardInterrupt
+
+    # la llamada de prueba termina sin resultado: el breaker no queda en half-open
+    with pytest.raises(KeyboardInterrupt):
+        policy.call("test", cancelled, retry=False, errors=(ConnectionError,))
+    assert policy.call("test", lambda: "ok", retry=False) == "ok"
+    assert policy.breaker("test").state == "closed"
+
+
+def test_aimd_limiter(session):
+    from pyisim.concurrency import AIMDLimiter
+
+    people = search.people(session, attributes="cn", limit=20)
+    limiter = AIMDLimiter(initial=2, max_limit=8)
+
+    accounts = list(limiter.map(lambda p: p.get_accounts(session), people))
+    assert len(accounts) == len(people)
+    assert 1 <= limiter.limit <= 8
+    assert limiter.in_flight == 0
+
+
+def test_aimd_limiter_latency_shift():
+    from pyisim.concurrency import AIMDLimiter
+
+    limiter = AIMDLimiter(initial=4)
+
+    def call(seconds):
+        with limiter.slot():
+            time.sleep(seconds)
+
+    # una primera llamada rápida no deja todas las siguientes como picos
+    call(0.001)
+    for _ in range(30):
+        call(0.02)
+    assert limiter.limit > 1
+
+
+def test_aimd_limiter_bounded_submission():
+    import asyncio
+    import itertools
+
+    from pyisim.concurrency import AIMDLimiter
+
+    limiter = AIMDLimiter(initial=2, max_limit=4)
+    pulled = []
+
+    def items():
+        for i in itertools.count():
+            pulled.append(i)
+            yield i
+
+    # un generador sin fin: solo se leen los ítems que caben en la ventana
+    results = limiter.map(lambda i: i * 2, items())
+    assert list(itertools.islice(results, 10)) == list(range(0, 20, 2))
+    assert len(pulled) <= 10 + limiter.max_limit
+    results.close()
+
+    async def double(i):
+        await asyncio.sleep(0)
+        return i * 2
+
+    pulled.clear()
+    assert asyncio.run(limiter.amap(double, range(100))) == list(range(0, 200, 2))
+
+    started = []
+
+    async def first_call(i):
+        started.append(len(pulled))
+        raise ValueError(i)
+
+    pulled.clear()
+    with pytest.raises(ValueError):
+        asyncio.run(limiter.amap(first_call, items()))
+    assert started[0] <= limiter.max_limit
+
+
+def test_rate_limiter(tmp_path):
+    from pyisim.ratelimit import RateLimiter
+
+    limiter = RateLimiter({"read": 5}, path=tmp_path)
+    sess = Session(test_url, admin_login, admin_pw, cert, rate_limiter=limiter)
+
+    start = time.time()
+    for _ in range(10):
+        search.people(sess, attributes="cn", limit=1)
+    # 5 requests of burst, then 5 per second
+    assert time.time() - start >= 0.9
+
+
+def test_token_bucket_below_one_per_second():
+    from pyisim.ratelimit import TokenBucket
+
+    bucket = TokenBucket(0.5)
+    assert bucket.capacity == 1
+    assert bucket.take() == 0
+    assert 0 < bucket.take() <= 2
+
+    with pytest.raises(ValueError):
+        TokenBucket(2, capacity=0.5)
+
+
+def test_entity_cache():
+    from pyisim.cache import EntityCache
+
+    cache = EntityCache()
+    sess = Session(test_url, admin_login, admin_pw, cert, cache=cache)
+
+    search.roles(sess, search_filter="*")
+    search.roles(sess, search_filter="*")
+    stats = cache.stats()
+    assert stats["container"]["hits"] > 0
+    assert stats["total"]["size"] > 0
+
+    cache.clear()
+    assert cache.stats()["total"]["size"] == 0
+
+
+def test_cache_invalidation():
+    from pyisim.cache import EntityCache
+
+    cache = EntityCache()
+    sess = Session(test_url, admin_login, admin_pw, cert, cache=cache)
+    parent = search.organizational_container(sess, "organizations", test_org)[0]
+
+    rolinfo = {
+        "name": "rol_prueba_cache",
+        "description": "rol_prueba_cache",
+        "parent": parent,
+        "classification": "role.classification.business",
+        "access_option": 2,
+        "access_category": "Role",
+    }
+    rol = StaticRole(sess, role_attrs=RoleAttributes(**rolinfo))
+    rol.add(sess)
+
+    # la segunda búsqueda sale del cache
+    assert StaticRole(sess, dn=rol.dn).name == "rol_prueba_cache"
+    StaticRole(sess, dn=rol.dn)
+    assert cache.stats()["role"]["hits"] > 0
+
+    # la modificación invalida el rol cacheado
+    rol.modify(sess, {"name": "rol_prueba_cache_mod"})
+    assert StaticRole(sess, dn=rol.dn).name == "rol_prueba_cache_mod"
+
+    rol.delete(sess)
+
+
+def test_person_writes_invalidate_cached_lookup():
+    from types import SimpleNamespace
+
+    from pyisim import rest, soap
+    from pyisim.cache import EntityCache
+
+    href = "/itim/rest/people/ZXJnbG9iYWxpZD0x"
+    dn = "erglobalid=1,ou=people,erglobalid=0,ou=org,dc=com"
+
+    # la búsqueda con la proyección "*" no trae el DN: la entrada solo queda etiquetada con el href
+    cache = EntityCache()
+    cache.set(
+        "person", "lookup", {"_attributes": {"cn": "x"}}, rest.tags_persona({}, href)
+    )
+
+    client = soap.ISIMClient.__new__(soap.ISIMClient)
+    client.cache = cache
+    client.addr = ""
+    client.get_client = lambda url: None
+    client._call = lambda *args: None
+    session = SimpleNamespace(soapclient=client)
+
+    person = Person(
+        session, person={"_links": {"self": {"href": href}}, "_attributes": {"dn": dn}}
+    )
+    for write in (
+        lambda: person.suspend(session, "ok"),
+        lambda: person.restore(session, "ok"),
+        lambda: person.delete(session, "ok"),
+    ):
+        cache.set("person", "lookup", {"_attributes": {"cn": "x"}}, [href, None])
+        write()
+        assert cache.get("person", "lookup") == (False, None)
+
+
+def test_sqlite_cache(tmp_path):
+    from pyisim.cache import SQLiteCache
+
+    path = tmp_path / "entities.db"
+    sess = Session(test_url, admin_login, admin_pw, cert, cache=SQLiteCache(path))
+    parent = search.organizational_container(sess, "organizations", test_org)[0]
+    services = search.service(sess, parent, search_filter=test_service_name)
+
+    # otra sesión (otro proceso) con el mismo archivo no vuelve a consultar ISIM
+    cache = SQLiteCache(path)
+    sess2 = Session(test_url, admin_login, admin_pw, cert, cache=cache)
+    parent2 = search.organizational_container(sess2, "organizations", test_org)[0]
+    services2 = search.service(sess2, parent2, search_filter=test_service_name)
+
+    assert [s.dn for s in services2] == [s.dn for s in services]
+    assert parent2.dn == parent.dn
+    assert cache.stats()["total"]["hits"] >= 2
+
+
+def test_sqlite_cache_namespaced_by_server_and_user(tmp_path):
+    from pyisim.cache import SQLiteCache, cached, namespace
+
+    class Client:
+        def __init__(self, url, user):
+            self.cache = SQLiteCache(tmp_path / "entities.db")
+            self.cache_namespace = namespace(url, user)
+            self.calls = 0
+
+        @cached("container")
+        def lookupContainer(self, dn):
+            self.calls += 1
+            return {"server": self.cache_namespace}
+
+    dev = Client("https://isim-dev", "admin")
+    prod = Client("https://isim-prod", "admin")
+    other_user = Client("https://isim-prod", "auditor")
+    same = Client("https://isim-prod", "admin")
+
+    for c in (dev, prod, other_user, same):
+        assert c.lookupContainer("ou=org")["server"] == c.cache_namespace
+    assert (dev.calls, prod.calls, other_user.calls, same.calls) == (1, 1, 1, 0)
+
+
+def test_single_flight(session):
+    from concurrent.futures import ThreadPoolExecutor
+
+    parent = search.organizational_container(session, "organizations", test_org)[0]
+
+    with ThreadPoolExecutor(16) as executor:
+        ous = list(
+            executor.map(
+                lambda _: session.soapclient.lookupContainer(parent.dn), range(16)
+            )
+        )
+
+    assert all(ou["itimDN"] == parent.dn for ou in ous)
+    stats = session.soapclient.flights.stats()["lookupContainer"]
+    assert stats["calls"] + stats.get("shared", 0) >= 16
+
+
+def test_single_flight_per_event_loop():
+    import asyncio
+    import threading
+    from pyisim.concurrency import SingleFlight
+
+    flights = SingleFlight()
+    barrier = threading.Barrier(2)
+    results, errors = [], []
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        return threading.get_ident()
+
+    async def caller():
+        barrier.wait()
+        return await flights.ado("lookup", "cn=a", slow)
+
+    def worker():
+        try:
+            results.append(asyncio.run(caller()))
+        except Exception as e:
+            errors.append(e)
+
+    # un asyncio.run por hilo: cada loop tiene su propia llamada en curso
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(set(results)) == 2
+    assert flights.stats()["lookup"]["calls"] == 2
+
+
+def test_identity_map():
+    sess = Session(test_url, admin_login, admin_pw, cert, identity_map=True)
+
+    first = search.people(sess, attributes="cn", limit=10)
+    second = search.people(sess, attributes="cn", limit=10)
+    assert all(a is b for a, b in zip(first, second))
+    assert len(set(first) | set(second)) == len(first)
+
+    # sin identity map son instancias distintas, pero iguales
+    plain = Session(test_url, admin_login, admin_pw, cert)
+    other = search.people(plain, attributes="cn", limit=10)
+    assert other[0] is not first[0]
+    assert other == first
+
+
+def test_entity_hash_fixed_on_first_use():
+    from pyisim.entities.base import Entity
+
+    class Thing(Entity):
+        _identity_type = "thing"
+
+        def __init__(self, dn=None):
+            if dn:
+                self.dn = dn
+
+    # una entidad sin DN guardada en un set se sigue encontrando después de tener DN
+    new = Thing()
+    held = {new}
+    new.dn = "cn=a"
+    assert new in held
+    assert new != Thing(dn="cn=a")
+    assert "_hashed_key" not in vars(new)
+
+    assert Thing(dn="cn=b") == Thing(dn="cn=b")
+    assert {Thing(dn="cn=b"): 1}[Thing(dn="cn=b")] == 1
+
+
+def test_lazy_person_attributes(session):
+    from pyisim.utils import prefetch
+
+    people = search.people(session, attributes="cn", limit=5)
+    assert "sn" not in vars(people[0])
+
+    # se busca en el primer acceso
+    assert people[0].sn
+    assert "sn" in vars(people[0])
+    assert not people[0].changes
+
+    prefetch(session, people[1:], "sn")
+    assert all("sn" in vars(p) for p in people)
+
+
+def test_compact_records(session):
+    from pyisim.records import AccountRecord, PersonRecord
+
+    records = search.people(session, attributes="cn", limit=10, compact=True)
+    people = search.people(session, attributes="cn", limit=10)
+    assert all(isinstance(r, PersonRecord) for r in records)
+    assert [r.href for r in records] == [p.href for p in people]
+    with pytest.raises(AttributeError):
+        records[0].cn = "x"
+
+    me = session.current_person()
+    accounts = me.get_accounts(session, compact=True)
+    assert all(isinstance(a, AccountRecord) for a in accounts)
+    assert [a.dn for a in accounts] == [a.dn for a in me.get_accounts(session)]
+    assert accounts[0].to_entity(session).dn == accounts[0].dn
+
+
+def test_record_schemas_bounded():
+    from pyisim import records
+    from pyisim.records import AccountRecord, Record
+
+    def account(*names):
+        return {
+            "name": "u",
+            "itimDN": "erglobalid=1",
+            "profileName": "ADAccount",
+            "serviceName": "AD",
+            "attributes": {
+                "item": [{"name": n, "values": {"item": ["v"]}} for n in names]
+            },
+        }
+
+    # el orden del servidor no crea esquemas distintos
+    a = AccountRecord.from_soap(account("eruid", "cn"))
+    b = AccountRecord.from_soap(account("cn", "eruid"))
+    assert a._schema is b._schema
+
+    first = Record({"x": 1})
+    for i in range(records.SCHEMA_CACHE_SIZE + 1):
+        Record({f"a{i}": 1})
+    assert records.schema.cache_info().currsize <= records.SCHEMA_CACHE_SIZE
+    # con el esquema desalojado, los registros iguales siguen siendo iguales
+    assert Record({"x": 1}) == first
+
+
+def test_streaming_accounts(session):
+    from pyisim.records import AccountRecord
+
+    accounts = search.account(session, "(eruid=*)", compact=True)
+    streamed = search.iter_account(session, "(eruid=*)")
+    assert not isinstance(streamed, list)
+    assert list(streamed) == accounts
+
+    projected = next(search.iter_account(session, "(eruid=*)", attributes=["eruid"]))
+    assert set(projected.attributes()) <= {"eruid"}
+
+    me = session.current_person()
+    owned = list(me.iter_accounts(session))
+    assert all(isinstance(a, AccountRecord) for a in owned)
+    assert owned == me.get_accounts(session, compact=True)
+
+
+def test_truncated_stream_raises():
+    import io
+
+    from lxml import etree
+    from pyisim.soap import elementos_stream
+
+    body = (
+        b'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+        b"<searchAccountsResponse><searchAccountsReturn><name>a</name></searchAccountsReturn>"
+        b"<searchAccountsReturn><name>b</na"
+    )
+
+    class Truncated:
+        raw = io.BytesIO(body)
+
+        def close(self):
+            pass
+
+    with pytest.raises(etree.XMLSyntaxError):
+        list(elementos_stream(Truncated(), "searchAccountsReturn"))
+
+
+@pytest.mark.parametrize(
+    "read",
+    [
+        lambda c, ou, service_dn: c.searchAccounts({"filter": "(eruid=*)"}),
+        lambda c, ou, service_dn: c.buscarRol("(errolename=SAP*)", find_unique=False),
+        lambda c, ou, service_dn: c.buscarGruposPorServicio(service_dn, "", ""),
+        lambda c, ou, service_dn: c.buscarPoliticaSuministro(
+            ou, "Test TipoServicio", find_unique=False
+        ),
+        lambda c, ou, service_dn: c.buscarActividadesDeSolicitud(
+            "5101169363690384727", pending_only=False
+        ),
+    ],
+    ids=[
+        "searchAccounts",
+        "searchRoles",
+        "getGroupsByService",
+        "getPolicies",
+        "getActivities",
+    ],
+)
+def test_raw_xml_equivalence(session, read):
+    from zeep.helpers import serialize_object
+
+    raw_session = Session(test_url, admin_login, admin_pw, cert, raw_xml=True)
+    parent = search.organizational_container(session, "organizations", test_org)[0]
+    service_dn = search.service(session, parent, search_filter="Directorio Activo")[
+        0
+    ].dn
+
+    expected = serialize_object(read(session.soapclient, parent.wsou, service_dn), dict)
+    fast = read(raw_session.soapclient, parent.wsou, service_dn)
+    assert fast == expected
+
+
+def test_json_decoded_once():
+    import json
+
+    import requests
+    from pyisim import rest
+
+    r = requests.Response()
+    r._content = '{"cn": "ñandú", "values": [1, 2.5, null, true]}'.encode()
+    decoded = rest.json_respuesta(r)
+    assert decoded == json.loads(r.text)
+    assert rest.json_respuesta(r) is decoded
+
+
+def test_person_changes_outside_projection():
+    person = Person(
+        None,
+        person={
+            "_links": {"self": {"href": "/itim/rest/people/1"}},
+            "_attributes": {"cn": "a"},
+        },
+        attributes="cn",
+    )
+    assert person.changes == {}
+
+    # title no estaba en la proyección: igual es un cambio que modify() debe enviar
+    person.title = "x"
+    person.cn = "b"
+    assert person.changes == {"title": "x", "cn": "b"}
+
+    # las cargas de atributos no son cambios
+    person._fill({"sn": "c", "dn": "erglobalid=1"})
+    assert person.sn == "c"
+    assert person.changes == {"title": "x", "cn": "b"}
+
+
+def test_identity_map_refreshes_people():
+    from types import SimpleNamespace
+
+    from pyisim.entities.base import IdentityMap
+
+    session = SimpleNamespace(identity_map=IdentityMap())
+    links = {"self": {"href": "/itim/rest/people/1"}}
+
+    def found(**attrs):
+        return Person(
+            session, person={"_links": links, "_attributes": attrs}, attributes="*"
+        )
+
+    person = found(cn="a", title="t1", erpersonstatus="ACTIVE")
+    person.title = "local"
+
+    # una búsqueda posterior trae el estado nuevo, sin pisar el cambio pendiente
+    again = found(cn="a", title="t2", erpersonstatus="INACTIVE")
+    assert again is person
+    assert person.erpersonstatus == "INACTIVE"
+    assert person.title == "local"
+    assert person.changes == {"title": "local"}
+
+
+def test_person_search_rejects_error_pages():
+    import requests
+    from pyisim import rest
+    from pyisim.exceptions import InvalidResponseError
+
+    def response(status, body, content_type):
+        r = requests.Response()
+        r.status_code = status
+        r._content = body.encode()
+        r.headers["Content-Type"] = content_type
+        r.request = requests.Request("GET", "https://isim/itim/rest/people").prepare()
+        r.url = r.request.url
+        return r
+
+    # un error o una página de login no es una página vacía: los generadores paginados terminarían antes de tiempo
+    with pytest.raises(InvalidResponseError):
+        rest.lista_respuesta(response(500, "Internal error", "text/plain"))
+    with pytest.raises(InvalidResponseError):
+        rest.lista_respuesta(response(200, "<html>login</html>", "text/html"))
+
+    assert rest.lista_respuesta(response(200, "", "application/json")) == []
+    assert rest.lista_respuesta(response(204, "", "")) == []
+    assert rest.lista_respuesta(response(200, '[{"cn": "a"}]', "application/json")) == [
+        {"cn": "a"}
+    ]
+
+
+def test_person_dn_after_full_search(session):
+    people = search.people(session, limit=3)
+    assert all(p.dn for p in people)
+
+    me = session.current_person()
+    assert me.dn
+    assert Person(session, href=me.href).dn == me.dn